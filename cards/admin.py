@@ -1,5 +1,10 @@
 from django.contrib import admin
-from .models import Conversation,  Card, Argument, Source, Follow, Notification, SavedCard, UserSettings, DirectMessage, FriendRequest
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.http import HttpResponse
+from django.shortcuts import get_object_or_404
+from django.urls import path, reverse
+from django.utils.html import format_html
+from .models import Conversation,  Card, Argument, Source, Follow, Notification, SavedCard, UserSettings, DirectMessage, FriendRequest, RequestProfile, CardSignature, FactFeed, FactUpdateRun
 
 
 class ArgumentInline(admin.TabularInline):
@@ -80,3 +85,96 @@ class ConversationAdmin(admin.ModelAdmin):
     list_display = ['participant1', 'participant2', 'card', 'created_at', 'updated_at']
     list_filter = ['created_at', 'updated_at']
     search_fields = ['participant1__username', 'participant2__username']
+
+
+@admin.register(RequestProfile)
+class RequestProfileAdmin(admin.ModelAdmin):
+    list_display = ['path', 'view_name', 'duration_ms', 'sample_count', 'trigger', 'user', 'created_at', 'flamegraph_link']
+    list_filter = ['trigger', 'view_name', 'created_at']
+    search_fields = ['path', 'view_name']
+    readonly_fields = [field.name for field in RequestProfile._meta.fields] + ['flamegraph_link']
+
+    def has_add_permission(self, request):
+        return False
+
+    def get_urls(self):
+        custom = [
+            path('<int:profile_id>/collapsed/', self.admin_site.admin_view(self.collapsed_view), name='cards_requestprofile_collapsed'),
+        ]
+        return custom + super().get_urls()
+
+    def collapsed_view(self, request, profile_id):
+        """Download the collapsed stacks for flamegraph.pl or speedscope"""
+        profile = get_object_or_404(RequestProfile, id=profile_id)
+        response = HttpResponse(profile.collapsed_stacks, content_type='text/plain; charset=utf-8')
+        response['Content-Disposition'] = f'attachment; filename="profile-{profile.id}.collapsed.txt"'
+        return response
+
+    @admin.display(description='Flamegraph')
+    def flamegraph_link(self, obj):
+        url = reverse('admin:cards_requestprofile_collapsed', args=[obj.id])
+        return format_html('<a href="{}">collapsed stacks</a>', url)
+
+
+@admin.register(CardSignature)
+class DuplicateClusterAdmin(admin.ModelAdmin):
+    """Cards in near-duplicate clusters, biggest clusters first (see cards/duplicates.py)"""
+    list_display = ['card', 'cluster_link', 'cluster_size', 'card_topic', 'card_owner', 'card_visibility', 'updated_at']
+    list_select_related = ['card', 'card__user']
+    search_fields = ['card__title', 'card__user__username']
+    readonly_fields = ['card', 'cluster', 'updated_at']
+    exclude = ['minhash']
+
+    def has_add_permission(self, request):
+        return False
+
+    def get_queryset(self, request):
+        sizes = (
+            CardSignature.objects.filter(cluster=OuterRef('cluster'))
+            .order_by().values('cluster').annotate(n=Count('pk')).values('n')[:1]
+        )
+        return (
+            super().get_queryset(request)
+            .filter(cluster__isnull=False)
+            .annotate(size=Subquery(sizes, output_field=IntegerField()))
+            .filter(size__gt=1)
+            .order_by('-size', 'cluster', 'card_id')
+        )
+
+    @admin.display(description='Cluster', ordering='cluster')
+    def cluster_link(self, obj):
+        url = reverse('admin:cards_cardsignature_changelist') + f'?cluster={obj.cluster}'
+        return format_html('<a href="{}">#{}</a>', url, obj.cluster)
+
+    @admin.display(description='Cards', ordering='size')
+    def cluster_size(self, obj):
+        return obj.size
+
+    @admin.display(description='Topic', ordering='card__topic')
+    def card_topic(self, obj):
+        return obj.card.get_topic_display()
+
+    @admin.display(description='Owner', ordering='card__user__username')
+    def card_owner(self, obj):
+        return obj.card.user.username
+
+    @admin.display(description='Visibility', ordering='card__visibility')
+    def card_visibility(self, obj):
+        return obj.card.visibility
+
+
+@admin.register(FactFeed)
+class FactFeedAdmin(admin.ModelAdmin):
+    list_display = ['key', 'topic', 'fact_count', 'last_fetched', 'last_changed', 'last_error']
+    list_filter = ['topic']
+    readonly_fields = [field.name for field in FactFeed._meta.fields]
+
+
+@admin.register(FactUpdateRun)
+class FactUpdateRunAdmin(admin.ModelAdmin):
+    list_display = ['started_at', 'status', 'duration_seconds', 'metrics', 'force']
+    list_filter = ['status']
+    readonly_fields = [field.name for field in FactUpdateRun._meta.fields]
+
+    def has_add_permission(self, request):
+        return False
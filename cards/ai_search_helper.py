@@ -2,15 +2,16 @@
 AI-powered search query enhancement and result curation
 Uses Claude to understand vague queries and suggest better searches
 """
-import os
 import json
+from . import llm
 
 
 class AISearchHelper:
     """Use Claude to enhance user searches"""
     
-    def __init__(self):
-        self.api_key = os.environ.get('ANTHROPIC_API_KEY')
+    def __init__(self, user=None):
+        self.llm = llm.Gateway()
+        self.user = user
     
     def enhance_query(self, user_query, topic):
         """
@@ -19,13 +20,10 @@ class AISearchHelper:
         2. Suggested specific questions
         3. Key terms to look for
         """
-        if not self.api_key:
+        if not self.llm.available:
             return None
         
         try:
-            import anthropic
-            client = anthropic.Anthropic(api_key=self.api_key)
-            
             prompt = f"""The user is researching {topic} and typed: "{user_query}"
 
 This query might be vague or incomplete. Help them by:
@@ -41,23 +39,13 @@ Respond in JSON format:
     "key_terms": ["term1", "term2", "term3"]
 }}"""
             
-            message = client.messages.create(
-                model="claude-sonnet-4-20250514",
-                max_tokens=500,
-                messages=[{"role": "user", "content": prompt}]
-            )
-            
-            # Parse response
-            response_text = message.content[0].text
+            reply = self.llm.complete(prompt, max_tokens=500, user=self.user)
             
             # Extract JSON from response
-            if '```json' in response_text:
-                response_text = response_text.split('```json')[1].split('```')[0]
-            elif '```' in response_text:
-                response_text = response_text.split('```')[1].split('```')[0]
-            
-            return json.loads(response_text.strip())
+            return llm.parse_json_reply(reply.text)
             
+        except llm.BudgetExceeded:
+            raise
         except Exception as e:
             print(f"AI enhancement error: {e}")
             return None
@@ -69,13 +57,10 @@ Respond in JSON format:
         2. Identify key facts
         3. Suggest which to save to notebook
         """
-        if not self.api_key or not results:
+        if not self.llm.available or not results:
             return results
         
         try:
-            import anthropic
-            client = anthropic.Anthropic(api_key=self.api_key)
-            
             # Prepare results summary
             results_summary = []
             for i, result in enumerate(results[:10]):
@@ -105,21 +90,12 @@ Respond in JSON:
     }}
 }}"""
             
-            message = client.messages.create(
-                model="claude-sonnet-4-20250514",
-                max_tokens=800,
-                messages=[{"role": "user", "content": prompt}]
-            )
-            
-            response_text = message.content[0].text
+            reply = self.llm.complete(prompt, max_tokens=800, user=self.user)
             
             # Extract JSON
-            if '```json' in response_text:
-                response_text = response_text.split('```json')[1].split('```')[0]
-            elif '```' in response_text:
-                response_text = response_text.split('```')[1].split('```')[0]
-            
-            curation = json.loads(response_text.strip())
+            curation = llm.parse_json_reply(reply.text)
+            if curation is None:
+                return results
             
             # Reorder results
             ranked_results = []
@@ -132,6 +108,8 @@ Respond in JSON:
             
             return ranked_results
             
+        except llm.BudgetExceeded:
+            raise
         except Exception as e:
             print(f"AI curation error: {e}")
             return results
@@ -7,3 +7,5 @@ class CardsConfig(AppConfig):
     
     def ready(self):
         import cards.signals
+        from cards.instrumentation import instrument_requests
+        instrument_requests()
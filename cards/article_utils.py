@@ -1,17 +1,17 @@
-import os
 import requests
-from anthropic import Anthropic
+from . import llm
 
 class ArticleSummarizer:
-    def __init__(self):
-        api_key = os.environ.get('ANTHROPIC_API_KEY')
-        if api_key:
-            self.client = Anthropic(api_key=api_key)
-        else:
-            self.client = None
+    def __init__(self, user=None):
+        self.llm = llm.Gateway()
+        self.user = user
+    
+    @property
+    def available(self):
+        return self.llm.available
     
     def summarize_article(self, url):
-        if not self.client:
+        if not self.available:
             return None
         
         try:
@@ -31,17 +31,14 @@ class ArticleSummarizer:
             
             text = text[:8000]
             
-            message = self.client.messages.create(
-                model="claude-sonnet-4-20250514",
-                max_tokens=500,
-                messages=[{
-                    "role": "user",
-                    "content": f"Summarize this article in 2-3 paragraphs, focusing on key points:\n\n{text}"
-                }]
+            reply = self.llm.complete(
+                f"Summarize this article in 2-3 paragraphs, focusing on key points:\n\n{text}",
+                max_tokens=500, user=self.user,
             )
+            return reply.text
             
-            return message.content[0].text
-            
+        except llm.BudgetExceeded:
+            raise
         except Exception as e:
             print(f"Summarization error: {e}")
             return None
@@ -0,0 +1,143 @@
+"""
+Card assembly shared by every card-creation view
+
+Views describe a card as an unsaved Card plus a list of argument dicts;
+assemble_card() validates all of it up front and then writes the card, its
+arguments and their sources with bulk inserts inside a single transaction.
+"""
+import re
+
+from django.core.exceptions import ValidationError
+from django.core.validators import URLValidator
+from django.db import transaction
+
+from .models import Argument, Source
+
+_URL = re.compile(r'https?://\S+')
+_SEPARATORS = ' \t,;'
+_validate_url = URLValidator()
+
+
+def _citation(text):
+    """A source for citation text; what doesn't fit in the title is kept in notes"""
+    if len(text) > 300:
+        return {'title': text[:300], 'notes': text}
+    return {'title': text}
+
+
+def url_source(url, title=None):
+    """
+    Source fields for a URL, titled with the URL by default. A URL that
+    Source.url can't hold (too long or malformed) is kept in notes instead,
+    so it never fails the card's validation.
+    """
+    title = (title or url)[:300]
+    try:
+        if len(url) > Source._meta.get_field('url').max_length:
+            raise ValidationError('too long')
+        _validate_url(url)
+    except ValidationError:
+        return {'title': title, 'notes': url}
+    return {'title': title, 'url': url}
+
+
+def parse_sources(text):
+    """
+    Split a free-text "URLs or citations" field into source dicts: one per
+    URL, and one per stretch of other text on a line, so commas inside a
+    citation ("Smith, J. (2020), Journal") stay in it
+    """
+    sources = []
+    for line in (text or '').splitlines():
+        at = 0
+        for match in _URL.finditer(line):
+            citation = line[at:match.start()].strip(_SEPARATORS)
+            if citation:
+                sources.append(_citation(citation))
+            # "url1,url2" without a space is two URLs
+            for url in re.split(r'[,;](?=https?://)', match.group()):
+                url = url.rstrip('.,;')
+                if url:
+                    sources.append(url_source(url))
+            at = match.end()
+        citation = line[at:].strip(_SEPARATORS)
+        if citation:
+            sources.append(_citation(citation))
+    return sources
+
+
+def argument_payload(arg_type, summaries, details=(), sources=(), start=0):
+    """
+    Turn parallel POST lists into argument dicts, skipping blank summaries.
+    Order numbers follow the position in the submitted list, starting at `start`.
+    """
+    arguments = []
+    for i, summary in enumerate(summaries):
+        if not summary or not summary.strip():
+            continue
+        arguments.append({
+            'type': arg_type,
+            'summary': summary.strip(),
+            'detail': details[i] if i < len(details) else '',
+            'order': i + start,
+            'sources': sources[i] if i < len(sources) else [],
+        })
+    return arguments
+
+
+def _collect(errors, label, instance, exclude):
+    try:
+        instance.full_clean(exclude=exclude)
+    except ValidationError as e:
+        for field, field_errors in e.message_dict.items():
+            for message in field_errors:
+                errors.append(f"{label} {field}: {message}")
+
+
+def assemble_card(card, arguments=()):
+    """
+    Validate and save an unsaved Card together with its arguments and sources.
+
+    `arguments` is a list of dicts with type, summary, detail, order and an
+    optional `sources` list of Source field dicts. Raises ValidationError
+    (with every problem found) before anything is written.
+    """
+    errors = []
+    # Survey topics predate Card.TOPIC_CHOICES (e.g. "immigration"), so the
+    # topic is only required, not checked against the choices
+    _collect(errors, 'Card', card, exclude=['user', 'topic'])
+    if not card.topic:
+        errors.append("Card topic: This field cannot be blank.")
+
+    argument_objs = []
+    source_groups = []
+    for index, data in enumerate(arguments, 1):
+        data = dict(data)
+        sources = data.pop('sources', None) or []
+        argument = Argument(**data)
+        _collect(errors, f'Argument {index}', argument, exclude=['card'])
+        group = []
+        for source_data in sources:
+            source = Source(**source_data)
+            _collect(errors, f'Argument {index} source', source, exclude=['argument'])
+            group.append(source)
+        argument_objs.append(argument)
+        source_groups.append(group)
+
+    if errors:
+        raise ValidationError(errors)
+
+    with transaction.atomic():
+        card.save()
+        for argument in argument_objs:
+            argument.card = card
+        Argument.objects.bulk_create(argument_objs)
+
+        source_objs = []
+        for argument, group in zip(argument_objs, source_groups):
+            for source in group:
+                source.argument = argument
+                source_objs.append(source)
+        Source.objects.bulk_create(source_objs)
+
+    return card
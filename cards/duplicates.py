@@ -0,0 +1,231 @@
+"""
+Near-duplicate cards with MinHash and locality-sensitive hashing
+
+A card's text (title, stance, hypothesis, conclusion and argument summaries)
+is cut into overlapping 3-word shingles. Its MinHash signature keeps, for
+each of NUM_PERM hash functions, the smallest hash of any shingle; two
+signatures agree in a position with probability equal to the Jaccard
+similarity of the shingle sets. The signature is split into BANDS bands of
+ROWS values, and each band is hashed to a key stored in CardSignatureBand.
+
+Finding candidates is one indexed lookup on those keys, whatever the number
+of cards. Candidates whose signatures agree in at least
+SIMILARITY_THRESHOLD of positions are near-duplicates. With 16 bands of 4,
+a pair at 0.8 similarity shares a band with probability 0.9998.
+
+index_card() runs after every card or argument write commits (see
+signals.py; index_after_commit() runs it once per card per transaction) and
+merges the card into the cluster of the cards it matches. When that changes
+any card's cluster it bumps the 'cards' stamp, so list pages rendered between
+the write's own bump and the re-index are rendered again. collapse() hides
+cards from a listing when a newer public card of the same cluster is shown
+in that listing instead. The index_duplicates command backfills signatures for existing
+cards.
+"""
+import hashlib
+import logging
+import random
+import re
+import struct
+import zlib
+
+from django.db import transaction
+from django.db.models import Case, Count, Exists, IntegerField, OuterRef, Q, Subquery, Value, When
+from django.db.models.functions import Coalesce
+
+from . import view_cache, visibility
+from .models import Argument, Card, CardSignature, CardSignatureBand
+
+logger = logging.getLogger(__name__)
+
+NUM_PERM = 64
+BANDS = 16
+ROWS = NUM_PERM // BANDS
+SHINGLE_WORDS = 3
+SIMILARITY_THRESHOLD = 0.8
+# Candidates checked per card, most shared bands first
+MAX_CANDIDATES = 200
+
+_PRIME = (1 << 61) - 1
+_rng = random.Random(20240601)
+_PERMUTATIONS = [(_rng.randrange(1, _PRIME), _rng.randrange(0, _PRIME)) for _ in range(NUM_PERM)]
+_SIGNATURE = struct.Struct(f'<{NUM_PERM}I')
+_WORDS = re.compile(r"[a-z0-9']+")
+
+
+def text_for(title, stance, hypothesis, conclusion, summaries=()):
+    """Everything compared for duplicates, for a saved card or a draft"""
+    return '\n'.join([title or '', stance or '', hypothesis or '', conclusion or '', *summaries])
+
+
+def card_text(card_id):
+    """text_for() a saved card, or None if the card is gone"""
+    card = Card.objects.filter(id=card_id).values('title', 'stance', 'hypothesis', 'conclusion').first()
+    if card is None:
+        return None
+    summaries = Argument.objects.filter(card_id=card_id).order_by('type', 'order', 'id').values_list('summary', flat=True)
+    return text_for(summaries=summaries, **card)
+
+
+def shingles(text):
+    """32-bit hashes of the text's overlapping word shingles"""
+    words = _WORDS.findall((text or '').lower())
+    if len(words) < SHINGLE_WORDS:
+        grams = [' '.join(words)] if words else []
+    else:
+        grams = [' '.join(words[i:i + SHINGLE_WORDS]) for i in range(len(words) - SHINGLE_WORDS + 1)]
+    return {zlib.crc32(gram.encode()) for gram in grams}
+
+
+def signature(hashes):
+    return [min((a * x + b) % _PRIME for x in hashes) & 0xFFFFFFFF for a, b in _PERMUTATIONS]
+
+
+def band_keys(sig):
+    keys = []
+    for band in range(BANDS):
+        packed = struct.pack(f'<H{ROWS}I', band, *sig[band * ROWS:(band + 1) * ROWS])
+        keys.append(int.from_bytes(hashlib.blake2b(packed, digest_size=8).digest(), 'little', signed=True))
+    return keys
+
+
+def similarity(sig, other):
+    """Estimated Jaccard similarity of two signatures"""
+    return sum(a == b for a, b in zip(sig, other)) / NUM_PERM
+
+
+def _matches(sig, keys, exclude=None):
+    """[(card_id, similarity)] of indexed cards at or above the threshold, best first"""
+    candidates = CardSignatureBand.objects.filter(key__in=keys)
+    if exclude is not None:
+        candidates = candidates.exclude(card_id=exclude)
+    candidate_ids = list(
+        candidates.values('card_id').annotate(shared=Count('id')).order_by('-shared')
+        .values_list('card_id', flat=True)[:MAX_CANDIDATES]
+    )
+    matches = []
+    for card_id, packed in CardSignature.objects.filter(card_id__in=candidate_ids).values_list('card_id', 'minhash'):
+        score = similarity(sig, _SIGNATURE.unpack(bytes(packed)))
+        if score >= SIMILARITY_THRESHOLD:
+            matches.append((card_id, score))
+    matches.sort(key=lambda match: -match[1])
+    return matches
+
+
+def index_card(card_id):
+    """Store the card's signature and merge it into its near-duplicates' cluster; returns the cluster"""
+    text = card_text(card_id)
+    if text is None:
+        return None
+    hashes = shingles(text)
+    previous = CardSignature.objects.filter(card_id=card_id).values_list('cluster', flat=True).first()
+
+    with transaction.atomic():
+        CardSignatureBand.objects.filter(card_id=card_id).delete()
+        if not hashes:
+            CardSignature.objects.filter(card_id=card_id).delete()
+            if previous is not None:
+                view_cache.bump('cards')
+            return None
+
+        sig = signature(hashes)
+        keys = band_keys(sig)
+        cluster = None
+        merged = 0
+        matched = [other for other, _ in _matches(sig, keys, exclude=card_id)]
+        if matched:
+            clusters = set(CardSignature.objects.filter(card_id__in=matched).values_list('cluster', flat=True)) - {None}
+            cluster = min(clusters | set(matched) | {card_id})
+            merged = (
+                CardSignature.objects.filter(Q(card_id__in=matched) | Q(cluster__in=clusters))
+                .exclude(cluster=cluster).update(cluster=cluster)
+            )
+
+        CardSignature.objects.update_or_create(
+            card_id=card_id, defaults={'minhash': _SIGNATURE.pack(*sig), 'cluster': cluster},
+        )
+        CardSignatureBand.objects.bulk_create([CardSignatureBand(card_id=card_id, key=key) for key in keys])
+        if merged or cluster != previous:
+            # Listings collapse by cluster; runs after this block commits
+            view_cache.bump('cards')
+    return cluster
+
+
+# Attribute on the database connection holding its pending _IndexAfterCommit
+_PENDING = 'duplicates_pending_index'
+
+
+class _IndexAfterCommit:
+    """Re-indexes every card written on one connection, then has nothing left to do"""
+
+    def __init__(self):
+        self.card_ids = {}
+
+    def __call__(self):
+        card_ids, self.card_ids = self.card_ids, {}
+        for card_id in card_ids:
+            try:
+                index_card(card_id)
+            except Exception:
+                logger.exception('Duplicate indexing failed for card %s', card_id)
+
+
+def index_after_commit(card_id):
+    """
+    Schedule index_card() for when the current transaction commits, once per
+    card. Every write registers the connection's one pending callback; its
+    first run after the commit indexes all the cards and later runs find none
+    left. A write that was rolled back only adds a harmless re-index to the
+    next commit.
+    """
+    connection = transaction.get_connection()
+    pending = getattr(connection, _PENDING, None)
+    if pending is None:
+        pending = _IndexAfterCommit()
+        setattr(connection, _PENDING, pending)
+    pending.card_ids[card_id] = None
+    transaction.on_commit(pending)
+
+
+def similar_cards(viewer, text, exclude=None, limit=3):
+    """Cards the viewer can see that are near-duplicates of text, each with a .similarity"""
+    hashes = shingles(text)
+    if not hashes:
+        return []
+    sig = signature(hashes)
+    matches = _matches(sig, band_keys(sig), exclude=exclude)
+    cards = visibility.visible_cards(viewer, Card.objects.filter(id__in=[card_id for card_id, _ in matches]))
+    cards = cards.select_related('user').in_bulk()
+    found = []
+    for card_id, score in matches:
+        if card_id in cards:
+            cards[card_id].similarity = score
+            found.append(cards[card_id])
+    return found[:limit]
+
+
+def collapse(cards):
+    """
+    Drop cards that have a newer public near-duplicate in the same listing
+    (which everyone can see, so the cluster stays represented) and annotate
+    similar_count: for a public card, the older cards of its cluster in the
+    listing, which are the ones hidden in its favour.
+    """
+    listed_mates = CardSignature.objects.filter(
+        card_id__in=cards.order_by().values('pk'), cluster=OuterRef('signature__cluster'),
+    ).exclude(card_id=OuterRef('pk'))
+    newer = listed_mates.filter(card__visibility='public').filter(
+        Q(card__created_at__gt=OuterRef('created_at')) |
+        Q(card__created_at=OuterRef('created_at'), card_id__gt=OuterRef('pk'))
+    )
+    older = listed_mates.filter(
+        Q(card__created_at__lt=OuterRef('created_at')) |
+        Q(card__created_at=OuterRef('created_at'), card_id__lt=OuterRef('pk'))
+    )
+    hidden_count = older.order_by().values('cluster').annotate(n=Count('pk')).values('n')[:1]
+    return cards.filter(Q(signature__cluster__isnull=True) | ~Exists(newer)).annotate(
+        similar_count=Case(
+            When(visibility='public', then=Coalesce(Subquery(hidden_count, output_field=IntegerField()), Value(0))),
+            default=Value(0),
+        ),
+    )
@@ -4,13 +4,15 @@ Utilities for fetching facts from various APIs
 import requests
 from bs4 import BeautifulSoup
 from datetime import datetime
-import os
+from . import llm
 
 
 class FactFetcher:
     """Fetch facts from multiple sources"""
     
-    def __init__(self):
+    def __init__(self, strict=False):
+        # strict: raise request errors instead of printing them, so callers can count failures
+        self.strict = strict
         self.sources = {
             'census': 'https://api.census.gov/data',
             'bls': 'https://api.bls.gov/publicAPI/v2/timeseries/data/',
@@ -28,9 +30,13 @@ class FactFetcher:
                 'for': 'us:1'
             }
             response = requests.get(url, params=params, timeout=10)
+            if self.strict:
+                response.raise_for_status()
             if response.status_code == 200:
                 return response.json()
         except Exception as e:
+            if self.strict:
+                raise
             print(f"Census API error: {e}")
         return None
     
@@ -67,6 +73,8 @@ class FactFetcher:
             url = f"https://www.pewresearch.org/?s={query}"
             headers = {'User-Agent': 'Debrief/1.0 (Educational Project)'}
             response = requests.get(url, headers=headers, timeout=10)
+            if self.strict:
+                response.raise_for_status()
             if response.status_code == 200:
                 soup = BeautifulSoup(response.content, 'html.parser')
                 results = []
@@ -80,6 +88,8 @@ class FactFetcher:
                         })
                 return results
         except Exception as e:
+            if self.strict:
+                raise
             print(f"Pew Research error: {e}")
         return []
     
@@ -128,19 +138,21 @@ class FactFetcher:
 class AIFactGenerator:
     """Use Claude API to generate contextual facts for surveys"""
     
-    def __init__(self):
-        self.api_key = os.environ.get('ANTHROPIC_API_KEY')
+    def __init__(self, client=None, model=None, user=None):
+        # client: a stand-in such as llm.StubAnthropic instead of the shared one (see cards/llm.py)
+        self.llm = llm.Gateway(client=client, model=model)
+        self.user = user
     
-    def generate_question_context(self, topic, question_text):
-        """Generate contextual stats and learn more content"""
-        if not self.api_key:
-            return None
-        
-        try:
-            import anthropic
-            client = anthropic.Anthropic(api_key=self.api_key)
-            
-            prompt = f"""Given this survey question about {topic}:
+    @property
+    def model(self):
+        return self.llm.model
+    
+    @property
+    def available(self):
+        return self.llm.available
+    
+    def question_context_prompt(self, topic, question_text):
+        return f"""Given this survey question about {topic}:
 
 "{question_text}"
 
@@ -155,15 +167,21 @@ Format as JSON:
     "learn_more": "paragraph text",
     "sources": ["url1", "url2"]
 }}"""
-            
-            message = client.messages.create(
-                model="claude-sonnet-4-20250514",
-                max_tokens=1000,
-                messages=[{"role": "user", "content": prompt}]
-            )
-            
-            # Parse response and return structured data
-            return message.content[0].text
+    
+    def request_question_context(self, topic, question_text, refresh=False):
+        """An llm.Reply; refresh skips the response cache. Errors raise"""
+        return self.llm.complete(
+            self.question_context_prompt(topic, question_text),
+            max_tokens=1000, user=self.user, cache_reply=not refresh,
+        )
+    
+    def generate_question_context(self, topic, question_text):
+        """Generate contextual stats and learn more content"""
+        if not self.available:
+            return None
+        
+        try:
+            return self.request_question_context(topic, question_text).text
             
         except Exception as e:
             print(f"AI generation error: {e}")
@@ -0,0 +1,344 @@
+"""
+Semantic matching of PolicyFacts from a local vector index
+
+Each fact is embedded as a DIM-dimensional float32 vector by feature
+hashing: its content words, word pairs and character 4-grams (which match
+"immigrants" to "immigration") are hashed to a signed dimension, weighted
+by their IDF among all facts, and the vector is L2-normalised. Similarity is
+then a dot product, with no model download and no network.
+
+The build_fact_index command writes every fact's vector to one file:
+
+    header     magic, format, DIM, fact count, JSON length
+    JSON       {"topics": {topic: [first partition, end partition]},
+                "partitions": [[first row, end row]], "idf": {feature: idf}}
+    vocab      VOCAB_BITS bitmap of the features seen in any fact
+    ids        uint32 fact ids, rows grouped by topic, then by partition
+    crcs       uint32 CRC of each fact's text when it was embedded
+    vectors    float32, DIM per row
+    centroids  float32, DIM per partition
+
+Each topic's rows are split into about sqrt(n) partitions by spherical
+k-means (an inverted file index). Requests memory-map the file; search()
+compares the query with the centroids of the requested topic, or of every
+topic, and scans only the rows of the PROBES closest partitions, so a
+search reads a few hundred vectors however many facts there are. The
+result is approximate: a fact whose partition isn't probed is missed.
+rank() scores a given list of facts exactly, embedding on the fly any fact
+that is newer than the index or whose text changed since (the CRC no
+longer matches).
+"""
+import heapq
+import json
+import math
+import mmap
+import os
+import re
+import struct
+import zlib
+from array import array
+from operator import add, mul
+
+from django.conf import settings
+
+from .models import PolicyFact
+from .related import STOPWORDS
+
+DIM = 256
+# Bits marking which features occur in any fact; query features that don't
+# can't match anything and would only add noise where their hashes collide
+VOCAB_BITS = 1 << 20
+CHAR_GRAM = 4
+CHAR_WEIGHT = 0.5
+# Facts with no better match than this are left to relevance_score
+MIN_SIMILARITY = 0.15
+# Similar enough to recommend a fact that shares no word with the search
+STRONG_SIMILARITY = 0.2
+# Partitions scanned per search; k-means rounds, and rows sampled per
+# partition to train them, when building
+PROBES = 8
+KMEANS_ROUNDS = 3
+KMEANS_SAMPLE = 8
+
+MAGIC = b'DBFX'
+FORMAT = 2
+HEADER = struct.Struct('<4sHHII')
+
+_WORDS = re.compile(r"[a-z0-9][a-z0-9'.%$]*")
+
+
+def features(text):
+    """{feature: weight} counts for a text"""
+    words = [word.strip(".'") for word in _WORDS.findall((text or '').lower())]
+    words = [word for word in words if word and word not in STOPWORDS]
+    counts = {}
+    for word in words:
+        counts[word] = counts.get(word, 0) + 1.0
+        padded = f' {word} '
+        for i in range(len(padded) - CHAR_GRAM + 1):
+            gram = '#' + padded[i:i + CHAR_GRAM]
+            counts[gram] = counts.get(gram, 0) + CHAR_WEIGHT
+    for first, second in zip(words, words[1:]):
+        pair = f'{first} {second}'
+        counts[pair] = counts.get(pair, 0) + 1.0
+    return counts
+
+
+def _slot(feature):
+    h = zlib.crc32(feature.encode())
+    return h % DIM, (1.0 if h & 0x80000000 else -1.0)
+
+
+def _vocab_bit(feature):
+    return zlib.adler32(feature.encode()) % VOCAB_BITS
+
+
+def vectorize(counts, idf=None, default_idf=1.0):
+    """Unit-length hashed vector for features() counts"""
+    vector = array('f', bytes(4 * DIM))
+    for feature, count in counts.items():
+        weight = (1.0 + math.log(count)) if count >= 1 else count
+        if idf is not None:
+            weight *= idf.get(feature, default_idf)
+        slot, sign = _slot(feature)
+        vector[slot] += sign * weight
+    norm = math.sqrt(sum(x * x for x in vector))
+    if norm:
+        for i in range(DIM):
+            vector[i] /= norm
+    return vector
+
+
+def text_crc(text):
+    return zlib.crc32((text or '').encode())
+
+
+def index_path():
+    return settings.FACT_INDEX_PATH
+
+
+def _dot(first, second):
+    return sum(map(mul, first, second))
+
+
+def _nearest(vector, centroids):
+    return max(range(len(centroids)), key=lambda c: _dot(vector, centroids[c]))
+
+
+def _partition(vectors):
+    """
+    Spherical k-means over unit vectors: [(centroid, [row])] for about
+    sqrt(len(vectors)) partitions. Centroids start from evenly spaced rows
+    and are trained on a sample of KMEANS_SAMPLE rows per partition; every
+    row is then assigned once.
+    """
+    vectors = [list(vector) for vector in vectors]
+    count = max(1, round(math.sqrt(len(vectors))))
+    step = max(1, len(vectors) // (count * KMEANS_SAMPLE))
+    sample = vectors[::step]
+    centroids = [vectors[i * len(vectors) // count] for i in range(count)]
+    for _ in range(KMEANS_ROUNDS):
+        totals = [[0.0] * DIM for _ in centroids]
+        for vector in sample:
+            c = _nearest(vector, centroids)
+            totals[c] = list(map(add, totals[c], vector))
+        for c, total in enumerate(totals):
+            norm = math.sqrt(sum(x * x for x in total))
+            if norm:
+                centroids[c] = [x / norm for x in total]
+
+    groups = [[] for _ in centroids]
+    for row, vector in enumerate(vectors):
+        groups[_nearest(vector, centroids)].append(row)
+    return [(array('f', centroid), group) for centroid, group in zip(centroids, groups) if group]
+
+
+def build():
+    """Embed every fact and replace the index file; returns the number of facts"""
+    facts = list(PolicyFact.objects.order_by('topic', 'id').values_list('id', 'topic', 'fact_text'))
+    counts = [features(text) for _, _, text in facts]
+
+    df = {}
+    for fact_counts in counts:
+        for feature in fact_counts:
+            df[feature] = df.get(feature, 0) + 1
+    vocab = bytearray(VOCAB_BITS // 8)
+    for feature in df:
+        bit = _vocab_bit(feature)
+        vocab[bit >> 3] |= 1 << (bit & 7)
+    total = len(facts)
+    # Features in a single fact get the default (highest) IDF, so only shared ones are stored
+    idf = {feature: round(math.log((1 + total) / (1 + n)) + 1, 4) for feature, n in df.items() if n > 1}
+    default = _default_idf(total)
+    vectors = [vectorize(fact_counts, idf, default) for fact_counts in counts]
+
+    by_topic = {}
+    for row, (_, topic, _) in enumerate(facts):
+        by_topic.setdefault(topic, []).append(row)
+    order, topics, partitions, centroids = [], {}, [], []
+    for topic, rows in by_topic.items():
+        first = len(partitions)
+        for centroid, group in _partition([vectors[row] for row in rows]):
+            partitions.append([len(order), len(order) + len(group)])
+            centroids.append(centroid)
+            order.extend(rows[i] for i in group)
+        topics[topic] = [first, len(partitions)]
+    meta = json.dumps({'topics': topics, 'partitions': partitions, 'idf': idf, 'facts': total}).encode()
+    meta += b' ' * (-len(meta) % 4)
+
+    path = index_path()
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    with open(path + '.tmp', 'wb') as f:
+        f.write(HEADER.pack(MAGIC, FORMAT, DIM, total, len(meta)))
+        f.write(meta)
+        f.write(vocab)
+        f.write(array('I', [facts[row][0] for row in order]).tobytes())
+        f.write(array('I', [text_crc(facts[row][2]) for row in order]).tobytes())
+        for row in order:
+            f.write(vectors[row].tobytes())
+        for centroid in centroids:
+            f.write(centroid.tobytes())
+    # Readers holding the old file keep their mapping; new lookups see the new one
+    os.replace(path + '.tmp', path)
+    return total
+
+
+def _default_idf(total):
+    return math.log((1 + total) / 2) + 1
+
+
+class _Index:
+    """The memory-mapped vectors, reopened when build_fact_index replaces the file"""
+
+    def __init__(self, path):
+        self.path = path
+        self.identity = None
+        self.rows = None
+
+    def current(self):
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            self.identity = self.rows = None
+            return None
+        identity = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        if identity != self.identity:
+            self._open(identity)
+        return self if self.rows is not None else None
+
+    def _open(self, identity):
+        self.identity, self.rows = identity, None
+        with open(self.path, 'rb') as f:
+            if os.fstat(f.fileno()).st_size < HEADER.size:
+                return
+            self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, dim, count, meta_size = HEADER.unpack_from(self.map, 0)
+        if magic != MAGIC or version != FORMAT or dim != DIM:
+            return
+        at = HEADER.size
+        meta = json.loads(bytes(self.map[at:at + meta_size]))
+        at += meta_size
+        self.vocab = self.map[at:at + VOCAB_BITS // 8]
+        at += VOCAB_BITS // 8
+        view = memoryview(self.map)
+        self.ids = view[at:at + 4 * count].cast('I')
+        self.crcs = view[at + 4 * count:at + 8 * count].cast('I')
+        self.vectors = view[at + 8 * count:at + 8 * count + 4 * DIM * count].cast('f')
+        at += 8 * count + 4 * DIM * count
+        self.partitions = meta['partitions']
+        self.centroids = view[at:at + 4 * DIM * len(self.partitions)].cast('f')
+        self.topics = meta['topics']
+        self.idf = meta['idf']
+        self.default_idf = _default_idf(meta['facts'])
+        self.rows = {fact_id: row for row, fact_id in enumerate(self.ids)}
+
+    def vector(self, row):
+        return self.vectors[row * DIM:(row + 1) * DIM]
+
+    def centroid(self, partition):
+        return self.centroids[partition * DIM:(partition + 1) * DIM]
+
+    def known(self, feature):
+        bit = _vocab_bit(feature)
+        return self.vocab[bit >> 3] & (1 << (bit & 7))
+
+    def embed(self, text, known_only=False):
+        counts = features(text)
+        if known_only:
+            counts = {feature: count for feature, count in counts.items() if self.known(feature)}
+        return vectorize(counts, self.idf, self.default_idf)
+
+
+_index = None
+
+
+def _get_index():
+    global _index
+    path = index_path()
+    if _index is None or _index.path != path:
+        _index = _Index(path)
+    return _index.current()
+
+
+def embed(text):
+    """Query vector for text, weighted like the indexed facts when there is an index"""
+    index = _get_index()
+    return index.embed(text, known_only=True) if index else vectorize(features(text))
+
+
+def search(query, topic=None, limit=10, probes=PROBES):
+    """
+    [(similarity, fact_id)] of the indexed facts closest to query, best
+    first, from the probes partitions (of topic, or of all topics) whose
+    centroids are closest to it
+    """
+    index = _get_index()
+    if index is None or not query:
+        return []
+    target = index.embed(query, known_only=True)
+    if topic:
+        if topic not in index.topics:
+            return []
+        first, end = index.topics[topic]
+    else:
+        first, end = 0, len(index.partitions)
+    nearest = heapq.nlargest(probes, range(first, end), key=lambda p: _dot(target, index.centroid(p)))
+    vectors, ids = index.vectors, index.ids
+    scored = (
+        (_dot(target, vectors[row * DIM:(row + 1) * DIM]), ids[row])
+        for partition in nearest
+        for row in range(*index.partitions[partition])
+    )
+    return [(score, fact_id) for score, fact_id in heapq.nlargest(limit, scored) if score > 0]
+
+
+def rank(query, facts):
+    """
+    facts sorted by similarity to query, each with a .similarity; ties (and
+    facts that don't match at all) keep relevance_score order
+    """
+    index = _get_index()
+    target = embed(query)
+    for fact in facts:
+        row = index.rows.get(fact.id) if index else None
+        if row is not None and index.crcs[row] == text_crc(fact.fact_text):
+            vector = index.vector(row)
+        else:
+            vector = index.embed(fact.fact_text) if index else vectorize(features(fact.fact_text))
+        fact.similarity = _dot(target, vector)
+    return sorted(facts, key=lambda fact: (-round(fact.similarity, 4), -fact.relevance_score))
+
+
+def facts_for(query, topic, limit=4):
+    """
+    The topic's facts most relevant to query. Falls back to the top facts by
+    relevance_score when nothing is similar enough, e.g. before the index has
+    been built for a new topic's vocabulary.
+    """
+    facts = list(PolicyFact.objects.filter(topic=topic).order_by('-relevance_score', '-last_verified'))
+    ranked = [fact for fact in rank(query, facts) if fact.similarity >= MIN_SIMILARITY]
+    picked = ranked[:limit]
+    if len(picked) < limit:
+        chosen = {fact.id for fact in picked}
+        picked += [fact for fact in facts if fact.id not in chosen][:limit - len(picked)]
+    return picked
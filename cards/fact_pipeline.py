@@ -0,0 +1,239 @@
+"""
+Parallel, incremental fact updates for the update_facts command
+
+Each topic's facts come from FEEDS: a fetch function that turns one
+upstream source into fact dicts, and the host it requests. A run:
+
+1. skips feeds fetched successfully within MAX_AGE (unless forced), checked
+   with one query over FactFeed, and feeds the run already wrote when it is
+   a resumed run;
+2. fetches the rest on a pool of FACT_FETCH_WORKERS threads, at most one
+   request per FACT_FETCH_HOST_INTERVAL seconds to any one host;
+3. hashes each feed's facts, and when the hash matches the FactFeed's from
+   the last fetch, only marks those facts verified;
+4. otherwise upserts the feed's facts in bulk: one query for the facts that
+   already exist, then one bulk_create and one bulk_update.
+
+Only fetching happens on the pool. Results are written on the calling
+thread as they arrive, each feed in one transaction with the run's progress
+(FactUpdateRun.completed and metrics), so an interrupted run resumes after
+the last feed it wrote. Failed feeds aren't marked completed and are
+retried on resume.
+"""
+import hashlib
+import json
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from . import fact_index
+from .fact_apis import FactFetcher
+from .models import FactFeed, FactUpdateRun, PolicyFact
+
+MAX_AGE = timedelta(days=7)
+FACT_FIELDS = ('source_name', 'source_url', 'fact_type', 'relevance_score')
+METRICS = ('fetched', 'changed', 'unchanged', 'skipped', 'failed', 'created', 'updated')
+
+Feed = namedtuple('Feed', 'source host fetch')
+
+
+def _migration_policy(fetcher):
+    data = fetcher.fetch_migration_policy_data('immigration')
+    if not data:
+        return []
+    return [{
+        'fact_text': f"Unauthorized immigrant population: {data['unauthorized_population']}",
+        'source_name': data['source'],
+        'source_url': data['url'],
+        'fact_type': 'statistic',
+        'relevance_score': 95,
+    }]
+
+
+def _pew(query, fact_type, relevance_score, limit):
+    def fetch(fetcher):
+        return [{
+            'fact_text': result['title'],
+            'source_name': 'Pew Research Center',
+            'source_url': result['url'],
+            'fact_type': fact_type,
+            'relevance_score': relevance_score,
+        } for result in fetcher.search_pew_research(query)[:limit]]
+    return fetch
+
+
+# Topics without feeds (economy's census data isn't turned into facts yet) are skipped
+FEEDS = {
+    'immigration': [
+        Feed('mpi', 'www.migrationpolicy.org', _migration_policy),
+        Feed('pew', 'www.pewresearch.org', _pew('immigration statistics', 'study', 85, 3)),
+    ],
+    'healthcare': [
+        Feed('pew', 'www.pewresearch.org', _pew('healthcare coverage', 'poll', 80, 2)),
+    ],
+}
+
+
+def feed_key(topic, feed):
+    return f'{topic}:{feed.source}'
+
+
+def content_hash(facts):
+    return hashlib.sha256(json.dumps(facts, sort_keys=True).encode()).hexdigest()
+
+
+class HostLimiter:
+    """Spaces requests to each host at least `interval` seconds apart, across threads"""
+
+    def __init__(self, interval):
+        self.interval = interval
+        self.lock = threading.Lock()
+        self.next_at = {}
+
+    def wait(self, host):
+        with self.lock:
+            now = time.monotonic()
+            at = max(now, self.next_at.get(host, now))
+            self.next_at[host] = at + self.interval
+        if at > now:
+            time.sleep(at - now)
+
+
+def upsert(topic, facts):
+    """Create or update a feed's facts, matched on topic and text; returns (created, updated)"""
+    by_text = {fact['fact_text']: fact for fact in facts}
+    existing = {}
+    for fact in PolicyFact.objects.filter(topic=topic, fact_text__in=list(by_text)):
+        existing.setdefault(fact.fact_text, fact)
+
+    now = timezone.now()
+    new, changed = [], []
+    for text, values in by_text.items():
+        fact = existing.get(text)
+        if fact is None:
+            new.append(PolicyFact(topic=topic, last_verified=now, **values))
+            continue
+        for field in FACT_FIELDS:
+            setattr(fact, field, values[field])
+        # bulk_update skips auto_now
+        fact.last_verified = now
+        changed.append(fact)
+    PolicyFact.objects.bulk_create(new)
+    PolicyFact.objects.bulk_update(changed, [*FACT_FIELDS, 'last_verified'])
+    return len(new), len(changed)
+
+
+def run(topics=None, force=False, resume=False, workers=None, fetcher=None, log=print):
+    """
+    Update the topics' facts (all topics with feeds by default); with resume,
+    continue the latest interrupted run instead. Returns the FactUpdateRun.
+    """
+    if resume:
+        update_run = FactUpdateRun.objects.filter(status__in=['running', 'interrupted']).first()
+        if update_run is None:
+            raise FactUpdateRun.DoesNotExist('No interrupted update_facts run to resume')
+        update_run.status = 'running'
+        update_run.save(update_fields=['status'])
+    else:
+        update_run = FactUpdateRun.objects.create(topics=list(topics or FEEDS), force=force)
+    metrics = {name: update_run.metrics.get(name, 0) for name in METRICS}
+
+    feeds = [(topic, feed) for topic in update_run.topics for feed in FEEDS.get(topic, ())]
+    states = FactFeed.objects.in_bulk([feed_key(topic, feed) for topic, feed in feeds], field_name='key')
+    completed = set(update_run.completed)
+    fresh_after = timezone.now() - MAX_AGE
+    pending = []
+    for topic, feed in feeds:
+        key = feed_key(topic, feed)
+        state = states.get(key)
+        if key in completed:
+            continue
+        if (not update_run.force and state and state.last_fetched and state.last_fetched >= fresh_after
+                and not state.last_error):
+            log(f"  ⏭️  {key} (fetched {state.last_fetched:%Y-%m-%d})")
+            metrics['skipped'] += 1
+            continue
+        pending.append((topic, feed))
+
+    fetcher = fetcher or FactFetcher(strict=True)
+    limiter = HostLimiter(settings.FACT_FETCH_HOST_INTERVAL)
+
+    def fetch(feed):
+        limiter.wait(feed.host)
+        return feed.fetch(fetcher)
+
+    started = time.monotonic()
+    changed_before = metrics['changed']
+    pool = ThreadPoolExecutor(max_workers=workers or settings.FACT_FETCH_WORKERS)
+    try:
+        futures = {pool.submit(fetch, feed): (topic, feed) for topic, feed in pending}
+        for future in as_completed(futures):
+            topic, feed = futures[future]
+            _write(update_run, metrics, topic, feed, states, future, log)
+    except BaseException:
+        pool.shutdown(wait=False, cancel_futures=True)
+        _finish(update_run, 'interrupted', metrics, started)
+        raise
+    pool.shutdown()
+    _finish(update_run, 'finished', metrics, started)
+
+    if metrics['changed'] > changed_before:
+        fact_index.build()
+    return update_run
+
+
+def _write(update_run, metrics, topic, feed, states, future, log):
+    key = feed_key(topic, feed)
+    state = states.get(key) or FactFeed(key=key, topic=topic)
+    now = timezone.now()
+    try:
+        facts = future.result()
+    except Exception as exc:
+        metrics['failed'] += 1
+        state.last_error = f'{type(exc).__name__}: {exc}'[:1000]
+        with transaction.atomic():
+            state.save()
+            update_run.metrics = metrics
+            update_run.save(update_fields=['metrics'])
+        log(f"  ❌ {key}: {state.last_error}")
+        return
+
+    metrics['fetched'] += 1
+    digest = content_hash(facts)
+    with transaction.atomic():
+        if digest == state.content_hash:
+            metrics['unchanged'] += 1
+            PolicyFact.objects.filter(topic=topic, fact_text__in=[fact['fact_text'] for fact in facts]).update(
+                last_verified=now,
+            )
+            log(f"  ➖ {key} unchanged ({len(facts)} facts re-verified)")
+        else:
+            created, updated = upsert(topic, facts)
+            metrics['changed'] += 1
+            metrics['created'] += created
+            metrics['updated'] += updated
+            state.content_hash = digest
+            state.fact_count = len(facts)
+            state.last_changed = now
+            log(f"  ✅ {key}: {created} new, {updated} updated")
+        state.last_fetched = now
+        state.last_error = ''
+        state.save()
+        update_run.completed.append(key)
+        update_run.metrics = metrics
+        update_run.save(update_fields=['completed', 'metrics'])
+
+
+def _finish(update_run, status, metrics, started):
+    update_run.status = status
+    update_run.metrics = metrics
+    update_run.duration_seconds += time.monotonic() - started
+    if status == 'finished':
+        update_run.finished_at = timezone.now()
+    update_run.save(update_fields=['status', 'metrics', 'duration_seconds', 'finished_at'])
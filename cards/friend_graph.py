@@ -0,0 +1,103 @@
+"""
+Cached friend graph
+
+Each user's friend IDs (accepted friend requests, either direction) and
+following IDs (Follow rows) are kept in the cache as sorted int64 arrays,
+a few bytes per edge. Readers get frozensets, so membership checks are O(1)
+and "which of these users are my friends" is a set intersection. Signals
+drop a user's entries whenever a follow, unfollow or friend request changes,
+once the change commits, so a concurrent reader can't cache the old IDs
+after the drop.
+"""
+from array import array
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Q
+
+from .instrumentation import cache_get
+from .models import Follow, FriendRequest
+
+CACHE_TIMEOUT = 60 * 60 * 24
+
+
+def _key(kind, user_id):
+    return f'friend_graph:{kind}:{user_id}'
+
+
+def _encode(ids):
+    return array('q', sorted(ids)).tobytes()
+
+
+def _decode(data):
+    ids = array('q')
+    ids.frombytes(data)
+    return frozenset(ids)
+
+
+def _load_friends(user_id):
+    pairs = FriendRequest.objects.filter(
+        Q(from_user_id=user_id) | Q(to_user_id=user_id),
+        status='accepted',
+    ).values_list('from_user_id', 'to_user_id')
+    return {to_id if from_id == user_id else from_id for from_id, to_id in pairs}
+
+
+def _load_following(user_id):
+    return set(Follow.objects.filter(follower_id=user_id).values_list('following_id', flat=True))
+
+
+def _ids(kind, user_id, loader):
+    if not user_id:
+        return frozenset()
+    data = cache_get(_key(kind, user_id))
+    if data is None:
+        ids = loader(user_id)
+        cache.set(_key(kind, user_id), _encode(ids), CACHE_TIMEOUT)
+        return frozenset(ids)
+    return _decode(data)
+
+
+def friend_ids(user_id):
+    """IDs of the user's accepted friends"""
+    return _ids('friends', user_id, _load_friends)
+
+
+def following_ids(user_id):
+    """IDs of the users this user follows"""
+    return _ids('following', user_id, _load_following)
+
+
+def are_friends(user_id, other_id):
+    return other_id in friend_ids(user_id)
+
+
+def is_following(user_id, other_id):
+    return other_id in following_ids(user_id)
+
+
+def follows_each_other(user_id, other_id):
+    return is_following(user_id, other_id) and is_following(other_id, user_id)
+
+
+def friends_among(user_id, user_ids):
+    """The subset of user_ids who are the user's friends"""
+    return friend_ids(user_id).intersection(user_ids)
+
+
+def followed_among(user_id, user_ids):
+    """The subset of user_ids the user follows"""
+    return following_ids(user_id).intersection(user_ids)
+
+
+def _invalidate(kind, user_ids):
+    keys = [_key(kind, user_id) for user_id in user_ids]
+    transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+def invalidate_friends(*user_ids):
+    _invalidate('friends', user_ids)
+
+
+def invalidate_following(*user_ids):
+    _invalidate('following', user_ids)
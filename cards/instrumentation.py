@@ -0,0 +1,314 @@
+"""
+Per-request performance instrumentation
+
+Collects, for the request being served, DB query count/time, cache hits and
+misses, outbound HTTP calls and LLM calls. PerformanceMiddleware turns that
+into a Server-Timing header and a JSON log line, and every finished request
+is folded into an in-process histogram rendered in Prometheus text format.
+"""
+import contextvars
+import json
+import logging
+import threading
+import time
+from collections import defaultdict
+from urllib.parse import urlsplit
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds (seconds) for latency histogram buckets
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+LLM_DURATION_BUCKETS = (0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 40.0, 60.0)
+
+_current = contextvars.ContextVar('request_metrics', default=None)
+
+
+class RequestMetrics:
+    """Counters for a single request"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.view_name = None
+        self.db_queries = 0
+        self.db_time = 0.0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.external_calls = []  # (host, seconds)
+        self.llm_calls = []  # (model, input_tokens, output_tokens, seconds)
+
+    @property
+    def external_time(self):
+        return sum(duration for _, duration in self.external_calls)
+
+    @property
+    def llm_time(self):
+        return sum(call[3] for call in self.llm_calls)
+
+    def as_dict(self, total, status):
+        return {
+            'view': self.view_name,
+            'status': status,
+            'total_ms': round(total * 1000, 2),
+            'db_queries': self.db_queries,
+            'db_ms': round(self.db_time * 1000, 2),
+            'cache_hits': self.cache_hits,
+            'cache_misses': self.cache_misses,
+            'external': [
+                {'host': host, 'ms': round(duration * 1000, 2)}
+                for host, duration in self.external_calls
+            ],
+            'llm': [
+                {'model': model, 'input_tokens': tokens_in, 'output_tokens': tokens_out, 'ms': round(duration * 1000, 2)}
+                for model, tokens_in, tokens_out, duration in self.llm_calls
+            ],
+        }
+
+    def server_timing(self, total):
+        """Value for the Server-Timing response header"""
+        parts = [
+            f'total;dur={total * 1000:.1f}',
+            f'db;dur={self.db_time * 1000:.1f};desc="{self.db_queries} queries"',
+            f'cache;desc="{self.cache_hits} hits, {self.cache_misses} misses"',
+        ]
+        if self.external_calls:
+            parts.append(f'ext;dur={self.external_time * 1000:.1f};desc="{len(self.external_calls)} calls"')
+        if self.llm_calls:
+            parts.append(f'llm;dur={self.llm_time * 1000:.1f};desc="{len(self.llm_calls)} calls"')
+        return ', '.join(parts)
+
+
+def current_metrics():
+    """Metrics for the request running in this context, or None"""
+    return _current.get()
+
+
+def start_request():
+    metrics = RequestMetrics()
+    token = _current.set(metrics)
+    return metrics, token
+
+
+def end_request(token):
+    _current.reset(token)
+
+
+def db_timer(execute, sql, params, many, context):
+    """connection.execute_wrapper hook that times every query"""
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics = _current.get()
+        if metrics is not None:
+            metrics.db_queries += 1
+            metrics.db_time += time.perf_counter() - started
+
+
+def record_cache(hit):
+    metrics = _current.get()
+    if metrics is not None:
+        if hit:
+            metrics.cache_hits += 1
+        else:
+            metrics.cache_misses += 1
+    registry.observe_cache(hit)
+
+
+def cache_get(key, default=None, cache=None):
+    """cache.get() that counts the lookup as a hit or miss"""
+    if cache is None:
+        from django.core.cache import cache
+    sentinel = object()
+    value = cache.get(key, sentinel)
+    record_cache(value is not sentinel)
+    return default if value is sentinel else value
+
+
+def record_external_call(url_or_host, duration):
+    host = urlsplit(url_or_host).hostname if '://' in url_or_host else url_or_host
+    host = host or 'unknown'
+    metrics = _current.get()
+    if metrics is not None:
+        metrics.external_calls.append((host, duration))
+    registry.observe_external(host, duration)
+
+
+def record_llm_call(model, usage, duration):
+    """Record one LLM round trip; usage is the SDK's usage object (or None)"""
+    input_tokens = getattr(usage, 'input_tokens', 0) or 0
+    output_tokens = getattr(usage, 'output_tokens', 0) or 0
+    metrics = _current.get()
+    if metrics is not None:
+        metrics.llm_calls.append((model, input_tokens, output_tokens, duration))
+    registry.observe_llm(model, input_tokens, output_tokens, duration)
+
+
+def record_llm_result(model, result):
+    """Count how an LLM request was answered: called, cached, shared, budget or error"""
+    registry.observe_llm_result(model, result)
+
+
+class Histogram:
+    def __init__(self, buckets=DURATION_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.total += value
+        self.count += 1
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+
+    def render(self, name, labels):
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            lines.append(f'{name}_bucket{_labels(labels, le=bound)} {cumulative}')
+        lines.append(f'{name}_bucket{_labels(labels, le="+Inf")} {self.count}')
+        lines.append(f'{name}_sum{_labels(labels)} {self.total:.6f}')
+        lines.append(f'{name}_count{_labels(labels)} {self.count}')
+        return lines
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(labels, **extra):
+    items = list(labels.items()) + list(extra.items())
+    if not items:
+        return ''
+    return '{' + ','.join(f'{key}="{_escape(value)}"' for key, value in items) + '}'
+
+
+class MetricsRegistry:
+    """Process-wide aggregates, rendered for Prometheus"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.requests = defaultdict(Histogram)  # (view, status class)
+            self.db_queries = defaultdict(int)
+            self.db_seconds = defaultdict(float)
+            self.cache = defaultdict(int)  # 'hit' / 'miss'
+            self.external = defaultdict(Histogram)  # host
+            self.llm_calls = defaultdict(int)
+            self.llm_seconds = defaultdict(float)
+            self.llm_tokens = defaultdict(int)  # (model, 'input'/'output')
+            self.llm_latency = defaultdict(lambda: Histogram(LLM_DURATION_BUCKETS))  # model
+            self.llm_results = defaultdict(int)  # (model, result)
+
+    def observe_request(self, metrics, total, status):
+        view = metrics.view_name or 'unresolved'
+        with self.lock:
+            self.requests[(view, f'{status // 100}xx')].observe(total)
+            self.db_queries[view] += metrics.db_queries
+            self.db_seconds[view] += metrics.db_time
+
+    def observe_cache(self, hit):
+        with self.lock:
+            self.cache['hit' if hit else 'miss'] += 1
+
+    def observe_external(self, host, duration):
+        with self.lock:
+            self.external[host].observe(duration)
+
+    def observe_llm(self, model, input_tokens, output_tokens, duration):
+        with self.lock:
+            self.llm_calls[model] += 1
+            self.llm_seconds[model] += duration
+            self.llm_tokens[(model, 'input')] += input_tokens
+            self.llm_tokens[(model, 'output')] += output_tokens
+            self.llm_latency[model].observe(duration)
+
+    def observe_llm_result(self, model, result):
+        with self.lock:
+            self.llm_results[(model, result)] += 1
+
+    def render(self):
+        """Prometheus text exposition format (version 0.0.4)"""
+        with self.lock:
+            lines = [
+                '# HELP debrief_request_duration_seconds Request latency by view.',
+                '# TYPE debrief_request_duration_seconds histogram',
+            ]
+            for (view, status), histogram in sorted(self.requests.items()):
+                lines += histogram.render('debrief_request_duration_seconds', {'view': view, 'status': status})
+
+            lines += ['# HELP debrief_db_queries_total DB queries issued by view.',
+                      '# TYPE debrief_db_queries_total counter']
+            lines += [f'debrief_db_queries_total{_labels({"view": v})} {n}' for v, n in sorted(self.db_queries.items())]
+            lines += ['# HELP debrief_db_duration_seconds_total Time spent in DB queries by view.',
+                      '# TYPE debrief_db_duration_seconds_total counter']
+            lines += [f'debrief_db_duration_seconds_total{_labels({"view": v})} {s:.6f}' for v, s in sorted(self.db_seconds.items())]
+
+            lines += ['# HELP debrief_cache_requests_total Cache lookups by result.',
+                      '# TYPE debrief_cache_requests_total counter']
+            lines += [f'debrief_cache_requests_total{_labels({"result": r})} {n}' for r, n in sorted(self.cache.items())]
+
+            lines += ['# HELP debrief_external_request_duration_seconds Outbound HTTP latency by host.',
+                      '# TYPE debrief_external_request_duration_seconds histogram']
+            for host, histogram in sorted(self.external.items()):
+                lines += histogram.render('debrief_external_request_duration_seconds', {'host': host})
+
+            lines += ['# HELP debrief_llm_calls_total LLM calls by model.',
+                      '# TYPE debrief_llm_calls_total counter']
+            lines += [f'debrief_llm_calls_total{_labels({"model": m})} {n}' for m, n in sorted(self.llm_calls.items())]
+            lines += ['# HELP debrief_llm_duration_seconds_total Time spent waiting on LLM calls by model.',
+                      '# TYPE debrief_llm_duration_seconds_total counter']
+            lines += [f'debrief_llm_duration_seconds_total{_labels({"model": m})} {s:.6f}' for m, s in sorted(self.llm_seconds.items())]
+            lines += ['# HELP debrief_llm_tokens_total LLM tokens by model and direction.',
+                      '# TYPE debrief_llm_tokens_total counter']
+            lines += [
+                f'debrief_llm_tokens_total{_labels({"model": m, "kind": k})} {n}'
+                for (m, k), n in sorted(self.llm_tokens.items())
+            ]
+            lines += ['# HELP debrief_llm_request_duration_seconds LLM call latency by model.',
+                      '# TYPE debrief_llm_request_duration_seconds histogram']
+            for model, histogram in sorted(self.llm_latency.items()):
+                lines += histogram.render('debrief_llm_request_duration_seconds', {'model': model})
+            lines += ['# HELP debrief_llm_requests_total LLM gateway requests by model and how they were answered.',
+                      '# TYPE debrief_llm_requests_total counter']
+            lines += [
+                f'debrief_llm_requests_total{_labels({"model": m, "result": r})} {n}'
+                for (m, r), n in sorted(self.llm_results.items())
+            ]
+        return '\n'.join(lines) + '\n'
+
+
+registry = MetricsRegistry()
+
+
+def log_request(metrics, total, status):
+    logger.info(json.dumps({'event': 'request', **metrics.as_dict(total, status)}))
+
+
+_requests_patched = False
+
+
+def instrument_requests():
+    """Time every outbound call made through the `requests` library"""
+    global _requests_patched
+    if _requests_patched:
+        return
+    import requests
+
+    original_send = requests.Session.send
+
+    def send(self, request, **kwargs):
+        started = time.perf_counter()
+        try:
+            return original_send(self, request, **kwargs)
+        finally:
+            record_external_call(request.url, time.perf_counter() - started)
+
+    requests.Session.send = send
+    _requests_patched = True
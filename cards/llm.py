@@ -0,0 +1,286 @@
+"""
+One gateway for every LLM call
+
+ArticleSummarizer, AIFactGenerator and AISearchHelper send their prompts
+through Gateway.complete(), which adds:
+
+- a response cache: replies are kept in the shared cache for
+  LLM_CACHE_TIMEOUT under a hash of the backend, model, max_tokens, system
+  prompt and prompt, so an identical prompt is only paid for once;
+- deduplication: a request identical to one already in flight waits for
+  that call's reply instead of sending its own;
+- token budgets: LLM_USER_DAILY_TOKENS per user and LLM_GLOBAL_DAILY_TOKENS
+  in total, counted per UTC day in the shared cache. A request that could
+  go over either raises BudgetExceeded before anything is sent, or before
+  it joins an identical call in flight, whoever sent that one. The counts
+  are updated after each call without a lock, so concurrent calls can
+  overshoot by up to one request each;
+- one pooled client per process (the SDK client keeps its HTTP connections
+  open and can be shared between threads), created with LLM_TIMEOUT and
+  LLM_MAX_RETRIES;
+- metrics: latency and tokens per call (record_llm_call), and how each
+  request was answered (record_llm_result), in instrumentation.py.
+
+LLM_BACKEND=stub answers every request with StubAnthropic, locally and
+without an API key.
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+from types import SimpleNamespace
+from typing import NamedTuple
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .instrumentation import record_llm_call, record_llm_result
+
+CACHE_PREFIX = 'llm:reply'
+BUDGET_PREFIX = 'llm:tokens'
+# Daily counters outlive their day so a late call still finds them
+BUDGET_TTL = 60 * 60 * 48
+CHARS_PER_TOKEN = 4
+
+
+class LLMError(Exception):
+    pass
+
+
+class LLMUnavailable(LLMError):
+    """No API key, and no stub backend or injected client"""
+
+
+class BudgetExceeded(LLMError):
+    """The request could take the user or the site over its daily token budget"""
+
+
+class Reply(NamedTuple):
+    text: str
+    model: str
+    input_tokens: int
+    output_tokens: int
+    cached: bool = False  # served from the response cache
+    shared: bool = False  # answered by an identical request already in flight
+
+
+class StubAnthropic:
+    """
+    Local stand-in for anthropic.Anthropic (LLM_BACKEND=stub, or passed to
+    Gateway as its client): messages.create() waits `latency` seconds and
+    answers with reply(prompt), with usage estimated from the text length.
+    Counts calls in .calls.
+    """
+
+    def __init__(self, latency=0.05):
+        self.latency = latency
+        self.calls = 0
+        self._lock = threading.Lock()
+        self.messages = SimpleNamespace(create=self._create)
+
+    def reply(self, prompt):
+        return f'[stub reply] {prompt[:200]}'
+
+    def _create(self, model, max_tokens, messages, system=None, **kwargs):
+        with self._lock:
+            self.calls += 1
+        time.sleep(self.latency)
+        prompt = messages[-1]['content']
+        text = self.reply(prompt)
+        return SimpleNamespace(
+            content=[SimpleNamespace(type='text', text=text)],
+            usage=SimpleNamespace(
+                input_tokens=len((system or '') + prompt) // CHARS_PER_TOKEN,
+                output_tokens=min(len(text) // CHARS_PER_TOKEN, max_tokens),
+            ),
+        )
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def default_client():
+    """The process-wide client for LLM_BACKEND, or None without an API key"""
+    global _client
+    with _client_lock:
+        if _client is None:
+            if settings.LLM_BACKEND == 'stub':
+                _client = StubAnthropic()
+            elif os.environ.get('ANTHROPIC_API_KEY'):
+                import anthropic
+                _client = anthropic.Anthropic(
+                    api_key=os.environ['ANTHROPIC_API_KEY'],
+                    timeout=settings.LLM_TIMEOUT,
+                    max_retries=settings.LLM_MAX_RETRIES,
+                )
+        return _client
+
+
+class _Call:
+    """A request in flight, which identical requests wait on"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.reply = None
+        self.error = None
+
+
+_inflight = {}
+_inflight_lock = threading.Lock()
+
+
+def request_key(backend, model, max_tokens, system, prompt):
+    payload = json.dumps([backend, model, max_tokens, system or '', prompt])
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def _budgets(user):
+    day = time.strftime('%Y%m%d', time.gmtime())
+    budgets = [(f'{BUDGET_PREFIX}:{day}', settings.LLM_GLOBAL_DAILY_TOKENS)]
+    if user is not None and getattr(user, 'is_authenticated', False):
+        budgets.append((f'{BUDGET_PREFIX}:{day}:user:{user.pk}', settings.LLM_USER_DAILY_TOKENS))
+    return budgets
+
+
+def tokens_used(user=None):
+    """Tokens spent today by the user (or by everyone, without one)"""
+    key, _ = _budgets(user)[-1]
+    return cache.get(key, 0)
+
+
+def _check_budget(user, model, estimate):
+    budgets = _budgets(user)
+    used = cache.get_many([key for key, _ in budgets])
+    for key, limit in budgets:
+        if limit and used.get(key, 0) + estimate > limit:
+            record_llm_result(model, 'budget')
+            scope = 'your' if ':user:' in key else "the site's"
+            raise BudgetExceeded(f"This request would exceed {scope} daily AI budget of {limit:,} tokens")
+
+
+def _spend(user, tokens):
+    for key, _ in _budgets(user):
+        cache.add(key, 0, timeout=BUDGET_TTL)
+        try:
+            cache.incr(key, tokens)
+        except ValueError:
+            # Evicted between add() and incr()
+            cache.set(key, tokens, timeout=BUDGET_TTL)
+
+
+class Gateway:
+    """
+    Sends prompts to one model. The default client is the shared one for
+    LLM_BACKEND; pass `client` to use another (e.g. a StubAnthropic).
+    """
+
+    def __init__(self, client=None, model=None):
+        self._client = client
+        self.model = model or settings.LLM_MODEL
+
+    @property
+    def client(self):
+        return self._client if self._client is not None else default_client()
+
+    @property
+    def available(self):
+        return self.client is not None
+
+    def complete(self, prompt, max_tokens=500, system=None, user=None, cache_reply=True, timeout=None):
+        """
+        A Reply to a single-turn prompt. user counts the tokens against that
+        user's budget; cache_reply=False asks the model even when a cached
+        reply exists (and replaces it). Raises LLMUnavailable,
+        BudgetExceeded, or the SDK's errors.
+        """
+        client = self.client
+        if client is None:
+            raise LLMUnavailable('ANTHROPIC_API_KEY is not set')
+        key = request_key(type(client).__name__, self.model, max_tokens, system, prompt)
+
+        if cache_reply:
+            stored = cache.get(f'{CACHE_PREFIX}:{key}')
+            if stored is not None:
+                record_llm_result(self.model, 'cached')
+                return Reply(*stored, cached=True)
+
+        # Every caller is checked against its own budget, including one that
+        # ends up sharing another user's call
+        _check_budget(user, self.model, (len(system or '') + len(prompt)) // CHARS_PER_TOKEN + max_tokens)
+        while True:
+            with _inflight_lock:
+                call = _inflight.get(key)
+                leader = call is None
+                if leader:
+                    call = _inflight[key] = _Call()
+            if leader:
+                break
+            call.done.wait()
+            if isinstance(call.error, BudgetExceeded):
+                # The leader's budget, not this caller's: send it ourselves
+                continue
+            if call.error is not None:
+                raise call.error
+            record_llm_result(self.model, 'shared')
+            return call.reply._replace(shared=True)
+
+        try:
+            call.reply = self._send(client, key, prompt, max_tokens, system, user, timeout)
+            return call.reply
+        except BaseException as exc:
+            call.error = exc
+            raise
+        finally:
+            with _inflight_lock:
+                _inflight.pop(key, None)
+            call.done.set()
+
+    def _send(self, client, key, prompt, max_tokens, system, user, timeout):
+        request = {
+            'model': self.model,
+            'max_tokens': max_tokens,
+            'messages': [{'role': 'user', 'content': prompt}],
+            'timeout': timeout or settings.LLM_TIMEOUT,
+        }
+        if system:
+            request['system'] = system
+
+        started = time.perf_counter()
+        try:
+            message = client.messages.create(**request)
+        except Exception:
+            record_llm_result(self.model, 'error')
+            raise
+        record_llm_call(self.model, message.usage, time.perf_counter() - started)
+        record_llm_result(self.model, 'called')
+
+        input_tokens = getattr(message.usage, 'input_tokens', 0) or 0
+        output_tokens = getattr(message.usage, 'output_tokens', 0) or 0
+        _spend(user, input_tokens + output_tokens)
+        text = ''.join(getattr(block, 'text', '') for block in message.content)
+        reply = Reply(text, self.model, input_tokens, output_tokens)
+        cache.set(f'{CACHE_PREFIX}:{key}', tuple(reply[:4]), timeout=settings.LLM_CACHE_TIMEOUT)
+        return reply
+
+
+def parse_json_reply(text):
+    """
+    The first JSON object in a reply, or None. Tolerates code fences and
+    prose around the object.
+    """
+    if not text:
+        return None
+    decoder = json.JSONDecoder()
+    at = text.find('{')
+    while at != -1:
+        try:
+            value, _ = decoder.raw_decode(text, at)
+        except json.JSONDecodeError:
+            at = text.find('{', at + 1)
+            continue
+        if isinstance(value, dict):
+            return value
+        at = text.find('{', at + 1)
+    return None
@@ -0,0 +1,99 @@
+"""
+Compare card_detail render cost with a cold and a warm argument fragment
+Run: python manage.py benchmark_card_detail --repeat 20
+"""
+import inspect
+import statistics
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser, User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext
+
+from cards import view_cache
+from cards.models import Card
+from cards.views import card_detail
+
+# The undecorated view, past conditional() and the whole-page cache, so neither answers for it
+render_detail = inspect.unwrap(card_detail)
+
+
+class Command(BaseCommand):
+    help = 'Benchmark card_detail: cold vs warm argument fragment, queries and ms per render'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--card', type=int, help='Card ID (default: the public card with the most arguments)')
+        parser.add_argument('--viewer', help='Username to render as (default: anonymous)')
+        parser.add_argument('--repeat', type=int, default=10, help='Renders per measurement; the median is reported')
+
+    def handle(self, *args, **options):
+        card = self.get_card(options['card'])
+        viewer = self.get_viewer(options['viewer'])
+        factory = RequestFactory()
+        stamp = f'card:{card.id}'
+
+        self.stdout.write(
+            f"🃏 Card {card.id}: {card.arguments.count()} arguments, "
+            f"viewer {getattr(viewer, 'username', '') or 'anonymous'}, cache {settings.CACHES['default']['BACKEND'].rsplit('.', 1)[-1]}\n"
+        )
+
+        def render():
+            request = factory.get(f'/card/{card.id}/')
+            request.user = viewer
+            response = render_detail(request, card.id)
+            if response.status_code != 200:
+                raise CommandError(f'card_detail returned {response.status_code} for this viewer')
+            return response
+
+        def cold():
+            # A new stamp value means the fragment must be rebuilt
+            view_cache.bump(stamp)
+            return render()
+
+        cold_queries, cold_ms = self.measure(cold, options['repeat'])
+        render()
+        warm_queries, warm_ms = self.measure(render, options['repeat'])
+
+        self.stdout.write(f"{'':>6} {'queries':>8} {'median ms':>10}")
+        self.stdout.write(f"{'cold':>6} {cold_queries:>8} {cold_ms:>10.2f}")
+        self.stdout.write(f"{'warm':>6} {warm_queries:>8} {warm_ms:>10.2f}")
+        self.stdout.write(self.style.SUCCESS(f'\n✅ Warm renders are {cold_ms / max(warm_ms, 0.001):.1f}x faster'))
+
+    def get_card(self, card_id):
+        if card_id:
+            try:
+                return Card.objects.get(id=card_id)
+            except Card.DoesNotExist:
+                raise CommandError(f'No card with ID {card_id}')
+        card = (
+            Card.objects.filter(visibility='public')
+            .annotate(n=Count('arguments'))
+            .order_by('-n')
+            .first()
+        )
+        if card is None:
+            raise CommandError('No public cards yet; run generate_load_data first')
+        return card
+
+    def get_viewer(self, username):
+        if not username:
+            return AnonymousUser()
+        try:
+            return User.objects.get(username=username)
+        except User.DoesNotExist:
+            raise CommandError(f'No user named "{username}"')
+
+    def measure(self, run, repeat):
+        timings = []
+        queries = 0
+        for _ in range(max(repeat, 1)):
+            with CaptureQueriesContext(connection) as captured:
+                started = time.perf_counter()
+                run()
+                timings.append((time.perf_counter() - started) * 1000)
+            queries = len(captured)
+        return queries, statistics.median(timings)
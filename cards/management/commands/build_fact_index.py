@@ -0,0 +1,38 @@
+"""
+Rebuild the fact vectors used to match facts to survey questions and searches
+Run: python manage.py build_fact_index          (after update_facts or seeding facts)
+     python manage.py build_fact_index --query "border encounters" --topic immigration
+"""
+import os
+import time
+
+from django.core.management.base import BaseCommand
+
+from cards import fact_index
+from cards.models import PolicyFact
+
+
+class Command(BaseCommand):
+    help = 'Embed every PolicyFact into the local vector index (cards/fact_index.py)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--query', type=str, help='Show the closest facts to this text after building')
+        parser.add_argument('--topic', type=str, help='Restrict --query to one topic')
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        count = fact_index.build()
+        size = os.path.getsize(fact_index.index_path())
+        self.stdout.write(f"🧮 Embedded {count:,} facts, {fact_index.DIM} dimensions ({size / 1024:,.0f} KB)")
+
+        if options['query']:
+            searched = time.perf_counter()
+            hits = fact_index.search(options['query'], topic=options['topic'], limit=5)
+            elapsed = (time.perf_counter() - searched) * 1000
+            facts = PolicyFact.objects.in_bulk([fact_id for _, fact_id in hits])
+            self.stdout.write(f"\n🔎 \"{options['query']}\" ({elapsed:.1f} ms)")
+            for score, fact_id in hits:
+                if fact_id in facts:
+                    self.stdout.write(f"  {score:.2f}  {facts[fact_id].fact_text[:90]}")
+
+        self.stdout.write(self.style.SUCCESS(f'\n✅ Fact index built in {time.monotonic() - started:.1f}s'))
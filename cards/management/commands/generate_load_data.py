@@ -0,0 +1,397 @@
+"""
+Generate a large synthetic dataset for performance testing
+Run: python manage.py generate_load_data --users 10000 --seed 42
+"""
+import random
+import time
+from collections import Counter
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models.signals import post_delete, pre_delete
+from django.utils import timezone
+
+from cards import rollups, tagging, view_cache
+from cards.signals import (
+    bump_card_pages, bump_card_pages_for_child, bump_card_pages_for_source, bump_saver_pages,
+    count_lost_follower, index_card_duplicates_for_argument, release_notebook_tags, remove_card_rollups,
+    retract_from_timelines, touch_card_for_argument,
+)
+from cards.models import (
+    Argument, Card, Conversation, DirectMessage, Follow, FriendRequest,
+    NotebookEntry, NotebookNote, Notification, SavedCard, Source, UserProfile,
+)
+
+
+WORDS = (
+    'policy reform federal state budget tax health care vote border court law '
+    'economy wage worker school teacher climate energy police prison housing '
+    'rent trade tariff security rights data study report cost growth jobs '
+    'family market public private local community evidence impact program '
+    'funding access safety justice election district rural urban debate '
+    'survey research analysis benefit risk plan support oppose change'
+).split()
+
+GENERATED_MODELS = (
+    User, Card, Argument, Follow, FriendRequest, Conversation, DirectMessage,
+    NotebookEntry, NotebookNote, Notification, UserProfile,
+)
+
+# Per-row bookkeeping that --clear skips: tag counts and stats go with the
+# deleted users, and the rollups and page stamps are refreshed once
+# generation finishes
+CLEAR_MUTED_RECEIVERS = (
+    (pre_delete, release_notebook_tags, NotebookEntry),
+    (post_delete, retract_from_timelines, Card),
+    (post_delete, remove_card_rollups, Card),
+    (post_delete, count_lost_follower, Follow),
+    (post_delete, bump_card_pages, Card),
+    (post_delete, bump_card_pages_for_child, Argument),
+    (post_delete, touch_card_for_argument, Argument),
+    (post_delete, index_card_duplicates_for_argument, Argument),
+    (post_delete, bump_saver_pages, SavedCard),
+    (post_delete, bump_card_pages_for_source, Source),
+)
+
+
+@contextmanager
+def historical_timestamps(models):
+    """Let bulk_create keep the created_at/updated_at values we assign"""
+    toggled = []
+    for model in models:
+        for field in model._meta.concrete_fields:
+            if getattr(field, 'auto_now', False) or getattr(field, 'auto_now_add', False):
+                toggled.append((field, field.auto_now, field.auto_now_add))
+                field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now, auto_now_add in toggled:
+            field.auto_now = auto_now
+            field.auto_now_add = auto_now_add
+
+
+@contextmanager
+def muted_receivers(receivers):
+    """Disconnect (signal, receiver, sender) triples for the duration"""
+    for signal, receiver, sender in receivers:
+        signal.disconnect(receiver, sender=sender)
+    try:
+        yield
+    finally:
+        for signal, receiver, sender in receivers:
+            signal.connect(receiver, sender=sender)
+
+
+class Command(BaseCommand):
+    help = 'Bulk-create realistic users, social graph, cards, messages and notebook data'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000, help='Number of users to create')
+        parser.add_argument('--avg-follows', type=float, default=20, help='Mean follows per user (power-law distributed)')
+        parser.add_argument('--friend-ratio', type=float, default=0.3, help='Share of follows that become accepted friendships')
+        parser.add_argument('--cards-per-user', type=float, default=5, help='Mean cards per user (power-law distributed)')
+        parser.add_argument('--args-per-card', type=int, default=4, help='Arguments per card (split between pro and con)')
+        parser.add_argument('--source-ratio', type=float, default=0.5, help='Share of arguments that get a source')
+        parser.add_argument('--conversations-per-user', type=float, default=2, help='Mean conversations started per user')
+        parser.add_argument('--messages-per-conversation', type=int, default=8, help='Messages per conversation')
+        parser.add_argument('--entries-per-user', type=float, default=5, help='Mean notebook entries per user')
+        parser.add_argument('--notes-per-entry', type=int, default=2, help='Notes per notebook entry')
+        parser.add_argument('--notifications-per-user', type=float, default=10, help='Mean notifications per user')
+        parser.add_argument('--days', type=int, default=365, help='Spread created_at over this many past days')
+        parser.add_argument('--seed', type=int, default=42, help='Random seed; the same seed produces the same data')
+        parser.add_argument('--batch-size', type=int, default=5000, help='Rows per bulk_create chunk')
+        parser.add_argument('--prefix', type=str, default='load_', help='Username prefix for generated users')
+        parser.add_argument('--clear', action='store_true', help='Delete previously generated users (and their data) first')
+
+    def handle(self, *args, **options):
+        if not connection.features.can_return_rows_from_bulk_insert:
+            raise CommandError('This database backend cannot return primary keys from bulk_create')
+
+        self.options = options
+        self.rng = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        self.prefix = options['prefix']
+        self.now = timezone.now()
+        self.counts = Counter()
+        started = time.monotonic()
+
+        if options['clear']:
+            with muted_receivers(CLEAR_MUTED_RECEIVERS):
+                deleted, _ = User.objects.filter(username__startswith=self.prefix).delete()
+            self.stdout.write(f"🗑️  Deleted {deleted} rows from a previous run")
+        elif User.objects.filter(username__startswith=self.prefix).exists():
+            raise CommandError(f'Users with prefix "{self.prefix}" already exist; use --clear or another --prefix')
+
+        with historical_timestamps(GENERATED_MODELS):
+            self.user_ids = self.create_users(options['users'])
+            self.popularity = self.build_popularity()
+            self.create_social_graph()
+            self.create_cards()
+            self.create_conversations()
+            self.create_notebook()
+            self.create_notifications()
+        rollups.rebuild_topics()
+        rollups.rebuild_user_stats()
+        view_cache.bump('cards', 'follows')
+
+        elapsed = time.monotonic() - started
+        for name, count in self.counts.items():
+            self.stdout.write(f"  {name}: {count:,}")
+        total = sum(self.counts.values())
+        self.stdout.write(self.style.SUCCESS(f'\n🎉 Created {total:,} rows in {elapsed:.1f}s ({total / max(elapsed, 0.001):,.0f} rows/s)'))
+
+    # ---- helpers ----------------------------------------------------------
+
+    def flush(self, model, rows, **kwargs):
+        """bulk_create one chunk in its own transaction and count it"""
+        if not rows:
+            return rows
+        with transaction.atomic():
+            created = model.objects.bulk_create(rows, batch_size=self.batch_size, **kwargs)
+        self.counts[model.__name__] += len(rows)
+        return created
+
+    def power_law(self, mean, cap):
+        """Draw a heavy-tailed count (Pareto, alpha=2) with the given mean"""
+        if mean <= 0:
+            return 0
+        return min(int(self.rng.paretovariate(2.0) * mean / 2), cap)
+
+    def timestamp(self, after=None):
+        """A random moment in the configured window, optionally after another one"""
+        start = after or self.now - timedelta(days=self.options['days'])
+        span = max((self.now - start).total_seconds(), 1)
+        return start + timedelta(seconds=self.rng.random() * span)
+
+    def text(self, low, high):
+        return ' '.join(self.rng.choices(WORDS, k=self.rng.randint(low, high))).capitalize()
+
+    def pick_users(self, k):
+        """Pick k user ids, biased towards popular users"""
+        return self.rng.choices(self.user_ids, cum_weights=self.popularity, k=k)
+
+    def build_popularity(self):
+        """Cumulative Zipf weights over a shuffled user order"""
+        order = list(range(len(self.user_ids)))
+        self.rng.shuffle(order)
+        weights = [0.0] * len(order)
+        for rank, index in enumerate(order, 1):
+            weights[index] = 1.0 / rank
+        cumulative, total = [], 0.0
+        for weight in weights:
+            total += weight
+            cumulative.append(total)
+        return cumulative
+
+    # ---- generators -------------------------------------------------------
+
+    def create_users(self, count):
+        self.stdout.write(f"👤 Creating {count:,} users...")
+        password = make_password('loadtest')
+        user_ids = []
+        for start in range(0, count, self.batch_size):
+            users = []
+            for i in range(start, min(start + self.batch_size, count)):
+                users.append(User(
+                    username=f'{self.prefix}{i:07d}',
+                    email=f'{self.prefix}{i:07d}@example.com',
+                    password=password,
+                    date_joined=self.timestamp(),
+                ))
+            created = self.flush(User, users)
+            user_ids.extend(user.pk for user in created)
+            self.flush(UserProfile, [UserProfile(user_id=user.pk, last_seen=user.date_joined) for user in created])
+        return user_ids
+
+    def create_social_graph(self):
+        self.stdout.write("🔗 Creating follow/friend graph...")
+        cap = len(self.user_ids) - 1
+        friend_ratio = self.options['friend_ratio']
+        follows, requests = [], []
+        for follower in self.user_ids:
+            degree = self.power_law(self.options['avg_follows'], cap)
+            targets = set(self.pick_users(degree))
+            targets.discard(follower)
+            for following in sorted(targets):
+                created_at = self.timestamp()
+                follows.append(Follow(follower_id=follower, following_id=following, created_at=created_at))
+                if self.rng.random() < friend_ratio:
+                    # Friendships are mutual follows plus one accepted request,
+                    # stored low id -> high id so each pair appears once
+                    follows.append(Follow(follower_id=following, following_id=follower, created_at=created_at))
+                    low, high = sorted((follower, following))
+                    requests.append(FriendRequest(
+                        from_user_id=low, to_user_id=high, status='accepted',
+                        created_at=created_at, updated_at=created_at,
+                    ))
+            if len(follows) >= self.batch_size:
+                self.flush(Follow, follows, ignore_conflicts=True)
+                self.flush(FriendRequest, requests, ignore_conflicts=True)
+                follows, requests = [], []
+        self.flush(Follow, follows, ignore_conflicts=True)
+        self.flush(FriendRequest, requests, ignore_conflicts=True)
+
+    def create_cards(self):
+        self.stdout.write("🃏 Creating cards, arguments and sources...")
+        topics = [code for code, _ in Card.TOPIC_CHOICES]
+        visibilities = ['public', 'friends', 'private']
+        cards = []
+        for user_id in self.user_ids:
+            for _ in range(self.power_law(self.options['cards_per_user'], 500)):
+                created_at = self.timestamp()
+                cards.append(Card(
+                    user_id=user_id,
+                    scope=self.rng.choice(['federal', 'state']),
+                    topic=self.rng.choice(topics),
+                    title=self.text(3, 8),
+                    stance=self.rng.choice(['for', 'against', 'Analyzing']),
+                    hypothesis=self.text(12, 30),
+                    conclusion=self.text(12, 30),
+                    visibility=self.rng.choices(visibilities, weights=[80, 15, 5])[0],
+                    created_at=created_at,
+                    updated_at=created_at,
+                ))
+            if len(cards) >= self.batch_size:
+                self.create_arguments(self.flush(Card, cards))
+                cards = []
+        self.create_arguments(self.flush(Card, cards))
+
+    def create_arguments(self, cards):
+        per_card = self.options['args_per_card']
+        arguments = []
+        for card in cards:
+            for order in range(per_card):
+                arguments.append(Argument(
+                    card_id=card.pk,
+                    type='pro' if order % 2 == 0 else 'con',
+                    summary=self.text(8, 20),
+                    detail=self.text(0, 40),
+                    order=order // 2 + 1,
+                    created_at=card.created_at,
+                ))
+        arguments = self.flush(Argument, arguments)
+
+        sources = []
+        for argument in arguments:
+            if self.rng.random() < self.options['source_ratio']:
+                sources.append(Source(
+                    argument_id=argument.pk,
+                    title=self.text(3, 8),
+                    url=f'https://example.org/research/{self.rng.getrandbits(40):x}',
+                    author=self.text(2, 2),
+                ))
+        self.flush(Source, sources)
+
+    def create_conversations(self):
+        self.stdout.write("💬 Creating conversations and messages...")
+        conversations = []
+        for user_id in self.user_ids:
+            for other_id in set(self.pick_users(self.power_law(self.options['conversations_per_user'], 200))):
+                if other_id == user_id:
+                    continue
+                created_at = self.timestamp()
+                conversations.append(Conversation(
+                    participant1_id=user_id, participant2_id=other_id,
+                    created_at=created_at, updated_at=created_at,
+                ))
+            if len(conversations) >= self.batch_size:
+                self.create_messages(self.flush(Conversation, conversations))
+                conversations = []
+        self.create_messages(self.flush(Conversation, conversations))
+
+    def create_messages(self, conversations):
+        messages = []
+        for conversation in conversations:
+            sent_at = conversation.created_at
+            participants = (conversation.participant1_id, conversation.participant2_id)
+            for _ in range(self.options['messages_per_conversation']):
+                sender = self.rng.choice(participants)
+                sent_at = self.timestamp(after=sent_at)
+                messages.append(DirectMessage(
+                    conversation_id=conversation.pk,
+                    sender_id=sender,
+                    recipient_id=participants[1] if sender == participants[0] else participants[0],
+                    message=self.text(4, 30),
+                    is_read=self.rng.random() < 0.8,
+                    created_at=sent_at,
+                ))
+        self.flush(DirectMessage, messages)
+
+    def create_notebook(self):
+        self.stdout.write("📓 Creating notebook entries and notes...")
+        topics = [code for code, _ in NotebookEntry.NOTEBOOK_TOPICS]
+        entries = []
+        for user_id in self.user_ids:
+            for _ in range(self.power_law(self.options['entries_per_user'], 500)):
+                entry_type = self.rng.choice(['youtube', 'article', 'note'])
+                if entry_type == 'youtube':
+                    content = f'https://www.youtube.com/watch?v={self.rng.getrandbits(64):011x}'[:43]
+                elif entry_type == 'article':
+                    content = f'https://example.com/news/{self.rng.getrandbits(40):x}'
+                else:
+                    content = self.text(20, 60)
+                created_at = self.timestamp()
+                entry = NotebookEntry(
+                    user_id=user_id,
+                    entry_type=entry_type,
+                    title=self.text(3, 8),
+                    content=content,
+                    user_notes=self.text(0, 40),
+                    topic=self.rng.choice(topics),
+                    stance=self.rng.choice(['supporting', 'opposing', 'neutral']),
+                    tags=','.join(self.rng.sample(WORDS, self.rng.randint(0, 4))),
+                    created_at=created_at,
+                    updated_at=created_at,
+                )
+                # bulk_create skips save(), so derive the link columns here
+                entry.refresh_link_fields()
+                entries.append(entry)
+            if len(entries) >= self.batch_size:
+                self.index_entries(self.flush(NotebookEntry, entries))
+                entries = []
+        self.index_entries(self.flush(NotebookEntry, entries))
+        tagging.rebuild_counts(self.user_ids)
+
+    def index_entries(self, entries):
+        tagging.index_new_entries(entries)
+        self.create_notes(entries)
+
+    def create_notes(self, entries):
+        notes = []
+        for entry in entries:
+            for _ in range(self.options['notes_per_entry']):
+                created_at = self.timestamp(after=entry.created_at)
+                notes.append(NotebookNote(
+                    entry_id=entry.pk,
+                    text=self.text(5, 30),
+                    timestamp=f'{self.rng.randint(0, 59):02d}:{self.rng.randint(0, 59):02d}' if entry.entry_type == 'youtube' else '',
+                    created_at=created_at,
+                    updated_at=created_at,
+                ))
+        self.flush(NotebookNote, notes)
+
+    def create_notifications(self):
+        self.stdout.write("🔔 Creating notifications...")
+        kinds = [code for code, _ in Notification.NOTIFICATION_TYPES]
+        notifications = []
+        for recipient in self.user_ids:
+            count = self.power_law(self.options['notifications_per_user'], 1000)
+            for sender in self.pick_users(count):
+                kind = self.rng.choice(kinds)
+                notifications.append(Notification(
+                    recipient_id=recipient,
+                    sender_id=sender,
+                    notification_type=kind,
+                    message=self.text(3, 8),
+                    is_read=self.rng.random() < 0.6,
+                    created_at=self.timestamp(),
+                ))
+            if len(notifications) >= self.batch_size:
+                self.flush(Notification, notifications)
+                notifications = []
+        self.flush(Notification, notifications)
@@ -1,11 +1,12 @@
 """
 Generate contextual information for survey questions using AI and fact database
 Run: python manage.py generate_survey_context --topic immigration
+     python manage.py generate_survey_context --topic immigration --use-ai --concurrency 8
 """
 from django.core.management.base import BaseCommand
-from cards.models import TopicSurvey, SurveyQuestion, PolicyFact
+from cards import fact_index, survey_context
+from cards.models import TopicSurvey
 from cards.fact_apis import AIFactGenerator
-import json
 
 
 class Command(BaseCommand):
@@ -23,59 +24,86 @@ class Command(BaseCommand):
             action='store_true',
             help='Use AI to generate context (requires ANTHROPIC_API_KEY)',
         )
+        parser.add_argument(
+            '--concurrency',
+            type=int,
+            default=4,
+            help='AI requests in flight at once',
+        )
+        parser.add_argument(
+            '--refresh-ai',
+            action='store_true',
+            help='Regenerate AI context for every question, ignoring saved text and cached replies',
+        )
 
     def handle(self, *args, **options):
         topic = options['topic']
         use_ai = options.get('use_ai', False)
-        
+
         try:
             survey = TopicSurvey.objects.get(topic=topic)
         except TopicSurvey.DoesNotExist:
             self.stdout.write(self.style.ERROR(f'Survey for topic "{topic}" not found'))
             return
-        
+
         self.stdout.write(f"Generating context for {survey.title}...")
-        
-        questions = survey.questions.all()
-        
+
+        questions = list(survey.questions.all())
+
+        # Ask about every question that needs AI context at once, before saving any
+        ai_contexts = {}
+        if use_ai:
+            ai_contexts = self.generate_ai_contexts(topic, questions, options)
+
         for question in questions:
             self.stdout.write(f"\n📝 Question {question.order}: {question.question_text[:50]}...")
-            
-            # Get relevant facts from database
-            relevant_facts = PolicyFact.objects.filter(
-                topic=topic
-            ).order_by('-relevance_score')[:5]
-            
+
+            # Pick the facts closest in meaning to this question and its answers
+            query = ' '.join([question.question_text, *question.options.values_list('option_text', flat=True)])
+            relevant_facts = fact_index.facts_for(query, topic, limit=4)
+
             # Build context_stats from facts
             stats_list = []
             sources_list = []
-            
-            for fact in relevant_facts[:4]:
+
+            for fact in relevant_facts:
                 stats_list.append(f"• {fact.fact_text}")
                 if fact.source_url:
                     sources_list.append(fact.source_url)
-            
+
             if stats_list:
                 question.context_stats = '\n'.join(stats_list)
                 question.sources = ','.join(sources_list)
-            
-            # Use AI to generate learn_more if requested
-            if use_ai and not question.learn_more:
-                ai_gen = AIFactGenerator()
-                ai_context = ai_gen.generate_question_context(topic, question.question_text)
-                
-                if ai_context:
-                    try:
-                        # Parse AI response
-                        context_data = json.loads(ai_context)
-                        question.learn_more = context_data.get('learn_more', '')
-                        self.stdout.write("  ✅ Generated AI context")
-                    except json.JSONDecodeError:
-                        # If not JSON, use as-is
-                        question.learn_more = ai_context
-                        self.stdout.write("  ✅ Added AI context (raw)")
-            
+
+            context = ai_contexts.get(question.id)
+            if context and context['learn_more']:
+                question.learn_more = context['learn_more']
+                self.stdout.write("  ✅ Generated AI context" if context['parsed'] else "  ✅ Added AI context (raw)")
+
             question.save()
             self.stdout.write(self.style.SUCCESS(f"  ✅ Updated question {question.order}"))
-        
+
         self.stdout.write(self.style.SUCCESS(f'\n🎉 Context generation complete for {survey.title}!'))
+
+    def generate_ai_contexts(self, topic, questions, options):
+        generator = AIFactGenerator()
+        if not generator.available:
+            self.stdout.write(self.style.WARNING('⚠️  ANTHROPIC_API_KEY is not set; skipping AI context'))
+            return {}
+
+        needed = [question for question in questions if options['refresh_ai'] or not question.learn_more]
+        if not needed:
+            return {}
+
+        self.stdout.write(f"🤖 Requesting AI context for {len(needed)} questions ({options['concurrency']} at a time)...")
+        contexts, report = survey_context.generate(
+            topic, needed, generator, concurrency=options['concurrency'], refresh=options['refresh_ai'],
+        )
+        for question_id, error in report['errors'].items():
+            self.stdout.write(self.style.ERROR(f"  ❌ Question {question_id}: {error}"))
+        self.stdout.write(
+            f"  {report['asked']} asked, {report['cached']} cached, {report['failed']} failed; "
+            f"{report['input_tokens']:,} input + {report['output_tokens']:,} output tokens; "
+            f"{report['seconds']:.1f}s wall ({report['call_seconds']:.1f}s of calls)"
+        )
+        return contexts
@@ -0,0 +1,45 @@
+"""
+Compute near-duplicate signatures for cards that don't have one yet
+Run: python manage.py index_duplicates             (after deploying, or after generate_load_data)
+     python manage.py index_duplicates --rebuild   (recompute every card and re-cluster)
+"""
+import time
+
+from django.core.management.base import BaseCommand
+from django.db.models import Count
+
+from cards import duplicates, view_cache
+from cards.models import Card, CardSignature, CardSignatureBand
+
+
+class Command(BaseCommand):
+    help = 'Index cards for MinHash/LSH near-duplicate detection and report the largest clusters'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rebuild', action='store_true', help='Drop every signature and index all cards again')
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        if options['rebuild']:
+            CardSignatureBand.objects.all().delete()
+            CardSignature.objects.all().delete()
+
+        pending = list(Card.objects.filter(signature__isnull=True).order_by('id').values_list('id', flat=True))
+        self.stdout.write(f"🧬 Indexing {len(pending):,} cards")
+        for done, card_id in enumerate(pending, 1):
+            duplicates.index_card(card_id)
+            if done % 5000 == 0:
+                self.stdout.write(f"   {done:,} / {len(pending):,}")
+        # Listings collapse by cluster
+        view_cache.bump('cards')
+
+        clusters = (
+            CardSignature.objects.filter(cluster__isnull=False)
+            .values('cluster').annotate(n=Count('pk')).filter(n__gt=1).order_by('-n')
+        )
+        total = clusters.count()
+        self.stdout.write(f"👯 {total:,} near-duplicate clusters")
+        titles = dict(Card.objects.filter(id__in=[row['cluster'] for row in clusters[:5]]).values_list('id', 'title'))
+        for row in clusters[:5]:
+            self.stdout.write(f"   {row['n']:>5} × {titles.get(row['cluster'], '(deleted card)')[:70]}")
+        self.stdout.write(self.style.SUCCESS(f'\n✅ Indexed in {time.monotonic() - started:.1f}s'))
@@ -0,0 +1,25 @@
+"""
+Fetch trending headlines from NewsAPI into the cache ahead of traffic
+Run: python manage.py prewarm_trending          (e.g. on deploy, or from cron)
+"""
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from cards.trending import refresh_trending_topics
+
+
+class Command(BaseCommand):
+    help = 'Prewarm the trending headlines cache so no request sees a cold start'
+
+    def handle(self, *args, **options):
+        if not settings.NEWSAPI_KEY:
+            raise CommandError('NEWSAPI_KEY is not set; pages will keep showing mock topics')
+
+        try:
+            topics = refresh_trending_topics()
+        except Exception as e:
+            raise CommandError(f'NewsAPI fetch failed: {e}')
+
+        for topic in topics:
+            self.stdout.write(f"📰 {topic['title']} ({topic['source']})")
+        self.stdout.write(self.style.SUCCESS(f'\n✅ Cached {len(topics)} trending topics'))
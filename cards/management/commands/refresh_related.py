@@ -0,0 +1,35 @@
+"""
+Update the "related cards" index used by card_detail
+Run: python manage.py refresh_related          (incremental; schedule it, e.g. every 15 minutes)
+     python manage.py refresh_related --full   (re-score every card)
+"""
+import os
+import time
+
+from django.core.management.base import BaseCommand
+
+from cards import related, view_cache
+
+
+class Command(BaseCommand):
+    help = 'Index public cards by TF-IDF similarity for related-card and opposing-view links'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true', help='Rebuild from scratch instead of updating changed cards')
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        result = related.refresh(full=options['full'])
+        # Only the cached pages of cards whose links changed embed old ones
+        view_cache.bump(*(f'related:{card_id}' for card_id in result['updated']))
+
+        mode = 'Full build' if result['full'] else 'Incremental update'
+        self.stdout.write(
+            f"🔎 {mode}: {result['cards']:,} public cards, {result['changed']:,} new or changed, "
+            f"{result['removed']:,} removed, {result['rescored']:,} re-scored, {len(result['updated']):,} with new links"
+        )
+        index_dir = related.index_dir()
+        for name in (related.TABLE_FILE, related.STATE_FILE):
+            size = os.path.getsize(os.path.join(index_dir, name))
+            self.stdout.write(f"💾 {name}: {size / 1024:,.0f} KB")
+        self.stdout.write(self.style.SUCCESS(f'\n✅ Related cards index updated in {time.monotonic() - started:.1f}s'))
@@ -0,0 +1,30 @@
+"""
+Rebuild the explore rollups (trending topic buckets and user leaderboards)
+Run: python manage.py refresh_rollups          (schedule hourly, e.g. from cron)
+     python manage.py refresh_rollups --prune-only
+"""
+import time
+
+from django.core.management.base import BaseCommand
+
+from cards import rollups
+
+
+class Command(BaseCommand):
+    help = 'Rebuild trending-topic and leaderboard rollups from cards and follows'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--prune-only', action='store_true', help='Only drop topic buckets past the longest window')
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        if options['prune_only']:
+            deleted = rollups.prune()
+            self.stdout.write(self.style.SUCCESS(f'✅ Pruned {deleted:,} expired topic buckets'))
+            return
+
+        buckets = rollups.rebuild_topics()
+        self.stdout.write(f"📈 {buckets:,} topic-hour buckets")
+        users = rollups.rebuild_user_stats()
+        self.stdout.write(f"👥 {users:,} user stats rows")
+        self.stdout.write(self.style.SUCCESS(f'\n✅ Rollups rebuilt in {time.monotonic() - started:.1f}s'))
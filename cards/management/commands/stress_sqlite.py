@@ -0,0 +1,130 @@
+"""
+Compare SQLite lock errors under concurrent reads and writes, before and after tuning
+Run: python manage.py stress_sqlite --threads 16 --seconds 5
+"""
+import os
+import random
+import sqlite3
+import statistics
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from debrief.database import pragma_statements
+
+SEED_PROFILES = 500
+
+
+class Command(BaseCommand):
+    help = 'Stress a scratch SQLite database with Django defaults vs the tuned SQLITE_* settings'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=16, help='Concurrent connections')
+        parser.add_argument('--seconds', type=float, default=5, help='Duration of each run')
+        parser.add_argument('--write-ratio', type=float, default=0.3, help='Share of operations that write')
+        parser.add_argument('--baseline-timeout', type=float, default=5,
+                            help="Busy timeout for the baseline run (Django's default is 5s)")
+
+    def handle(self, *args, **options):
+        modes = [
+            # Django's defaults: rollback journal, synchronous=FULL, deferred BEGIN
+            ('baseline', [], options['baseline_timeout'], 'BEGIN'),
+            ('tuned', pragma_statements(settings.SQLITE_PRAGMAS), settings.SQLITE_BUSY_TIMEOUT, 'BEGIN IMMEDIATE'),
+        ]
+        self.stdout.write(
+            f"🔥 {options['threads']} threads, {options['seconds']:g}s per run, "
+            f"{options['write_ratio']:.0%} writes (scratch database, your data is untouched)\n"
+        )
+        self.stdout.write(f"{'':>9} {'reads/s':>9} {'writes/s':>9} {'lock errors':>12} {'error rate':>11} {'p95 write ms':>13}")
+
+        results = {}
+        for name, pragmas, timeout, begin in modes:
+            with tempfile.TemporaryDirectory() as scratch:
+                path = os.path.join(scratch, 'stress.sqlite3')
+                self.create_schema(path)
+                result = self.run(path, pragmas, timeout, begin, options)
+            results[name] = result
+            attempts = result['reads'] + result['writes'] + result['errors']
+            self.stdout.write(
+                f"{name:>9} {result['reads'] / options['seconds']:>9.0f} {result['writes'] / options['seconds']:>9.0f} "
+                f"{result['errors']:>12} {result['errors'] / max(attempts, 1):>11.2%} {result['p95_write_ms']:>13.1f}"
+            )
+
+        if results['tuned']['errors']:
+            self.stdout.write(self.style.WARNING(
+                f"\n⚠️  {results['tuned']['errors']} lock errors with tuning; raise SQLITE_BUSY_TIMEOUT"
+            ))
+        else:
+            self.stdout.write(self.style.SUCCESS(
+                f"\n✅ No lock errors with tuning (baseline: {results['baseline']['errors']})"
+            ))
+
+    def create_schema(self, path):
+        db = sqlite3.connect(path)
+        db.executescript('''
+            CREATE TABLE profile (id INTEGER PRIMARY KEY, last_seen REAL NOT NULL, card_count INTEGER NOT NULL);
+            CREATE TABLE card (id INTEGER PRIMARY KEY, user_id INTEGER NOT NULL, body TEXT NOT NULL);
+            CREATE INDEX card_user ON card (user_id);
+            CREATE INDEX profile_seen ON profile (last_seen);
+        ''')
+        db.executemany('INSERT INTO profile VALUES (?, ?, 0)', [(i, 0.0) for i in range(1, SEED_PROFILES + 1)])
+        db.commit()
+        db.close()
+
+    def run(self, path, pragmas, timeout, begin, options):
+        deadline = time.monotonic() + options['seconds']
+        lock = threading.Lock()
+        totals = {'reads': 0, 'writes': 0, 'errors': 0, 'write_ms': []}
+
+        def worker(seed):
+            rng = random.Random(seed)
+            db = sqlite3.connect(path, timeout=timeout, isolation_level=None, check_same_thread=False)
+            for statement in pragmas:
+                db.execute(statement)
+            reads = writes = errors = 0
+            write_ms = []
+            while time.monotonic() < deadline:
+                user_id = rng.randint(1, SEED_PROFILES)
+                try:
+                    if rng.random() < options['write_ratio']:
+                        started = time.perf_counter()
+                        # Read-then-write, like a view that loads a row before saving it
+                        db.execute(begin)
+                        try:
+                            db.execute('SELECT card_count FROM profile WHERE id = ?', (user_id,)).fetchone()
+                            db.execute('INSERT INTO card (user_id, body) VALUES (?, ?)', (user_id, 'x' * 200))
+                            db.execute('UPDATE profile SET last_seen = ?, card_count = card_count + 1 WHERE id = ?',
+                                       (time.time(), user_id))
+                            db.execute('COMMIT')
+                        except sqlite3.OperationalError:
+                            db.execute('ROLLBACK')
+                            raise
+                        write_ms.append((time.perf_counter() - started) * 1000)
+                        writes += 1
+                    else:
+                        db.execute('SELECT COUNT(*) FROM card WHERE user_id = ?', (user_id,)).fetchone()
+                        db.execute('SELECT id FROM profile ORDER BY last_seen DESC LIMIT 20').fetchall()
+                        reads += 1
+                except sqlite3.OperationalError as exc:
+                    if 'locked' not in str(exc) and 'busy' not in str(exc):
+                        raise
+                    errors += 1
+            db.close()
+            with lock:
+                totals['reads'] += reads
+                totals['writes'] += writes
+                totals['errors'] += errors
+                totals['write_ms'].extend(write_ms)
+
+        threads = [threading.Thread(target=worker, args=(n,)) for n in range(options['threads'])]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        write_ms = totals.pop('write_ms')
+        totals['p95_write_ms'] = statistics.quantiles(write_ms, n=20)[-1] if len(write_ms) >= 2 else 0.0
+        return totals
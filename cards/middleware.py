@@ -1,4 +1,12 @@
+import random
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
 from django.utils import timezone
+from debrief import routers
+from . import instrumentation, profiling
 from .models import UserProfile
 
 class OnlineStatusMiddleware:
@@ -14,3 +22,85 @@ class OnlineStatusMiddleware:
         
         response = self.get_response(request)
         return response
+
+
+class PerformanceMiddleware:
+    """Record per-request timing, DB, cache and external-call metrics"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not getattr(settings, 'PERFORMANCE_INSTRUMENTATION', True):
+            return self.get_response(request)
+
+        metrics, token = instrumentation.start_request()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(instrumentation.db_timer))
+                response = self.get_response(request)
+        finally:
+            instrumentation.end_request(token)
+
+        total = time.perf_counter() - metrics.started
+        match = getattr(request, 'resolver_match', None)
+        metrics.view_name = match.view_name if match else None
+
+        instrumentation.registry.observe_request(metrics, total, response.status_code)
+        instrumentation.log_request(metrics, total, response.status_code)
+
+        user = getattr(request, 'user', None)
+        if settings.DEBUG or (user is not None and user.is_staff):
+            response['Server-Timing'] = metrics.server_timing(total)
+        return response
+
+
+class SamplingProfilerMiddleware:
+    """Profile staff requests that ask for it and a sampled share of the rest"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        forced = bool(request.headers.get(settings.PROFILER_HEADER)) and request.user.is_staff
+        if not forced and random.random() >= settings.PROFILER_SAMPLE_RATE:
+            return self.get_response(request)
+
+        sampler = profiling.StackSampler(settings.PROFILER_INTERVAL_MS / 1000).start()
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            sampler.stop()
+        duration = time.perf_counter() - started
+
+        if forced:
+            profile = profiling.save_profile(request, sampler, duration, 'header')
+            response['X-Debrief-Profile-Id'] = str(profile.id)
+        elif duration * 1000 >= settings.PROFILER_SLOW_MS:
+            profiling.save_profile(request, sampler, duration, 'slow')
+        return response
+
+
+class ReplicaStickinessMiddleware:
+    """Pin a client to the primary database for a while after it writes"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not routers.replica_configured():
+            return self.get_response(request)
+
+        token = routers.start_request(pinned=settings.REPLICA_STICKY_COOKIE in request.COOKIES)
+        try:
+            response = self.get_response(request)
+        finally:
+            wrote = routers.end_request(token)
+        if wrote:
+            response.set_cookie(
+                settings.REPLICA_STICKY_COOKIE, '1',
+                max_age=settings.REPLICA_STICKY_SECONDS, httponly=True, samesite='Lax',
+            )
+        return response
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.8 on 2026-10-19 10:01
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cards', '0029_userprofile'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RequestProfile',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('path', models.CharField(max_length=500)),
+                ('method', models.CharField(max_length=10)),
+                ('view_name', models.CharField(blank=True, max_length=200)),
+                ('trigger', models.CharField(choices=[('header', 'Staff Header'), ('slow', 'Latency Threshold')], max_length=10)),
+                ('duration_ms', models.IntegerField()),
+                ('sample_count', models.IntegerField(default=0)),
+                ('collapsed_stacks', models.TextField(blank=True, help_text='Collapsed-stack format for flamegraph.pl or speedscope')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='request_profiles', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-created_at'],
+            },
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.8 on 2026-10-19 10:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cards', '0030_requestprofile'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='notebookentry',
+            name='canonical_url',
+            field=models.URLField(blank=True, max_length=500),
+        ),
+        migrations.AddField(
+            model_name='notebookentry',
+            name='youtube_id',
+            field=models.CharField(blank=True, db_index=True, max_length=11),
+        ),
+    ]
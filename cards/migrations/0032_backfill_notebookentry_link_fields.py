@@ -0,0 +1,49 @@
+import re
+
+from django.db import migrations
+
+# Frozen copy of cards.youtube_utils.normalize_link as of this migration, so
+# later changes to the helper don't change what the backfill does
+YOUTUBE_ID_PATTERN = re.compile(
+    r'(?:youtube(?:-nocookie)?\.com\/(?:watch\?(?:[^#\s]*&)?v=|embed\/|shorts\/|live\/|v\/)'
+    r'|youtu\.be\/)([a-zA-Z0-9_-]{11})(?![a-zA-Z0-9_-])'
+)
+
+
+def normalize_link(content, entry_type):
+    """(entry_type, video_id, canonical_url) for a notebook entry's content"""
+    url = (content or '').strip()
+    match = YOUTUBE_ID_PATTERN.search(url) if url else None
+    if match:
+        if entry_type not in ('note', 'quote'):
+            entry_type = 'youtube'
+        return entry_type, match.group(1), f'https://www.youtube.com/watch?v={match.group(1)}'
+    if url.startswith(('http://', 'https://')) and len(url) <= 500 and not any(c.isspace() for c in url):
+        return entry_type, '', url.split('#', 1)[0]
+    return entry_type, '', ''
+
+
+def backfill_link_fields(apps, schema_editor):
+    """Compute youtube_id, canonical_url and entry_type for existing entries"""
+    NotebookEntry = apps.get_model('cards', 'NotebookEntry')
+    
+    batch = []
+    entries = NotebookEntry.objects.only('id', 'entry_type', 'content').order_by('id')
+    for entry in entries.iterator(chunk_size=2000):
+        entry.entry_type, entry.youtube_id, entry.canonical_url = normalize_link(entry.content, entry.entry_type)
+        batch.append(entry)
+        if len(batch) >= 2000:
+            NotebookEntry.objects.bulk_update(batch, ['entry_type', 'youtube_id', 'canonical_url'])
+            batch = []
+    NotebookEntry.objects.bulk_update(batch, ['entry_type', 'youtube_id', 'canonical_url'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cards', '0031_notebookentry_link_fields'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_link_fields, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.8 on 2026-10-19 10:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cards', '0032_backfill_notebookentry_link_fields'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='notebookentry',
+            name='auto_summary',
+            field=models.TextField(blank=True),
+        ),
+        migrations.AddField(
+            model_name='notebookentry',
+            name='enrichment_status',
+            field=models.CharField(choices=[('none', 'Not Enriched'), ('summarized', 'Summarized'), ('no_transcript', 'Transcript Unavailable'), ('failed', 'Summary Failed')], default='none', max_length=20),
+        ),
+        migrations.AddField(
+            model_name='notebookentry',
+            name='summary_source',
+            field=models.CharField(blank=True, choices=[('transcript', 'Video Transcript'), ('article', 'Article Text'), ('ai', 'AI Summarizer')], max_length=20),
+        ),
+        migrations.AddField(
+            model_name='notebookentry',
+            name='user_notes',
+            field=models.TextField(blank=True),
+        ),
+    ]
@@ -0,0 +1,91 @@
+from django.db import migrations
+
+AUTO_SUMMARY = '📝 Auto-summary:'
+NO_TRANSCRIPT = '⏳ No transcript available yet'
+NO_TRANSCRIPT_END = "Try using the 'Regenerate Summary' button later!"
+FAILED = '⚠️ Could not'
+FIELDS = ['user_notes', 'auto_summary', 'summary_source', 'enrichment_status']
+
+
+def parse_description(description, entry_type):
+    """Split a legacy description into (notes, summary, source, status)"""
+    notes = description or ''
+    summary, source, status = '', '', 'none'
+    
+    if AUTO_SUMMARY in notes:
+        before, after = notes.split(AUTO_SUMMARY, 1)
+        if after.startswith('\n'):
+            # AI summaries replaced the whole description and may span paragraphs
+            summary, rest, source = after, '', 'ai'
+        else:
+            summary, _, rest = after.partition('\n\n')
+            source = 'transcript' if entry_type == 'youtube' else 'article'
+        summary = summary.strip()
+        notes = f"{before.strip()}\n\n{rest.strip()}".strip()
+        if summary:
+            status = 'summarized'
+    
+    if NO_TRANSCRIPT in notes:
+        kept = []
+        skipping = False
+        for line in notes.split('\n'):
+            if NO_TRANSCRIPT in line:
+                skipping = True
+            elif skipping and NO_TRANSCRIPT_END in line:
+                skipping = False
+            elif not skipping:
+                kept.append(line)
+        notes = '\n'.join(kept).strip()
+        if status == 'none':
+            status = 'no_transcript'
+    
+    if notes.startswith(FAILED):
+        notes = notes.partition('\n\n')[2].strip()
+        if status == 'none':
+            status = 'failed'
+    
+    return notes, summary, source, status
+
+
+def split_descriptions(apps, schema_editor):
+    """Move summaries, status banners and user text into their own fields"""
+    NotebookEntry = apps.get_model('cards', 'NotebookEntry')
+    
+    batch = []
+    entries = NotebookEntry.objects.only('id', 'entry_type', 'description').order_by('id')
+    for entry in entries.iterator(chunk_size=2000):
+        (entry.user_notes, entry.auto_summary,
+         entry.summary_source, entry.enrichment_status) = parse_description(entry.description, entry.entry_type)
+        batch.append(entry)
+        if len(batch) >= 2000:
+            NotebookEntry.objects.bulk_update(batch, FIELDS)
+            batch = []
+    NotebookEntry.objects.bulk_update(batch, FIELDS)
+
+
+def join_descriptions(apps, schema_editor):
+    """Rebuild the combined description"""
+    NotebookEntry = apps.get_model('cards', 'NotebookEntry')
+    
+    batch = []
+    for entry in NotebookEntry.objects.order_by('id').iterator(chunk_size=2000):
+        if entry.auto_summary:
+            entry.description = f"{AUTO_SUMMARY} {entry.auto_summary}\n\n{entry.user_notes}".strip()
+        else:
+            entry.description = entry.user_notes
+        batch.append(entry)
+        if len(batch) >= 2000:
+            NotebookEntry.objects.bulk_update(batch, ['description'])
+            batch = []
+    NotebookEntry.objects.bulk_update(batch, ['description'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cards', '0033_notebookentry_summary_fields'),
+    ]
+
+    operations = [
+        migrations.RunPython(split_descriptions, join_descriptions),
+    ]
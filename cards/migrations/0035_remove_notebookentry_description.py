@@ -0,0 +1,15 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cards', '0034_split_notebookentry_description'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='notebookentry',
+            name='description',
+        ),
+    ]
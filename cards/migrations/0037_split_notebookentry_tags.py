@@ -0,0 +1,56 @@
+from collections import Counter
+
+from django.db import migrations
+
+
+def normalize_tag(text):
+    return ' '.join((text or '').split()).lower()[:50]
+
+
+def split_tags(apps, schema_editor):
+    """Index existing comma-separated tags and count them per user"""
+    NotebookEntry = apps.get_model('cards', 'NotebookEntry')
+    Tag = apps.get_model('cards', 'Tag')
+    UserTagCount = apps.get_model('cards', 'UserTagCount')
+    EntryTag = NotebookEntry.tag_index.through
+    
+    tag_ids = {}
+    counts = Counter()
+    links = []
+    entries = NotebookEntry.objects.exclude(tags='').values_list('id', 'user_id', 'tags').order_by('id')
+    for entry_id, user_id, tags in entries.iterator(chunk_size=2000):
+        names = []
+        for raw in tags.split(','):
+            name = normalize_tag(raw)
+            if name and name not in names:
+                names.append(name)
+        for name in names:
+            if name not in tag_ids:
+                tag_ids[name] = Tag.objects.create(name=name).id
+            links.append(EntryTag(notebookentry_id=entry_id, tag_id=tag_ids[name]))
+            counts[(user_id, tag_ids[name])] += 1
+        if len(links) >= 2000:
+            EntryTag.objects.bulk_create(links)
+            links = []
+    EntryTag.objects.bulk_create(links)
+    
+    UserTagCount.objects.bulk_create(
+        [UserTagCount(user_id=user_id, tag_id=tag_id, count=n) for (user_id, tag_id), n in counts.items()],
+        batch_size=2000,
+    )
+
+
+def clear_tags(apps, schema_editor):
+    apps.get_model('cards', 'UserTagCount').objects.all().delete()
+    apps.get_model('cards', 'Tag').objects.all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cards', '0036_notebook_tags'),
+    ]
+
+    operations = [
+        migrations.RunPython(split_tags, clear_tags),
+    ]
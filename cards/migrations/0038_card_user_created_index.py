@@ -0,0 +1,19 @@
+# Generated by Django 5.2.8 on 2026-10-19 10:19
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cards', '0037_split_notebookentry_tags'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='card',
+            index=models.Index(fields=['user', '-created_at'], name='cards_card_user_id_4d7ac7_idx'),
+        ),
+    ]
@@ -0,0 +1,53 @@
+from datetime import timedelta, timezone as dt_timezone
+
+from django.db import migrations
+from django.db.models import Count
+from django.db.models.functions import TruncHour
+from django.utils import timezone
+
+
+def populate_rollups(apps, schema_editor):
+    """Fill trending buckets for the last 30 days and per-user totals"""
+    Card = apps.get_model('cards', 'Card')
+    Follow = apps.get_model('cards', 'Follow')
+    TopicHourlyCount = apps.get_model('cards', 'TopicHourlyCount')
+    UserStats = apps.get_model('cards', 'UserStats')
+    
+    since = (timezone.now() - timedelta(days=30)).replace(minute=0, second=0, microsecond=0)
+    rows = (
+        Card.objects.filter(visibility='public', created_at__gte=since)
+        .annotate(hour=TruncHour('created_at', tzinfo=dt_timezone.utc))
+        .values_list('topic', 'hour')
+        .annotate(n=Count('id'))
+        .order_by()
+    )
+    TopicHourlyCount.objects.bulk_create(
+        [TopicHourlyCount(topic=topic, hour=hour, count=n) for topic, hour, n in rows],
+        batch_size=2000,
+    )
+    
+    cards = dict(Card.objects.values_list('user_id').annotate(n=Count('id')).order_by())
+    followers = dict(Follow.objects.values_list('following_id').annotate(n=Count('id')).order_by())
+    UserStats.objects.bulk_create(
+        [
+            UserStats(user_id=user_id, card_count=cards.get(user_id, 0), follower_count=followers.get(user_id, 0))
+            for user_id in cards.keys() | followers.keys()
+        ],
+        batch_size=2000,
+    )
+
+
+def clear_rollups(apps, schema_editor):
+    apps.get_model('cards', 'TopicHourlyCount').objects.all().delete()
+    apps.get_model('cards', 'UserStats').objects.all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cards', '0039_rollups'),
+    ]
+
+    operations = [
+        migrations.RunPython(populate_rollups, clear_rollups),
+    ]
@@ -0,0 +1,67 @@
+# Generated by Django 5.2.8 on 2026-10-19 10:38
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def convert_to_snapshots(apps, schema_editor):
+    """Turn full-copy versions into snapshots, numbered per card by age"""
+    CardVersion = apps.get_model('cards', 'CardVersion')
+    
+    numbers = {}
+    for version in CardVersion.objects.order_by('card_id', 'created_at', 'id'):
+        numbers[version.card_id] = numbers.get(version.card_id, 0) + 1
+        version.version_number = numbers[version.card_id]
+        version.snapshot = {
+            'title': version.title,
+            'stance': version.stance,
+            'hypothesis': version.hypothesis,
+            'conclusion': version.conclusion,
+        }
+        version.save(update_fields=['version_number', 'snapshot'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cards', '0040_populate_rollups'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='cardversion',
+            options={'ordering': ['-version_number']},
+        ),
+        migrations.AddField(
+            model_name='cardversion',
+            name='delta',
+            field=models.JSONField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='cardversion',
+            name='snapshot',
+            field=models.JSONField(blank=True, null=True),
+        ),
+        migrations.RunPython(convert_to_snapshots, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='cardversion',
+            name='conclusion',
+        ),
+        migrations.RemoveField(
+            model_name='cardversion',
+            name='hypothesis',
+        ),
+        migrations.RemoveField(
+            model_name='cardversion',
+            name='stance',
+        ),
+        migrations.RemoveField(
+            model_name='cardversion',
+            name='title',
+        ),
+        migrations.AddConstraint(
+            model_name='cardversion',
+            constraint=models.UniqueConstraint(fields=('card', 'version_number'), name='unique_card_version_number'),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.8 on 2026-10-19 10:50
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cards', '0041_cardversion_deltas'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CardSignature',
+            fields=[
+                ('card', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='signature', serialize=False, to='cards.card')),
+                ('minhash', models.BinaryField()),
+                ('cluster', models.BigIntegerField(blank=True, db_index=True, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='CardSignatureBand',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.BigIntegerField(db_index=True)),
+                ('card', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='signature_bands', to='cards.card')),
+            ],
+        ),
+    ]
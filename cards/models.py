@@ -77,6 +77,7 @@ class Card(models.Model):
     
     class Meta:
         ordering = ['-created_at']
+        indexes = [models.Index(fields=['user', '-created_at'])]
     
     def __str__(self):
         return self.title
@@ -335,19 +336,23 @@ class DirectMessage(models.Model):
         return 'delivered' 
 
 class CardVersion(models.Model):
-    """Track changes to argument cards"""
+    """
+    One tracked version of a card. Holds either the full content (snapshot)
+    or a delta from the previous version; see cards/versioning.py.
+    """
     card = models.ForeignKey(Card, on_delete=models.CASCADE, related_name='versions')
     user = models.ForeignKey(User, on_delete=models.CASCADE)
-    title = models.CharField(max_length=200)
-    hypothesis = models.TextField(max_length=500)
-    conclusion = models.TextField(max_length=500)
-    stance = models.CharField(max_length=20)
     version_number = models.IntegerField(default=1)
+    snapshot = models.JSONField(null=True, blank=True)
+    delta = models.JSONField(null=True, blank=True)
     change_summary = models.TextField(max_length=200, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     
     class Meta:
-        ordering = ['-created_at']
+        ordering = ['-version_number']
+        constraints = [
+            models.UniqueConstraint(fields=['card', 'version_number'], name='unique_card_version_number'),
+        ]
     
     def __str__(self):
         return f"{self.card.title} - v{self.version_number}"
@@ -368,11 +373,27 @@ class NotebookEntry(models.Model):
         ('neutral', 'Neutral'),
     ]
     
+    SUMMARY_SOURCES = [
+        ('transcript', 'Video Transcript'),
+        ('article', 'Article Text'),
+        ('ai', 'AI Summarizer'),
+    ]
+    
+    ENRICHMENT_STATUSES = [
+        ('none', 'Not Enriched'),
+        ('summarized', 'Summarized'),
+        ('no_transcript', 'Transcript Unavailable'),
+        ('failed', 'Summary Failed'),
+    ]
+    
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='notebook_entries')
     entry_type = models.CharField(max_length=20, choices=ENTRY_TYPES)
     title = models.CharField(max_length=200)
     content = models.TextField()  # URL for links/videos, text for notes
-    description = models.TextField(max_length=500, blank=True)
+    user_notes = models.TextField(blank=True)
+    auto_summary = models.TextField(blank=True)
+    summary_source = models.CharField(max_length=20, choices=SUMMARY_SOURCES, blank=True)
+    enrichment_status = models.CharField(max_length=20, choices=ENRICHMENT_STATUSES, default='none')
     NOTEBOOK_TOPICS = [
         ('general', 'General Research'),
         ('politics', 'Politics & Government'),
@@ -391,6 +412,11 @@ class NotebookEntry(models.Model):
     topic = models.CharField(max_length=100, choices=NOTEBOOK_TOPICS)
     stance = models.CharField(max_length=20, choices=STANCE_TYPES, default='neutral')
     tags = models.CharField(max_length=200, blank=True, help_text="Comma-separated tags")
+    # Normalized copy of `tags`, kept in sync by signals (see tagging.py)
+    tag_index = models.ManyToManyField('Tag', blank=True, related_name='entries')
+    # Derived from content on save, see refresh_link_fields()
+    youtube_id = models.CharField(max_length=11, blank=True, db_index=True)
+    canonical_url = models.URLField(max_length=500, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
@@ -401,15 +427,21 @@ class NotebookEntry(models.Model):
     def __str__(self):
         return f"{self.user.username} - {self.title}"
     
+    def save(self, *args, **kwargs):
+        self.refresh_link_fields()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'content' in update_fields:
+            kwargs['update_fields'] = {*update_fields, 'entry_type', 'youtube_id', 'canonical_url'}
+        super().save(*args, **kwargs)
+    
+    def refresh_link_fields(self):
+        """Normalize the video ID, canonical URL and entry type from content"""
+        from .youtube_utils import normalize_link
+        self.entry_type, self.youtube_id, self.canonical_url = normalize_link(self.content, self.entry_type)
+    
     def get_youtube_id(self):
-        """Extract YouTube video ID from URL"""
-        if self.entry_type == 'youtube' and 'youtube.com' in self.content or 'youtu.be' in self.content:
-            import re
-            pattern = r'(?:youtube\.com\/watch\?v=|youtu\.be\/)([a-zA-Z0-9_-]+)'
-            match = re.search(pattern, self.content)
-            if match:
-                return match.group(1)
-        return None
+        """Stored YouTube video ID, or None"""
+        return self.youtube_id or None
 
 
 class NotebookNote(models.Model):
@@ -427,6 +459,86 @@ class NotebookNote(models.Model):
         return f"Note for {self.entry.title}: {self.text[:50]}"
 
 
+class Tag(models.Model):
+    """Lowercased notebook tag shared by all users"""
+    name = models.CharField(max_length=50, unique=True)
+    
+    class Meta:
+        ordering = ['name']
+    
+    def __str__(self):
+        return self.name
+
+
+class UserTagCount(models.Model):
+    """How many of a user's notebook entries carry a tag"""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='tag_counts')
+    tag = models.ForeignKey(Tag, on_delete=models.CASCADE, related_name='user_counts')
+    count = models.PositiveIntegerField(default=0)
+    
+    class Meta:
+        unique_together = ['user', 'tag']
+        indexes = [models.Index(fields=['user', '-count'])]
+    
+    def __str__(self):
+        return f"{self.user.username}: {self.tag.name} ({self.count})"
+
+
+class TopicHourlyCount(models.Model):
+    """Public cards created per topic per hour, summed for trending windows"""
+    topic = models.CharField(max_length=100, choices=Card.TOPIC_CHOICES)
+    hour = models.DateTimeField()
+    count = models.IntegerField(default=0)
+    
+    class Meta:
+        unique_together = ['topic', 'hour']
+        indexes = [models.Index(fields=['hour'])]
+    
+    def __str__(self):
+        return f"{self.topic} @ {self.hour:%Y-%m-%d %H}:00 ({self.count})"
+
+
+class UserStats(models.Model):
+    """Per-user totals behind the explore leaderboards"""
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='stats')
+    card_count = models.PositiveIntegerField(default=0)
+    follower_count = models.PositiveIntegerField(default=0)
+    
+    class Meta:
+        verbose_name_plural = 'User stats'
+        indexes = [
+            models.Index(fields=['-card_count']),
+            models.Index(fields=['-follower_count']),
+        ]
+    
+    def __str__(self):
+        return f"{self.user.username}: {self.card_count} cards, {self.follower_count} followers"
+
+
+class CardSignature(models.Model):
+    """
+    MinHash signature of a card's text and the near-duplicate cluster it is in
+    (see cards/duplicates.py). cluster is the lowest card ID in the cluster,
+    or null for a card with no near-duplicates.
+    """
+    card = models.OneToOneField(Card, on_delete=models.CASCADE, primary_key=True, related_name='signature')
+    minhash = models.BinaryField()
+    cluster = models.BigIntegerField(null=True, blank=True, db_index=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"Signature for card {self.card_id}"
+
+
+class CardSignatureBand(models.Model):
+    """One LSH band key of a card's signature; cards sharing a key are duplicate candidates"""
+    card = models.ForeignKey(Card, on_delete=models.CASCADE, related_name='signature_bands')
+    key = models.BigIntegerField(db_index=True)
+    
+    def __str__(self):
+        return f"Card {self.card_id} band {self.key}"
+
+
 class TopicSurvey(models.Model):
     """Survey questions for each policy topic"""
     topic = models.CharField(max_length=100, choices=Card.TOPIC_CHOICES, unique=True)
@@ -539,6 +651,47 @@ class FactSource(models.Model):
         return self.name
 
 
+class FactFeed(models.Model):
+    """One upstream source of facts for a topic, as last fetched by update_facts"""
+    key = models.CharField(max_length=100, unique=True, help_text='"topic:source", see cards/fact_pipeline.py')
+    topic = models.CharField(max_length=50, choices=Card.TOPIC_CHOICES)
+    content_hash = models.CharField(max_length=64, blank=True, help_text='SHA-256 of the facts last fetched')
+    fact_count = models.IntegerField(default=0)
+    last_fetched = models.DateTimeField(null=True, blank=True)
+    last_changed = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    
+    class Meta:
+        ordering = ['key']
+    
+    def __str__(self):
+        return self.key
+
+
+class FactUpdateRun(models.Model):
+    """One update_facts run: what it covered, how far it got, and its metrics"""
+    STATUS_CHOICES = [
+        ('running', 'Running'),
+        ('interrupted', 'Interrupted'),
+        ('finished', 'Finished'),
+    ]
+    
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='running')
+    topics = models.JSONField(default=list)
+    force = models.BooleanField(default=False)
+    completed = models.JSONField(default=list, help_text='Feed keys already written, skipped when resuming')
+    metrics = models.JSONField(default=dict, help_text='fetched, changed, unchanged, skipped, failed, facts written')
+    started_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    duration_seconds = models.FloatField(default=0)
+    
+    class Meta:
+        ordering = ['-started_at']
+    
+    def __str__(self):
+        return f"Fact update {self.started_at:%Y-%m-%d %H:%M} ({self.status})"
+
+
 class SquadDigest(models.Model):
     """Shared video/content in squad digest for collaborative note-taking"""
     shared_by = models.ForeignKey(User, on_delete=models.CASCADE, related_name='shared_digests')
@@ -578,3 +731,27 @@ class UserProfile(models.Model):
     def __str__(self):
         return f"{self.user.username}'s profile"
 
+
+
+class RequestProfile(models.Model):
+    """Stack samples captured for a slow or staff-profiled request"""
+    TRIGGER_CHOICES = [
+        ('header', 'Staff Header'),
+        ('slow', 'Latency Threshold'),
+    ]
+    
+    path = models.CharField(max_length=500)
+    method = models.CharField(max_length=10)
+    view_name = models.CharField(max_length=200, blank=True)
+    user = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='request_profiles')
+    trigger = models.CharField(max_length=10, choices=TRIGGER_CHOICES)
+    duration_ms = models.IntegerField()
+    sample_count = models.IntegerField(default=0)
+    collapsed_stacks = models.TextField(blank=True, help_text='Collapsed-stack format for flamegraph.pl or speedscope')
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        ordering = ['-created_at']
+    
+    def __str__(self):
+        return f"{self.method} {self.path} ({self.duration_ms} ms)"
@@ -0,0 +1,83 @@
+"""
+Low-overhead sampling profiler for individual requests
+
+A StackSampler runs a daemon thread that snapshots the request thread's stack
+every few milliseconds and counts identical stacks. The result is stored in
+collapsed-stack format ("outer;inner;leaf count"), which flamegraph.pl and
+speedscope read directly.
+"""
+import os
+import sys
+import threading
+from collections import Counter
+
+from django.conf import settings
+
+
+def _frame_label(code):
+    filename = code.co_filename
+    parent = os.path.basename(os.path.dirname(filename))
+    return f"{parent}/{os.path.basename(filename)}:{code.co_name}"
+
+
+class StackSampler:
+    """Sample the calling thread's stack on a background thread"""
+
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.thread_id = threading.get_ident()
+        self.stacks = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='debrief-profiler', daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            labels = []
+            while frame is not None:
+                labels.append(_frame_label(frame.f_code))
+                frame = frame.f_back
+            labels.reverse()
+            self.stacks[';'.join(labels)] += 1
+            self.samples += 1
+
+    def collapsed(self, max_stacks=None):
+        """Collapsed-stack text, heaviest stacks first"""
+        stacks = self.stacks.most_common(max_stacks)
+        return '\n'.join(f'{stack} {count}' for stack, count in stacks)
+
+
+def save_profile(request, sampler, duration, trigger):
+    """Store a profile and drop the oldest ones beyond PROFILER_MAX_PROFILES"""
+    from .models import RequestProfile
+
+    match = getattr(request, 'resolver_match', None)
+    user = getattr(request, 'user', None)
+    profile = RequestProfile.objects.create(
+        path=request.path[:500],
+        method=request.method,
+        view_name=match.view_name if match else '',
+        user=user if user is not None and user.is_authenticated else None,
+        trigger=trigger,
+        duration_ms=int(duration * 1000),
+        sample_count=sampler.samples,
+        collapsed_stacks=sampler.collapsed(settings.PROFILER_MAX_STACKS),
+    )
+
+    stale = list(
+        RequestProfile.objects.order_by('-id').values_list('id', flat=True)[settings.PROFILER_MAX_PROFILES:]
+    )
+    if stale:
+        RequestProfile.objects.filter(id__in=stale).delete()
+    return profile
@@ -0,0 +1,513 @@
+"""
+"Related cards" and "opposing view" recommendations from a local TF-IDF index
+
+Each public card is a TF-IDF vector over its title (counted twice),
+hypothesis, conclusion and argument summaries. The refresh_related command
+scores cards against each other through an inverted index and stores each
+card's top NEIGHBORS related cards, plus its top NEIGHBORS same-topic cards
+with the opposite stance, in a fixed-width binary table:
+
+    header   magic, format, NEIGHBORS, card count
+    ids      sorted uint32 card ids
+    rows     per card: related ids, opposing ids (uint32, 0 = empty),
+             then their scores (uint16, cosine * 65535)
+
+Requests memory-map the table and binary-search the card id, so a lookup
+is a few microseconds with no network and no model in memory; the one query
+left is loading the neighbour cards themselves.
+
+The refresh is incremental. Next to the table, a SQLite state file
+(state.sqlite3) keeps each card's term counts and vector, the document
+frequencies, the postings and which cards link to which. Only new or changed
+cards (by updated_at, which argument edits also bump) are re-vectorised and
+re-scored, and only their rows of the state are rewritten. Their scores are
+merged into the other cards' lists; cards whose lists pointed at a changed or
+removed card are re-scored too, and every other row of the table is copied
+as is. Unchanged cards keep the IDF weights they were built with until the
+next --full build.
+
+Scoring is approximate by design, to keep the pure-Python build fast: each
+card is matched on its QUERY_TERMS heaviest terms, against the
+POSTINGS_PER_TERM heaviest cards for each term.
+"""
+import bisect
+import heapq
+import json
+import math
+import mmap
+import os
+import re
+import sqlite3
+import struct
+from collections import Counter, defaultdict
+
+from django.conf import settings
+
+from .models import Argument, Card
+
+NEIGHBORS = 8
+QUERY_TERMS = 8
+POSTINGS_PER_TERM = 100
+# Re-score everything when more than this share of cards changed
+FULL_REBUILD_RATIO = 0.2
+
+MAGIC = b'DBRL'
+FORMAT = 1
+HEADER = struct.Struct('<4sHHI')
+TABLE_FILE = 'related.bin'
+STATE_FILE = 'state.sqlite3'
+STATE_FORMAT = 1
+
+STOPWORDS = frozenset('''
+a about above after again against all am an and any are as at be because been before being below between both
+but by can could did do does doing down during each few for from further had has have having he her here hers
+him his how i if in into is it its itself just me more most my no nor not now of off on once only or other our
+ours out over own same she should so some such than that the their theirs them then there these they this those
+through to too under until up very was we were what when where which while who whom why will with would you your
+'''.split())
+
+SUPPORTING = frozenset(['support', 'supports', 'supporting', 'for', 'pro', 'favor', 'favors', 'yes', 'agree', 'agrees'])
+OPPOSING = frozenset(['oppose', 'opposes', 'opposing', 'against', 'con', 'no', 'disagree', 'disagrees'])
+
+_WORDS = re.compile(r"[a-z0-9][a-z0-9']+")
+
+
+def index_dir():
+    return str(settings.RELATED_INDEX_DIR)
+
+
+def tokens(text):
+    return [word for word in _WORDS.findall((text or '').lower()) if word not in STOPWORDS]
+
+
+def polarity(stance):
+    """+1 for a supporting stance, -1 for an opposing one, 0 when neither is clear"""
+    words = set(_WORDS.findall((stance or '').lower()))
+    return bool(words & SUPPORTING) - bool(words & OPPOSING)
+
+
+def _term_counts(title, hypothesis, conclusion, summaries):
+    counts = Counter(tokens(title) * 2)
+    counts.update(tokens(hypothesis))
+    counts.update(tokens(conclusion))
+    for summary in summaries:
+        counts.update(tokens(summary))
+    return counts
+
+
+def _public_cards():
+    """{card id: updated_at timestamp} for every public card"""
+    return {
+        card_id: updated_at.timestamp()
+        for card_id, updated_at in Card.objects.filter(visibility='public').values_list('id', 'updated_at').iterator()
+    }
+
+
+def _read_documents(card_ids):
+    """{card id: [updated_at, topic, polarity, {term: count}]} for the given cards"""
+    summaries = defaultdict(list)
+    documents = {}
+    for start in range(0, len(card_ids), 2000):
+        chunk = card_ids[start:start + 2000]
+        for card_id, summary in Argument.objects.filter(card_id__in=chunk).values_list('card_id', 'summary').iterator():
+            summaries[card_id].append(summary)
+        rows = Card.objects.filter(id__in=chunk).values_list(
+            'id', 'updated_at', 'topic', 'stance', 'title', 'hypothesis', 'conclusion'
+        )
+        for card_id, updated_at, topic, stance, title, hypothesis, conclusion in rows.iterator():
+            counts = _term_counts(title, hypothesis, conclusion, summaries.pop(card_id, ()))
+            documents[card_id] = [updated_at.timestamp(), topic, polarity(stance), dict(counts)]
+    return documents
+
+
+def _vector(counts, df, total):
+    """Unit-length TF-IDF vector trimmed to its QUERY_TERMS heaviest shared terms"""
+    weights = {term: (1 + math.log(n)) * (math.log((1 + total) / (1 + df[term])) + 1) for term, n in counts.items()}
+    norm = math.sqrt(sum(w * w for w in weights.values())) or 1.0
+    # A term no other card uses can't match anything
+    shared = [(term, w) for term, w in weights.items() if df[term] > 1]
+    top = heapq.nlargest(QUERY_TERMS, shared, key=lambda item: item[1])
+    return [(term, w / norm) for term, w in top]
+
+
+def _vectors(documents):
+    """({card id: vector}, document frequencies) for a full build"""
+    df = Counter()
+    for _, _, _, counts in documents.values():
+        df.update(counts.keys())
+    total = len(documents)
+    return {card_id: _vector(doc[3], df, total) for card_id, doc in documents.items()}, df
+
+
+def _postings(vectors):
+    postings = defaultdict(list)
+    for card_id, vector in vectors.items():
+        for term, weight in vector:
+            postings[term].append((weight, card_id))
+    # Impact ordering: only the heaviest cards for each term are candidates
+    return {
+        term: heapq.nlargest(POSTINGS_PER_TERM, entries) if len(entries) > POSTINGS_PER_TERM else entries
+        for term, entries in postings.items()
+    }
+
+
+class _StoredPostings(dict):
+    """The heaviest POSTINGS_PER_TERM cards for each term, read from the state as needed"""
+
+    def __init__(self, db):
+        super().__init__()
+        self.db = db
+
+    def __missing__(self, term):
+        self[term] = self.db.execute(
+            'SELECT weight, card_id FROM postings WHERE term = ? ORDER BY weight DESC LIMIT ?',
+            (term, POSTINGS_PER_TERM),
+        ).fetchall()
+        return self[term]
+
+
+def _scores(card_id, vector, postings):
+    scores = defaultdict(float)
+    for term, weight in vector:
+        for other_weight, other_id in postings[term]:
+            scores[other_id] += weight * other_weight
+    scores.pop(card_id, None)
+    return scores
+
+
+def _sides(documents):
+    """{card id: (topic, polarity)}"""
+    return {card_id: (doc[1], doc[2]) for card_id, doc in documents.items()}
+
+
+def _opposite(sides, card_id):
+    """The (topic, polarity) of a card's opposing views; None for a neutral card"""
+    topic, side = sides[card_id]
+    return (topic, -side) if side else None
+
+
+def _top(scores, sides, card_id):
+    """(related, opposing) lists of (score, id), best first"""
+    related = heapq.nlargest(NEIGHBORS, scores, key=scores.__getitem__)
+    opposite = _opposite(sides, card_id)
+    opposing = []
+    if opposite is not None:
+        candidates = [other for other in scores if sides[other] == opposite]
+        opposing = heapq.nlargest(NEIGHBORS, candidates, key=scores.__getitem__)
+    return [(scores[other], other) for other in related], [(scores[other], other) for other in opposing]
+
+
+def _offer(entries, score, card_id):
+    """Put (score, card_id) into a best-first list of at most NEIGHBORS, replacing any older score"""
+    entries = [entry for entry in entries if entry[1] != card_id]
+    if len(entries) < NEIGHBORS or score > entries[-1][0]:
+        entries.append((score, card_id))
+        entries.sort(reverse=True)
+    return entries[:NEIGHBORS]
+
+
+def _linked_ids(lists):
+    """The ids in a card's (related, opposing) lists, to tell whether its links changed"""
+    if not lists:
+        return (), ()
+    return tuple(other for _, other in lists[0]), tuple(other for _, other in lists[1])
+
+
+def refresh(full=False):
+    """
+    Bring the index up to date with the public cards. Returns a dict of
+    counts (cards, changed, removed, rescored), whether it was a full build,
+    and 'updated': the ids of cards whose related or opposing links changed.
+    """
+    os.makedirs(index_dir(), exist_ok=True)
+    current = _public_cards()
+    table = _get_table()
+    db = None if full or table is None or table.ids is None else _open_state()
+    try:
+        stored = dict(db.execute('SELECT card_id, updated_at FROM documents')) if db else {}
+        removed = set(stored) - set(current)
+        changed = [card_id for card_id, stamp in current.items() if stored.get(card_id) != stamp]
+        full = not stored or len(changed) + len(removed) > FULL_REBUILD_RATIO * max(len(current), 1)
+        result = _rebuild(current) if full else _update(db, table, changed, removed)
+    finally:
+        if db is not None:
+            db.close()
+    result.update(cards=len(current), changed=len(changed), removed=len(removed), full=full)
+    return result
+
+
+def _rebuild(current):
+    documents = _read_documents(list(current))
+    vectors, df = _vectors(documents)
+    postings = _postings(vectors)
+    sides = _sides(documents)
+    neighbors = {card_id: _top(_scores(card_id, vectors[card_id], postings), sides, card_id) for card_id in documents}
+
+    old = read_table()
+    _write_table(neighbors)
+    _save_state(documents, vectors, df, neighbors)
+    updated = {card_id for card_id in set(old) | set(neighbors) if _linked_ids(old.get(card_id)) != _linked_ids(neighbors.get(card_id))}
+    return {'rescored': len(documents), 'updated': updated}
+
+
+def _update(db, table, changed, removed):
+    """
+    Re-score the changed cards and the cards whose lists pointed at a changed
+    or removed card, touching only their rows of the state. Other cards keep
+    the vectors they were scored with; --full re-weights everything.
+    """
+    stale = sorted(removed | set(changed))
+    pointing = {card_id for (card_id,) in _select_in(db, 'SELECT card_id FROM links WHERE target_id IN ({})', stale)}
+    pointing.difference_update(stale)
+    documents = _read_documents(changed)
+
+    with db:
+        df_change = Counter()
+        for (terms,) in _select_in(db, 'SELECT terms FROM documents WHERE card_id IN ({})', stale):
+            df_change.subtract(json.loads(terms).keys())
+        for doc in documents.values():
+            df_change.update(doc[3].keys())
+        for statement in ('DELETE FROM documents WHERE card_id IN ({})', 'DELETE FROM postings WHERE card_id IN ({})'):
+            _select_in(db, statement, stale)
+        db.executemany(
+            'INSERT INTO df (term, n) VALUES (?, ?) ON CONFLICT (term) DO UPDATE SET n = n + excluded.n',
+            [(term, n) for term, n in df_change.items() if n],
+        )
+        db.executemany('DELETE FROM df WHERE term = ? AND n <= 0', [(term,) for term, n in df_change.items() if n < 0])
+
+        total = db.execute('SELECT COUNT(*) FROM documents').fetchone()[0] + len(documents)
+        terms = sorted({term for doc in documents.values() for term in doc[3]})
+        df = dict(_select_in(db, 'SELECT term, n FROM df WHERE term IN ({})', terms))
+        vectors = {card_id: _vector(doc[3], df, total) for card_id, doc in documents.items()}
+        _insert_documents(db, documents, vectors)
+
+        vectors.update(
+            (card_id, [tuple(entry) for entry in json.loads(vector)])
+            for card_id, vector in _select_in(db, 'SELECT card_id, vector FROM documents WHERE card_id IN ({})', sorted(pointing))
+        )
+        postings = _StoredPostings(db)
+        rescore = set(changed) | pointing
+        scores = {card_id: _scores(card_id, vectors[card_id], postings) for card_id in rescore}
+        candidates = sorted(rescore.union(*scores.values()))
+        sides = {
+            card_id: (topic, side)
+            for card_id, topic, side in _select_in(db, 'SELECT card_id, topic, polarity FROM documents WHERE card_id IN ({})', candidates)
+        }
+        neighbors = {card_id: _top(scores[card_id], sides, card_id) for card_id in rescore}
+
+        # Changed cards may now belong in the lists of cards that weren't re-scored
+        for card_id in changed:
+            for other_id, score in scores[card_id].items():
+                if other_id in rescore:
+                    continue
+                if other_id not in neighbors:
+                    neighbors[other_id] = table.lookup(other_id) or ([], [])
+                related, opposing = neighbors[other_id]
+                related = _offer(related, score, card_id)
+                if _opposite(sides, other_id) == sides[card_id]:
+                    opposing = _offer(opposing, score, card_id)
+                neighbors[other_id] = (related, opposing)
+
+        updated = {card_id for card_id, lists in neighbors.items() if _linked_ids(lists) != _linked_ids(table.lookup(card_id))}
+        updated.update(card_id for card_id in removed if table.lookup(card_id))
+        _select_in(db, 'DELETE FROM links WHERE card_id IN ({})', sorted(removed.union(neighbors)))
+        _insert_links(db, neighbors)
+        _write_table(neighbors, removed, table)
+    return {'rescored': len(rescore), 'updated': updated}
+
+
+_STATE_TABLES = '''
+CREATE TABLE documents (card_id INTEGER PRIMARY KEY, updated_at REAL, topic TEXT, polarity INTEGER, terms TEXT, vector TEXT);
+CREATE TABLE df (term TEXT PRIMARY KEY, n INTEGER) WITHOUT ROWID;
+CREATE TABLE postings (term TEXT, weight REAL, card_id INTEGER);
+CREATE TABLE links (card_id INTEGER, target_id INTEGER);
+'''
+_STATE_INDEXES = '''
+CREATE INDEX postings_by_term ON postings (term, weight DESC);
+CREATE INDEX postings_by_card ON postings (card_id);
+CREATE INDEX links_by_card ON links (card_id);
+CREATE INDEX links_by_target ON links (target_id);
+'''
+
+
+def _select_in(db, sql, values, chunk=500):
+    """Run sql with its IN ({}) filled for each chunk of values; returns all rows"""
+    rows = []
+    for start in range(0, len(values), chunk):
+        part = values[start:start + chunk]
+        rows.extend(db.execute(sql.format(','.join('?' * len(part))), part))
+    return rows
+
+
+def _insert_documents(db, documents, vectors):
+    db.executemany('INSERT INTO documents VALUES (?, ?, ?, ?, ?, ?)', (
+        (card_id, stamp, topic, side, json.dumps(counts, separators=(',', ':')),
+         json.dumps(vectors[card_id], separators=(',', ':')))
+        for card_id, (stamp, topic, side, counts) in documents.items()
+    ))
+    db.executemany('INSERT INTO postings VALUES (?, ?, ?)', (
+        (term, weight, card_id) for card_id, vector in vectors.items() if card_id in documents for term, weight in vector
+    ))
+
+
+def _insert_links(db, neighbors):
+    db.executemany('INSERT INTO links VALUES (?, ?)', (
+        (card_id, target_id)
+        for card_id, (related, opposing) in neighbors.items()
+        for target_id in {other for _, other in related + opposing}
+    ))
+
+
+def _open_state():
+    """The state database, or None when it's missing or from another format"""
+    path = os.path.join(index_dir(), STATE_FILE)
+    if not os.path.exists(path):
+        return None
+    try:
+        db = sqlite3.connect(path)
+        if db.execute('PRAGMA user_version').fetchone()[0] == STATE_FORMAT:
+            return db
+        db.close()
+    except sqlite3.DatabaseError:
+        pass
+    return None
+
+
+def _save_state(documents, vectors, df, neighbors):
+    path = os.path.join(index_dir(), STATE_FILE)
+    if os.path.exists(path + '.tmp'):
+        os.remove(path + '.tmp')
+    db = sqlite3.connect(path + '.tmp')
+    try:
+        db.execute('PRAGMA journal_mode = OFF')
+        db.executescript(_STATE_TABLES)
+        with db:
+            _insert_documents(db, documents, vectors)
+            db.executemany('INSERT INTO df VALUES (?, ?)', df.items())
+            _insert_links(db, neighbors)
+        db.executescript(_STATE_INDEXES)
+        db.execute(f'PRAGMA user_version = {STATE_FORMAT}')
+    finally:
+        db.close()
+    os.replace(path + '.tmp', path)
+
+
+def _row_struct():
+    return struct.Struct(f'<{2 * NEIGHBORS}I{2 * NEIGHBORS}H')
+
+
+def _pack_row(row, lists):
+    slots = [list(entries) + [(0.0, 0)] * (NEIGHBORS - len(entries)) for entries in lists]
+    return row.pack(
+        *(other for _, other in slots[0]), *(other for _, other in slots[1]),
+        *(round(min(score, 1.0) * 65535) for score, _ in slots[0]),
+        *(round(min(score, 1.0) * 65535) for score, _ in slots[1]),
+    )
+
+
+def _write_table(neighbors, removed=(), base=None):
+    """
+    Write the table from neighbors; with a base table, rows neither in
+    neighbors nor removed are copied from it byte for byte
+    """
+    row = _row_struct()
+    kept = base.ids if base is not None and base.ids is not None else ()
+    position = {card_id: index for index, card_id in enumerate(kept)}
+    ids = sorted(set(neighbors).union(kept).difference(removed))
+    path = os.path.join(index_dir(), TABLE_FILE)
+    with open(path + '.tmp', 'wb') as f:
+        f.write(HEADER.pack(MAGIC, FORMAT, NEIGHBORS, len(ids)))
+        f.write(struct.pack(f'<{len(ids)}I', *ids))
+        for card_id in ids:
+            if card_id in neighbors:
+                f.write(_pack_row(row, neighbors[card_id]))
+            else:
+                offset = base.rows_at + position[card_id] * row.size
+                f.write(base.map[offset:offset + row.size])
+    # Readers holding the old file keep their mapping; new lookups see the new one
+    os.replace(path + '.tmp', path)
+
+
+class _Table:
+    """The memory-mapped neighbour table, reopened when refresh_related replaces it"""
+
+    def __init__(self, path):
+        self.path = path
+        self.identity = None
+        self.ids = None
+
+    def current(self):
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            self.identity = self.ids = None
+            return None
+        identity = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        if identity != self.identity:
+            self._open(identity)
+        return self
+
+    def _open(self, identity):
+        with open(self.path, 'rb') as f:
+            self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, neighbors, count = HEADER.unpack_from(self.map, 0)
+        if magic != MAGIC or version != FORMAT or neighbors != NEIGHBORS:
+            self.identity, self.ids = identity, None
+            return
+        self.count = count
+        self.ids = memoryview(self.map)[HEADER.size:HEADER.size + 4 * count].cast('I')
+        self.rows_at = HEADER.size + 4 * count
+        self.identity = identity
+
+    def lookup(self, card_id):
+        if self.ids is None:
+            return None
+        index = bisect.bisect_left(self.ids, card_id)
+        if index == self.count or self.ids[index] != card_id:
+            return None
+        row = _row_struct()
+        values = row.unpack_from(self.map, self.rows_at + index * row.size)
+        k = NEIGHBORS
+        related = [(values[2 * k + i] / 65535, values[i]) for i in range(k) if values[i]]
+        opposing = [(values[3 * k + i] / 65535, values[k + i]) for i in range(k) if values[k + i]]
+        return related, opposing
+
+
+_table = None
+
+
+def _get_table():
+    global _table
+    path = os.path.join(index_dir(), TABLE_FILE)
+    if _table is None or _table.path != path:
+        _table = _Table(path)
+    return _table.current()
+
+
+def neighbors_of(card_id):
+    """([(score, id)] related, [(score, id)] opposing) from the index, or None if not indexed"""
+    table = _get_table()
+    return table.lookup(card_id) if table is not None else None
+
+
+def read_table():
+    """Every card's neighbour lists, for an incremental refresh"""
+    table = _get_table()
+    if table is None or table.ids is None:
+        return {}
+    return {card_id: table.lookup(card_id) for card_id in table.ids}
+
+
+def for_card(card, limit=4):
+    """{'related': [Card], 'opposing': [Card]} for card_detail, public cards only"""
+    found = neighbors_of(card.id)
+    if not found:
+        return {'related': [], 'opposing': []}
+    related, opposing = ([other for _, other in entries] for entries in found)
+    wanted = set(related + opposing)
+    # Cards made private or deleted since the last refresh drop out here
+    cards = Card.objects.filter(id__in=wanted, visibility='public').select_related('user').in_bulk()
+    return {
+        'related': [cards[other] for other in related if other in cards][:limit],
+        'opposing': [cards[other] for other in opposing if other in cards][:limit],
+    }
@@ -0,0 +1,157 @@
+"""
+Materialized rollups for the explore page
+
+TopicHourlyCount holds public cards created per topic per hour, so a trending
+window (24h, 7d, 30d) is a sum over a few hundred rows per topic instead of a
+scan of every recent card. UserStats holds per-user card and follower totals
+for the leaderboards, read top-k straight off an index.
+
+Signals keep both current as cards and follows change. The refresh_rollups
+command rebuilds them from scratch (schedule it hourly) to correct any drift,
+e.g. from bulk writes that skip signals, and drops buckets past the longest
+window.
+"""
+from datetime import timedelta, timezone as dt_timezone
+
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import Coalesce, TruncHour
+from django.utils import timezone
+
+from .models import Card, Follow, TopicHourlyCount, UserStats
+
+WINDOWS = {
+    '24h': timedelta(hours=24),
+    '7d': timedelta(days=7),
+    '30d': timedelta(days=30),
+}
+DEFAULT_WINDOW = '30d'
+RETENTION = max(WINDOWS.values())
+
+
+def _hour(moment):
+    return moment.astimezone(dt_timezone.utc).replace(minute=0, second=0, microsecond=0)
+
+
+def _bump_topic(topic, created_at, delta):
+    hour = _hour(created_at)
+    if hour < _hour(timezone.now() - RETENTION):
+        return
+    if delta > 0:
+        TopicHourlyCount.objects.bulk_create([TopicHourlyCount(topic=topic, hour=hour)], ignore_conflicts=True)
+    TopicHourlyCount.objects.filter(topic=topic, hour=hour).update(count=F('count') + delta)
+
+
+def _bump_user(user_id, field, delta):
+    # Decrements never create rows: during a user delete cascade that would
+    # resurrect stats for a user that is about to disappear
+    stats = UserStats.objects.filter(user_id=user_id)
+    if delta > 0:
+        UserStats.objects.bulk_create([UserStats(user_id=user_id)], ignore_conflicts=True)
+    else:
+        stats = stats.filter(**{f'{field}__gt': 0})
+    stats.update(**{field: F(field) + delta})
+
+
+def card_added(card):
+    _bump_user(card.user_id, 'card_count', 1)
+    if card.visibility == 'public':
+        _bump_topic(card.topic, card.created_at, 1)
+
+
+def card_removed(card):
+    _bump_user(card.user_id, 'card_count', -1)
+    if card.visibility == 'public':
+        _bump_topic(card.topic, card.created_at, -1)
+
+
+def card_changed(card, old_topic, old_visibility):
+    """Move a card between buckets after its topic or visibility changed"""
+    if old_visibility == 'public':
+        _bump_topic(old_topic, card.created_at, -1)
+    if card.visibility == 'public':
+        _bump_topic(card.topic, card.created_at, 1)
+
+
+def follow_added(follow):
+    _bump_user(follow.following_id, 'follower_count', 1)
+
+
+def follow_removed(follow):
+    _bump_user(follow.following_id, 'follower_count', -1)
+
+
+def trending_topics(window=DEFAULT_WINDOW, limit=3):
+    """Topics with the most new public cards in the window as [{code, display, count}]"""
+    since = _hour(timezone.now() - WINDOWS[window])
+    rows = (
+        TopicHourlyCount.objects.filter(hour__gte=since)
+        .values('topic')
+        .annotate(card_count=Sum('count'))
+        .filter(card_count__gt=0)
+        .order_by('-card_count', 'topic')[:limit]
+    )
+    names = dict(Card.TOPIC_CHOICES)
+    return [
+        {'code': row['topic'], 'display': names.get(row['topic'], row['topic']), 'count': row['card_count']}
+        for row in rows
+    ]
+
+
+def _leaders(field, users, limit, include_zero):
+    if users is None:
+        users = User.objects.all()
+    if include_zero:
+        return users.annotate(**{field: Coalesce(F(f'stats__{field}'), 0)}).order_by(f'-{field}')[:limit]
+    # Ordering on the column itself (not an alias) lets the top-k come straight off its index
+    return (
+        users.filter(**{f'stats__{field}__gt': 0})
+        .annotate(**{field: F(f'stats__{field}')})
+        .order_by(f'-stats__{field}')[:limit]
+    )
+
+
+def active_users(users=None, limit=8, include_zero=False):
+    """Users (default: everyone) with the most cards, each annotated with card_count"""
+    return _leaders('card_count', users, limit, include_zero)
+
+
+def popular_users(users=None, limit=8, include_zero=False):
+    """Users (default: everyone) with the most followers, each annotated with follower_count"""
+    return _leaders('follower_count', users, limit, include_zero)
+
+
+def prune():
+    """Drop topic buckets older than the longest window"""
+    deleted, _ = TopicHourlyCount.objects.filter(hour__lt=_hour(timezone.now() - RETENTION)).delete()
+    return deleted
+
+
+def rebuild_topics():
+    since = _hour(timezone.now() - RETENTION)
+    rows = (
+        Card.objects.filter(visibility='public', created_at__gte=since)
+        .annotate(hour=TruncHour('created_at', tzinfo=dt_timezone.utc))
+        .values_list('topic', 'hour')
+        .annotate(n=Count('id'))
+        .order_by()
+    )
+    buckets = [TopicHourlyCount(topic=topic, hour=hour, count=n) for topic, hour, n in rows]
+    with transaction.atomic():
+        TopicHourlyCount.objects.all().delete()
+        TopicHourlyCount.objects.bulk_create(buckets, batch_size=2000)
+    return len(buckets)
+
+
+def rebuild_user_stats():
+    cards = dict(Card.objects.values_list('user_id').annotate(n=Count('id')).order_by())
+    followers = dict(Follow.objects.values_list('following_id').annotate(n=Count('id')).order_by())
+    stats = [
+        UserStats(user_id=user_id, card_count=cards.get(user_id, 0), follower_count=followers.get(user_id, 0))
+        for user_id in cards.keys() | followers.keys()
+    ]
+    with transaction.atomic():
+        UserStats.objects.all().delete()
+        UserStats.objects.bulk_create(stats, batch_size=2000)
+    return len(stats)
@@ -1,7 +1,9 @@
-from django.db.models.signals import post_save
+from django.db.models.signals import post_save, post_delete, pre_delete, pre_save
 from django.dispatch import receiver
+from django.db import transaction
 from django.contrib.auth.models import User
-from .models import UserProfile
+from django.utils import timezone
+from .models import UserProfile, TopicSurvey, SurveyQuestion, QuestionOption, NotebookEntry, Follow, FriendRequest, Card, Argument, Source, SavedCard, Notification, DirectMessage, UserSettings
 
 @receiver(post_save, sender=User)
 def create_user_profile(sender, instance, created, **kwargs):
@@ -12,3 +14,164 @@ def create_user_profile(sender, instance, created, **kwargs):
 def save_user_profile(sender, instance, **kwargs):
     if hasattr(instance, 'profile'):
         instance.profile.save()
+
+@receiver([post_save, post_delete], sender=SurveyQuestion)
+def touch_survey_for_question(sender, instance, **kwargs):
+    """Bump updated_at so cached survey definitions reload"""
+    TopicSurvey.objects.filter(id=instance.survey_id).update(updated_at=timezone.now())
+
+@receiver([post_save, post_delete], sender=QuestionOption)
+def touch_survey_for_option(sender, instance, **kwargs):
+    """Bump updated_at so cached survey definitions reload"""
+    TopicSurvey.objects.filter(questions__id=instance.question_id).update(updated_at=timezone.now())
+
+@receiver(post_save, sender=NotebookEntry)
+def sync_notebook_tags(sender, instance, update_fields=None, **kwargs):
+    """Keep the tag index and per-user tag counts in step with entry.tags"""
+    if update_fields is not None and 'tags' not in update_fields:
+        return
+    from .tagging import sync_entry_tags
+    sync_entry_tags(instance)
+
+@receiver(pre_delete, sender=NotebookEntry)
+def release_notebook_tags(sender, instance, **kwargs):
+    from .tagging import release_entry_tags
+    release_entry_tags(instance)
+
+@receiver([post_save, post_delete], sender=Follow)
+def invalidate_following_graph(sender, instance, **kwargs):
+    from .friend_graph import invalidate_following
+    invalidate_following(instance.follower_id)
+
+@receiver([post_save, post_delete], sender=FriendRequest)
+def invalidate_friend_graph(sender, instance, **kwargs):
+    from .friend_graph import invalidate_friends
+    invalidate_friends(instance.from_user_id, instance.to_user_id)
+
+@receiver(post_save, sender=Card)
+def publish_to_timelines(sender, instance, created, **kwargs):
+    """Fan a new card out to followers' home timelines once it is committed, and move it when its visibility changes"""
+    from .timeline import publish, republish
+    if created:
+        transaction.on_commit(lambda: publish(instance))
+        return
+    # Stored before the save by remember_card_bucket
+    bucket = getattr(instance, '_rollup_bucket', None)
+    if bucket and bucket[1] != instance.visibility:
+        old_visibility = bucket[1]
+        transaction.on_commit(lambda: republish(instance, old_visibility))
+
+@receiver(post_delete, sender=Card)
+def retract_from_timelines(sender, instance, **kwargs):
+    from .timeline import retract
+    retract(instance)
+
+@receiver([post_save, post_delete], sender=Follow)
+def reset_follower_timeline(sender, instance, **kwargs):
+    from .timeline import invalidate
+    invalidate(instance.follower_id)
+
+@receiver([post_save, post_delete], sender=FriendRequest)
+def reset_friend_timelines(sender, instance, **kwargs):
+    """Friends-only cards become visible (or not) when a friendship changes"""
+    from .timeline import invalidate
+    invalidate(instance.from_user_id, instance.to_user_id)
+
+@receiver(pre_save, sender=Card)
+def remember_card_bucket(sender, instance, update_fields=None, **kwargs):
+    """Note the stored topic/visibility so post_save can move the card between rollup buckets"""
+    if instance.pk is None or (update_fields is not None and not {'topic', 'visibility'} & set(update_fields)):
+        instance._rollup_bucket = None
+        return
+    instance._rollup_bucket = Card.objects.filter(pk=instance.pk).values_list('topic', 'visibility').first()
+
+@receiver(post_save, sender=Card)
+def update_card_rollups(sender, instance, created, **kwargs):
+    from . import rollups
+    if created:
+        rollups.card_added(instance)
+        return
+    bucket = getattr(instance, '_rollup_bucket', None)
+    if bucket and bucket != (instance.topic, instance.visibility):
+        rollups.card_changed(instance, *bucket)
+
+@receiver(post_delete, sender=Card)
+def remove_card_rollups(sender, instance, **kwargs):
+    from .rollups import card_removed
+    card_removed(instance)
+
+@receiver(post_save, sender=Follow)
+def count_new_follower(sender, instance, created, **kwargs):
+    if created:
+        from .rollups import follow_added
+        follow_added(instance)
+
+@receiver(post_delete, sender=Follow)
+def count_lost_follower(sender, instance, **kwargs):
+    from .rollups import follow_removed
+    follow_removed(instance)
+
+@receiver([post_save, post_delete], sender=Card)
+def bump_card_pages(sender, instance, **kwargs):
+    from .view_cache import bump
+    bump('cards', f'card:{instance.id}')
+
+@receiver([post_save, post_delete], sender=Argument)
+def bump_card_pages_for_child(sender, instance, **kwargs):
+    from .view_cache import bump
+    bump('cards', f'card:{instance.card_id}')
+
+@receiver([post_save, post_delete], sender=Argument)
+def touch_card_for_argument(sender, instance, **kwargs):
+    """Bump updated_at so refresh_related re-reads the card's argument summaries"""
+    Card.objects.filter(id=instance.card_id).update(updated_at=timezone.now())
+
+@receiver(post_save, sender=Card)
+def index_card_duplicates(sender, instance, **kwargs):
+    """Re-check near-duplicates after commit, when the card's arguments are written too"""
+    from .duplicates import index_after_commit
+    index_after_commit(instance.id)
+
+@receiver([post_save, post_delete], sender=Argument)
+def index_card_duplicates_for_argument(sender, instance, **kwargs):
+    from .duplicates import index_after_commit
+    index_after_commit(instance.card_id)
+
+@receiver([post_save, post_delete], sender=SavedCard)
+def bump_saver_pages(sender, instance, **kwargs):
+    """Save counts on list pages and the saver's own saved state; the card content is untouched"""
+    from .view_cache import bump
+    bump('cards', f'viewer:{instance.user_id}')
+
+@receiver([post_save, post_delete], sender=Source)
+def bump_card_pages_for_source(sender, instance, **kwargs):
+    from .view_cache import bump
+    card_id = Argument.objects.filter(pk=instance.argument_id).values_list('card_id', flat=True).first()
+    # None when the argument itself is being deleted; its own signal covers the card
+    if card_id is not None:
+        bump('cards', f'card:{card_id}')
+
+@receiver([post_save, post_delete], sender=Follow)
+def bump_follow_pages(sender, instance, **kwargs):
+    from .view_cache import bump
+    bump('follows', f'viewer:{instance.follower_id}', f'viewer:{instance.following_id}')
+
+@receiver([post_save, post_delete], sender=FriendRequest)
+def bump_friend_pages(sender, instance, **kwargs):
+    from .view_cache import bump
+    bump(f'viewer:{instance.from_user_id}', f'viewer:{instance.to_user_id}', f'friend_requests:{instance.to_user_id}')
+
+@receiver([post_save, post_delete], sender=UserSettings)
+def bump_settings_pages(sender, instance, **kwargs):
+    from .view_cache import bump
+    bump(f'viewer:{instance.user_id}')
+
+@receiver([post_save, post_delete], sender=Notification)
+def bump_notification_count(sender, instance, **kwargs):
+    from .view_cache import bump
+    bump(f'notifications:{instance.recipient_id}')
+
+@receiver([post_save, post_delete], sender=DirectMessage)
+def bump_message_count(sender, instance, **kwargs):
+    from .view_cache import bump
+    bump(f'messages:{instance.recipient_id}')
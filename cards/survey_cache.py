@@ -0,0 +1,111 @@
+"""
+In-memory cache of survey definitions
+
+A survey's questions and options are loaded once into immutable tuples and
+kept per process, keyed by (survey id, updated_at). Editing a question or
+option bumps the survey's updated_at (see signals.py), so the next lookup
+reloads it. Resolving submitted option IDs then needs no queries at all.
+"""
+import threading
+from types import MappingProxyType
+from typing import NamedTuple
+
+from .models import TopicSurvey, SurveyQuestion
+
+
+class OptionDef(NamedTuple):
+    id: int
+    option_text: str
+    order: int
+    card_value: str
+
+
+class QuestionDef(NamedTuple):
+    id: int
+    question_text: str
+    order: int
+    maps_to: str
+    context_stats: str
+    learn_more: str
+    sources: str
+    options: tuple
+
+
+class SurveyDef(NamedTuple):
+    id: int
+    topic: str
+    title: str
+    description: str
+    is_active: bool
+    updated_at: object
+    questions: tuple
+    # option id -> (QuestionDef, OptionDef)
+    options_by_id: MappingProxyType
+
+    def resolve(self, question, option_ids):
+        """Options of `question` matching the submitted IDs, ignoring unknown ones"""
+        resolved = []
+        for option_id in option_ids:
+            try:
+                match = self.options_by_id[int(option_id)]
+            except (KeyError, TypeError, ValueError):
+                continue
+            if match[0].id == question.id:
+                resolved.append(match[1])
+        return resolved
+
+
+_definitions = {}
+_lock = threading.Lock()
+
+
+def _load(survey):
+    """Build the immutable definition with two queries"""
+    questions = list(SurveyQuestion.objects.filter(survey=survey).prefetch_related('options'))
+    question_defs = []
+    options_by_id = {}
+    for question in questions:
+        options = tuple(
+            OptionDef(option.id, option.option_text, option.order, option.card_value)
+            for option in question.options.all()
+        )
+        question_def = QuestionDef(
+            question.id, question.question_text, question.order, question.maps_to,
+            question.context_stats, question.learn_more, question.sources, options,
+        )
+        question_defs.append(question_def)
+        for option in options:
+            options_by_id[option.id] = (question_def, option)
+
+    return SurveyDef(
+        survey.id, survey.topic, survey.title, survey.description, survey.is_active,
+        survey.updated_at, tuple(question_defs), MappingProxyType(options_by_id),
+    )
+
+
+def get_survey(topic, active_only=False):
+    """
+    Survey definition for a topic, or None.
+    Costs one query for the survey row; questions and options come from memory.
+    """
+    surveys = TopicSurvey.objects.filter(topic=topic)
+    if active_only:
+        surveys = surveys.filter(is_active=True)
+    survey = surveys.first()
+    if survey is None:
+        return None
+
+    key = (survey.id, survey.updated_at)
+    definition = _definitions.get(survey.id)
+    if definition is not None and (definition.id, definition.updated_at) == key:
+        return definition
+
+    definition = _load(survey)
+    with _lock:
+        _definitions[survey.id] = definition
+    return definition
+
+
+def clear():
+    with _lock:
+        _definitions.clear()
@@ -0,0 +1,72 @@
+"""
+AI "learn more" context for survey questions, requested in batches
+
+generate_survey_context --use-ai asks the model about every question that
+needs context. generate() sends those requests from a pool of `concurrency`
+threads sharing one client, so a survey takes about as long as its slowest
+calls rather than the sum of all of them.
+
+The LLM gateway caches replies by prompt, which holds the topic and the
+question text, and by model, so a rerun only asks about new or reworded
+questions, or a different model.
+"""
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from .llm import parse_json_reply
+
+
+def parse_context(text):
+    """{learn_more, stats, sources} from a reply; a reply without JSON is used as learn_more"""
+    data = parse_json_reply(text)
+    if data is None:
+        return {'learn_more': (text or '').strip(), 'stats': [], 'sources': [], 'parsed': False}
+    listed = lambda value: [str(item) for item in value] if isinstance(value, list) else []
+    return {
+        'learn_more': str(data.get('learn_more') or '').strip(),
+        'stats': listed(data.get('stats')),
+        'sources': listed(data.get('sources')),
+        'parsed': True,
+    }
+
+
+def generate(topic, questions, generator, concurrency=4, refresh=False):
+    """
+    Context for each question, from the gateway's cache or the model.
+    Returns ({question id: parse_context() dict}, report), where the report
+    counts questions asked, cached and failed, tokens used, the wall time
+    and the summed duration of the calls. refresh skips the cache.
+    """
+    started = time.perf_counter()
+    report = {
+        'asked': 0, 'cached': 0, 'failed': 0, 'input_tokens': 0, 'output_tokens': 0,
+        'call_seconds': 0.0, 'errors': {},
+    }
+    contexts = {}
+
+    def ask(question):
+        call_started = time.perf_counter()
+        reply = generator.request_question_context(topic, question.question_text, refresh=refresh)
+        return reply, time.perf_counter() - call_started
+
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as pool:
+        futures = {pool.submit(ask, question): question for question in questions}
+        for future in as_completed(futures):
+            question = futures[future]
+            try:
+                reply, seconds = future.result()
+            except Exception as exc:
+                report['failed'] += 1
+                report['errors'][question.id] = f'{type(exc).__name__}: {exc}'
+                continue
+            contexts[question.id] = parse_context(reply.text)
+            if reply.cached:
+                report['cached'] += 1
+                continue
+            report['asked'] += 1
+            report['input_tokens'] += reply.input_tokens
+            report['output_tokens'] += reply.output_tokens
+            report['call_seconds'] += seconds
+
+    report['seconds'] = time.perf_counter() - started
+    return contexts, report
@@ -0,0 +1,139 @@
+"""
+Normalized notebook tags
+
+NotebookEntry.tags stays the comma-separated text users type. Every save
+mirrors it into the Tag table (entry.tag_index) and keeps UserTagCount, the
+per-user tally behind the tag cloud and autocomplete, in step.
+"""
+from django.db import transaction
+from django.db.models import Count, F
+
+from .models import NotebookEntry, Tag, UserTagCount
+
+MAX_TAG_LENGTH = 50
+EntryTag = NotebookEntry.tag_index.through
+
+
+def normalize_tag(text):
+    """Lowercase and collapse whitespace"""
+    return ' '.join((text or '').split()).lower()[:MAX_TAG_LENGTH]
+
+
+def parse_tags(text):
+    """Distinct normalized tag names in the order they were typed"""
+    names = []
+    for raw in (text or '').split(','):
+        name = normalize_tag(raw)
+        if name and name not in names:
+            names.append(name)
+    return names
+
+
+def _tag_ids(names):
+    """name -> Tag id, creating the tags that don't exist yet"""
+    ids = dict(Tag.objects.filter(name__in=names).values_list('name', 'id'))
+    missing = [name for name in names if name not in ids]
+    if missing:
+        Tag.objects.bulk_create([Tag(name=name) for name in missing], ignore_conflicts=True)
+        ids.update(Tag.objects.filter(name__in=missing).values_list('name', 'id'))
+    return ids
+
+
+def _adjust_counts(user_id, tag_ids, delta):
+    if not tag_ids:
+        return
+    counts = UserTagCount.objects.filter(user_id=user_id, tag_id__in=tag_ids)
+    if delta > 0:
+        UserTagCount.objects.bulk_create(
+            [UserTagCount(user_id=user_id, tag_id=tag_id) for tag_id in tag_ids],
+            ignore_conflicts=True,
+        )
+    else:
+        counts.filter(count__lte=1).delete()
+    counts.update(count=F('count') + delta)
+
+
+def sync_entry_tags(entry):
+    """Mirror entry.tags into entry.tag_index and the owner's tag counts"""
+    names = parse_tags(entry.tags)
+    current = dict(
+        EntryTag.objects.filter(notebookentry_id=entry.id).values_list('tag__name', 'tag_id')
+    )
+    if set(current) == set(names):
+        return
+
+    with transaction.atomic():
+        removed = [tag_id for name, tag_id in current.items() if name not in names]
+        if removed:
+            EntryTag.objects.filter(notebookentry_id=entry.id, tag_id__in=removed).delete()
+            _adjust_counts(entry.user_id, removed, -1)
+
+        added = list(_tag_ids([name for name in names if name not in current]).values())
+        if added:
+            EntryTag.objects.bulk_create([EntryTag(notebookentry_id=entry.id, tag_id=tag_id) for tag_id in added])
+            _adjust_counts(entry.user_id, added, 1)
+
+
+def release_entry_tags(entry):
+    """Take a deleted entry's tags off its owner's counts"""
+    tag_ids = list(EntryTag.objects.filter(notebookentry_id=entry.id).values_list('tag_id', flat=True))
+    _adjust_counts(entry.user_id, tag_ids, -1)
+
+
+def index_new_entries(entries):
+    """
+    Link freshly bulk-created entries (which skip signals) to their tags.
+    Call rebuild_counts() for their owners afterwards.
+    """
+    parsed = [(entry, parse_tags(entry.tags)) for entry in entries]
+    ids = _tag_ids(sorted({name for _, names in parsed for name in names}))
+    EntryTag.objects.bulk_create(
+        [EntryTag(notebookentry_id=entry.id, tag_id=ids[name]) for entry, names in parsed for name in names],
+        batch_size=2000,
+    )
+
+
+def rebuild_counts(user_ids, chunk_size=500):
+    """Recompute UserTagCount from the tag links of the given users"""
+    user_ids = list(user_ids)
+    for start in range(0, len(user_ids), chunk_size):
+        chunk = user_ids[start:start + chunk_size]
+        rows = (
+            EntryTag.objects.filter(notebookentry__user_id__in=chunk)
+            .values_list('notebookentry__user_id', 'tag_id')
+            .annotate(n=Count('id'))
+        )
+        with transaction.atomic():
+            UserTagCount.objects.filter(user_id__in=chunk).delete()
+            UserTagCount.objects.bulk_create(
+                [UserTagCount(user_id=user_id, tag_id=tag_id, count=n) for user_id, tag_id, n in rows],
+                batch_size=2000,
+            )
+
+
+def tag_cloud(user, limit=30):
+    """The user's most used tags as (name, count, weight 1-5), alphabetical"""
+    rows = list(
+        UserTagCount.objects.filter(user=user)
+        .order_by('-count', 'tag__name')
+        .values_list('tag__name', 'count')[:limit]
+    )
+    if not rows:
+        return []
+    top = rows[0][1]
+    low = rows[-1][1]
+    spread = max(top - low, 1)
+    return sorted((name, count, 1 + round(4 * (count - low) / spread)) for name, count in rows)
+
+
+def autocomplete(user, prefix, limit=10):
+    """The user's tags starting with prefix, most used first"""
+    prefix = normalize_tag(prefix)
+    if not prefix:
+        return []
+    return list(
+        UserTagCount.objects.filter(user=user, tag__name__startswith=prefix)
+        .order_by('-count', 'tag__name')
+        .values_list('tag__name', flat=True)[:limit]
+    )
+
@@ -1,5 +1,5 @@
 from django import template
-import re
+from cards.youtube_utils import extract_video_id
 
 register = template.Library()
 
@@ -8,16 +8,4 @@ def extract_youtube_id(url):
     """Extract YouTube video ID from URL"""
     if not url:
         return ''
-    
-    patterns = [
-        r'(?:youtube\.com\/watch\?v=)([a-zA-Z0-9_-]{11})',
-        r'(?:youtu\.be\/)([a-zA-Z0-9_-]{11})',
-        r'youtube\.com\/embed\/([a-zA-Z0-9_-]{11})',
-    ]
-    
-    for pattern in patterns:
-        match = re.search(pattern, url)
-        if match:
-            return match.group(1)
-    
-    return ''
+    return extract_video_id(url) or ''
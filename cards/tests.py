@@ -1,3 +1,741 @@
-from django.test import TestCase
+import io
+import json
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from . import duplicates, fact_index, friend_graph, llm, related, survey_context, timeline, versioning, view_cache
+from .ai_search_helper import AISearchHelper
+from .card_builder import argument_payload, assemble_card, parse_sources
+from .fact_apis import AIFactGenerator
+from .models import Argument, Card, Conversation, DirectMessage, Follow, FriendRequest, Notification, PolicyFact, Source
+
+LOCMEM_CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+
+def make_card(user, title='Expand legal immigration pathways', visibility='public', topic='immigration_policy', **fields):
+    fields.setdefault('hypothesis', 'We should expand legal pathways for skilled workers and their families to enter the country each year')
+    fields.setdefault('conclusion', 'Expanding legal immigration pathways would grow the economy and reunite families across the nation')
+    return Card.objects.create(
+        user=user, title=title, topic=topic, scope='federal', stance='Supports', visibility=visibility, **fields,
+    )
+
+
+class CollapseTests(TestCase):
+    def setUp(self):
+        self.alice = User.objects.create_user('alice', password='x')
+        self.bob = User.objects.create_user('bob', password='x')
+        self.older = make_card(self.alice)
+        self.newer = make_card(self.bob)
+        Card.objects.filter(id=self.newer.id).update(created_at=timezone.now() + timedelta(seconds=5))
+        duplicates.index_card(self.older.id)
+        duplicates.index_card(self.newer.id)
+
+    def test_hides_older_duplicate_in_same_listing(self):
+        shown = list(duplicates.collapse(Card.objects.all()))
+        self.assertEqual([card.id for card in shown], [self.newer.id])
+        self.assertEqual(shown[0].similar_count, 1)
+
+    def test_keeps_card_whose_duplicate_is_not_listed(self):
+        shown = list(duplicates.collapse(Card.objects.filter(user__username='alice')))
+        self.assertEqual([card.id for card in shown], [self.older.id])
+        self.assertEqual(shown[0].similar_count, 0)
+
+    def test_merging_clusters_bumps_card_lists(self):
+        before = view_cache.versions('cards')
+        third = make_card(self.alice)
+        with self.captureOnCommitCallbacks(execute=True):
+            duplicates.index_card(third.id)
+        self.assertNotEqual(view_cache.versions('cards'), before)
+
+    def test_keeps_card_whose_duplicate_is_in_another_topic(self):
+        Card.objects.filter(id=self.newer.id).update(topic='healthcare_reform')
+        shown = duplicates.collapse(Card.objects.filter(topic='immigration_policy'))
+        self.assertEqual([card.id for card in shown], [self.older.id])
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class ConditionalGetTests(TestCase):
+    """Pages and counts answer 304 until a write they depend on commits"""
+
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user('author', password='x')
+        self.reader = User.objects.create_user('reader', password='x')
+        self.card = make_card(self.author, title='Conditional card')
+        self.argument = Argument.objects.create(card=self.card, type='pro', summary='First reason')
+        self.client.force_login(self.reader)
+
+    def get(self, url, etag=None, client=None):
+        client = client or self.client
+        if client.cookies.get(settings.CSRF_COOKIE_NAME) is None:
+            # The ETag covers the CSRF cookie, which the first page with a form sets
+            client.get(url)
+        if etag is None:
+            return client.get(url)
+        return client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+    def write(self):
+        """Run the block's on_commit stamp bumps, as a committed request would"""
+        return self.captureOnCommitCallbacks(execute=True)
+
+    def assertRevalidates(self, url, change, client=None):
+        """url answers 304 to its own ETag, then 200 with a new ETag once change() commits"""
+        first = self.get(url, client=client)
+        self.assertEqual(first.status_code, 200)
+        etag = first['ETag']
+        self.assertEqual(self.get(url, etag, client).status_code, 304)
+        with self.write():
+            change()
+        second = self.get(url, etag, client)
+        self.assertEqual(second.status_code, 200)
+        self.assertNotEqual(second['ETag'], etag)
+        self.assertEqual(self.get(url, second['ETag'], client).status_code, 304)
+        return second
+
+    def test_card_detail_after_argument_change(self):
+        url = reverse('card_detail', args=[self.card.id])
+        response = self.assertRevalidates(
+            url, lambda: Argument.objects.create(card=self.card, type='con', summary='A new objection'),
+        )
+        self.assertContains(response, 'A new objection')
+
+    def test_card_detail_after_source_change(self):
+        url = reverse('card_detail', args=[self.card.id])
+        response = self.assertRevalidates(
+            url, lambda: Source.objects.create(argument=self.argument, title='Census report'),
+        )
+        self.assertContains(response, 'Census report')
+
+    def test_card_detail_after_visibility_change(self):
+        url = reverse('card_detail', args=[self.card.id])
+        etag = self.get(url)['ETag']
+        with self.write():
+            self.card.visibility = 'private'
+            self.card.save()
+        self.assertEqual(self.get(url, etag).status_code, 302)
+
+    def test_topic_cards_after_argument_and_visibility_change(self):
+        url = reverse('topic_cards', args=['immigration_policy'])
+        self.assertRevalidates(url, lambda: Argument.objects.create(card=self.card, type='con', summary='Objection'))
+
+        def hide():
+            self.card.visibility = 'private'
+            self.card.save()
+        response = self.assertRevalidates(url, hide)
+        self.assertNotContains(response, 'Conditional card')
+
+    def test_commons_cards_after_card_change(self):
+        commons = User.objects.create_user('DebriefCommons', password='x')
+        card = make_card(commons, title='Commons card')
+        url = reverse('commons')
+
+        def hide():
+            card.visibility = 'private'
+            card.save()
+        response = self.assertRevalidates(url, hide)
+        self.assertNotContains(response, 'Commons card')
+
+    def test_user_profile_after_card_and_follow_change(self):
+        url = reverse('user_profile', args=['author'])
+        response = self.assertRevalidates(url, lambda: make_card(self.author, title='Second card'))
+        self.assertContains(response, 'Second card')
+        self.assertRevalidates(url, lambda: Follow.objects.create(follower=self.reader, following=self.author))
+
+    def test_notification_count(self):
+        response = self.assertRevalidates(
+            reverse('notification_count'),
+            lambda: Notification.objects.create(recipient=self.reader, notification_type='follow', message='Hi'),
+        )
+        self.assertEqual(response.json(), {'count': 1})
+
+    def test_message_count(self):
+        conversation = Conversation.objects.create(participant1=self.author, participant2=self.reader)
+        response = self.assertRevalidates(
+            reverse('message_count'),
+            lambda: DirectMessage.objects.create(
+                conversation=conversation, sender=self.author, recipient=self.reader, message='Hello',
+            ),
+        )
+        self.assertEqual(response.json(), {'count': 1})
+
+    def test_friend_request_count(self):
+        response = self.assertRevalidates(
+            reverse('friend_request_count'),
+            lambda: FriendRequest.objects.create(from_user=self.author, to_user=self.reader),
+        )
+        self.assertEqual(response.json(), {'count': 1})
+
+    def test_unrelated_write_keeps_card_detail_fresh(self):
+        url = reverse('card_detail', args=[self.card.id])
+        etag = self.get(url)['ETag']
+        with self.write():
+            make_card(self.author, title='Another card')
+        self.assertEqual(self.get(url, etag).status_code, 304)
+
+
+class FakeAnthropic(llm.StubAnthropic):
+    """
+    Stand-in for anthropic.Anthropic that answers with canned question
+    context, as JSON in a code fence like the real model often does
+    """
+
+    def __init__(self, latency=0.2):
+        super().__init__(latency=latency)
+
+    def reply(self, prompt):
+        reply = json.dumps({
+            'stats': ['Placeholder statistic (fake client)'],
+            'learn_more': f'Offline context for: {prompt.splitlines()[2].strip()[:120]}',
+            'sources': ['https://example.org/fake'],
+        }, indent=2)
+        return f'Here is the context:\n```json\n{reply}\n```'
+
+
+class CountingFakeAnthropic(FakeAnthropic):
+    """FakeAnthropic that records the most calls it had in flight at once"""
+
+    def __init__(self, latency=0.05):
+        super().__init__(latency=latency)
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.gauge = threading.Lock()
+
+    def _create(self, *args, **kwargs):
+        with self.gauge:
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            return super()._create(*args, **kwargs)
+        finally:
+            with self.gauge:
+                self.in_flight -= 1
+
+
+@override_settings(CACHES=LOCMEM_CACHES, LLM_USER_DAILY_TOKENS=0, LLM_GLOBAL_DAILY_TOKENS=0)
+class SurveyContextTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client_stub = CountingFakeAnthropic()
+        self.generator = AIFactGenerator(client=self.client_stub)
+        self.questions = [
+            SimpleNamespace(id=number, question_text=f'Question {number} about border policy?') for number in range(8)
+        ]
+
+    def test_concurrency_is_capped(self):
+        contexts, report = survey_context.generate('immigration', self.questions, self.generator, concurrency=3)
+        self.assertEqual(self.client_stub.calls, 8)
+        self.assertEqual(self.client_stub.max_in_flight, 3)
+        self.assertEqual(sorted(contexts), list(range(8)))
+        self.assertEqual(report['asked'], 8)
+        self.assertTrue(contexts[0]['parsed'])
+        self.assertIn('Question 0 about border policy', contexts[0]['learn_more'])
+
+    def test_rerun_is_answered_from_cache(self):
+        survey_context.generate('immigration', self.questions, self.generator)
+        contexts, report = survey_context.generate('immigration', self.questions, self.generator)
+        self.assertEqual(self.client_stub.calls, 8)
+        self.assertEqual((report['asked'], report['cached']), (0, 8))
+        self.assertEqual((report['input_tokens'], report['output_tokens']), (0, 0))
+        self.assertEqual(len(contexts), 8)
+
+        reworded = [SimpleNamespace(id=99, question_text='A reworded question?')]
+        _, report = survey_context.generate('immigration', self.questions + reworded, self.generator)
+        self.assertEqual((report['asked'], report['cached']), (1, 8))
+
+        _, report = survey_context.generate('immigration', self.questions, self.generator, refresh=True)
+        self.assertEqual(report['asked'], 8)
+        self.assertEqual(self.client_stub.calls, 17)
+
+    def test_reports_tokens_and_time(self):
+        _, report = survey_context.generate('immigration', self.questions, self.generator, concurrency=4)
+        self.assertGreater(report['input_tokens'], 0)
+        self.assertGreater(report['output_tokens'], 0)
+        # Eight 50 ms calls, four at a time: about 0.1 s of wall time for 0.4 s of calls
+        self.assertGreaterEqual(report['call_seconds'], 8 * self.client_stub.latency)
+        self.assertLess(report['seconds'], report['call_seconds'])
+
+    def test_failures_are_reported_per_question(self):
+        class Failing(CountingFakeAnthropic):
+            def reply(self, prompt):
+                if 'Question 3 ' in prompt:
+                    raise RuntimeError('upstream overloaded')
+                return super().reply(prompt)
+
+        generator = AIFactGenerator(client=Failing())
+        contexts, report = survey_context.generate('immigration', self.questions, generator)
+        self.assertEqual(report['failed'], 1)
+        self.assertIn('upstream overloaded', report['errors'][3])
+        self.assertNotIn(3, contexts)
+        self.assertEqual(len(contexts), 7)
+
+    def test_parse_context_reads_fenced_json(self):
+        context = survey_context.parse_context(
+            'Here you go:\n```json\n{"learn_more": " Some text ", "stats": ["a", 2], "sources": ["https://x.org"]}\n```'
+        )
+        self.assertEqual(context, {
+            'learn_more': 'Some text', 'stats': ['a', '2'], 'sources': ['https://x.org'], 'parsed': True,
+        })
+
+    def test_parse_context_reads_json_inside_prose(self):
+        context = survey_context.parse_context(
+            'Sure {not json} - the answer is {"learn_more": "Body", "stats": "not a list"} as requested.'
+        )
+        self.assertEqual(context['learn_more'], 'Body')
+        self.assertEqual(context['stats'], [])
+        self.assertTrue(context['parsed'])
+
+    def test_parse_context_falls_back_to_raw_text(self):
+        context = survey_context.parse_context('  Just a paragraph.  ')
+        self.assertEqual(context, {'learn_more': 'Just a paragraph.', 'stats': [], 'sources': [], 'parsed': False})
+
+
+@override_settings(CACHES=LOCMEM_CACHES, LLM_USER_DAILY_TOKENS=0, LLM_GLOBAL_DAILY_TOKENS=0)
+class GatewayTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.stub = llm.StubAnthropic(latency=0.01)
+        self.gateway = llm.Gateway(client=self.stub)
+        self.user = User.objects.create_user('spender', password='x')
+
+    def test_identical_requests_in_flight_share_one_call(self):
+        gateway = llm.Gateway(client=llm.StubAnthropic(latency=0.3))
+        start = threading.Barrier(6)
+        replies = []
+
+        def ask():
+            start.wait()
+            replies.append(gateway.complete('Summarize the border bill'))
+
+        threads = [threading.Thread(target=ask) for _ in range(6)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(gateway.client.calls, 1)
+        self.assertEqual(len(replies), 6)
+        self.assertEqual(sum(reply.shared for reply in replies), 5)
+        self.assertEqual({reply.text for reply in replies}, {replies[0].text})
+
+    def test_error_reaches_every_waiting_caller(self):
+        class Failing(llm.StubAnthropic):
+            def reply(self, prompt):
+                raise RuntimeError('overloaded')
+
+        gateway = llm.Gateway(client=Failing(latency=0.2))
+        start = threading.Barrier(3)
+        errors = []
+
+        def ask():
+            start.wait()
+            try:
+                gateway.complete('Same prompt')
+            except RuntimeError as exc:
+                errors.append(exc)
+
+        threads = [threading.Thread(target=ask) for _ in range(3)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(gateway.client.calls, 1)
+        self.assertEqual(len(errors), 3)
+
+    def test_reply_is_cached_across_gateways(self):
+        first = self.gateway.complete('What changed in 2024?', max_tokens=100)
+        self.assertFalse(first.cached)
+        again = llm.Gateway(client=llm.StubAnthropic(latency=0)).complete('What changed in 2024?', max_tokens=100)
+        self.assertTrue(again.cached)
+        self.assertEqual(again.text, first.text)
+        self.assertEqual(self.stub.calls, 1)
+
+        # A different max_tokens is a different request
+        self.assertFalse(self.gateway.complete('What changed in 2024?', max_tokens=200).cached)
+        # cache_reply=False asks again
+        self.assertFalse(self.gateway.complete('What changed in 2024?', max_tokens=100, cache_reply=False).cached)
+        self.assertEqual(self.stub.calls, 3)
+
+    def test_cached_reply_costs_no_tokens(self):
+        self.gateway.complete('Cached prompt', user=self.user)
+        spent = llm.tokens_used(self.user)
+        self.assertGreater(spent, 0)
+        self.gateway.complete('Cached prompt', user=self.user)
+        self.assertEqual(llm.tokens_used(self.user), spent)
+
+    @override_settings(LLM_USER_DAILY_TOKENS=400)
+    def test_user_budget(self):
+        # Each request is estimated at 100 prompt + 200 max_tokens = 300 tokens
+        self.gateway.complete('a' * 400, max_tokens=200, user=self.user)
+        with self.assertRaises(llm.BudgetExceeded):
+            self.gateway.complete('b' * 400, max_tokens=200, user=self.user)
+        self.assertEqual(self.stub.calls, 1)
+
+        # Other users, and requests without a user, have their own allowance
+        other = User.objects.create_user('other', password='x')
+        self.gateway.complete('b' * 400, max_tokens=200, user=other)
+        self.gateway.complete('c' * 400, max_tokens=200)
+        self.assertEqual(self.stub.calls, 3)
+
+    @override_settings(LLM_GLOBAL_DAILY_TOKENS=400)
+    def test_global_budget(self):
+        self.gateway.complete('a' * 400, max_tokens=200, user=self.user)
+        other = User.objects.create_user('other', password='x')
+        with self.assertRaises(llm.BudgetExceeded):
+            self.gateway.complete('b' * 400, max_tokens=200, user=other)
+        with self.assertRaises(llm.BudgetExceeded):
+            self.gateway.complete('b' * 400, max_tokens=200)
+        self.assertEqual(self.stub.calls, 1)
+        self.assertEqual(llm.tokens_used(), llm.tokens_used(self.user))
+
+    @override_settings(LLM_USER_DAILY_TOKENS=400)
+    def test_shared_call_checks_each_users_budget(self):
+        gateway = llm.Gateway(client=llm.StubAnthropic(latency=0.3))
+        gateway.complete('a' * 400, max_tokens=200, user=self.user)
+        other = User.objects.create_user('other', password='x')
+        results = {}
+
+        def ask(user, name):
+            try:
+                results[name] = gateway.complete('b' * 400, max_tokens=200, user=user)
+            except llm.BudgetExceeded as exc:
+                results[name] = exc
+
+        # The user within budget leads; the one over budget must not share its reply
+        leader = threading.Thread(target=ask, args=(other, 'other'))
+        leader.start()
+        time.sleep(0.1)
+        ask(self.user, 'spender')
+        leader.join()
+        self.assertIsInstance(results['spender'], llm.BudgetExceeded)
+        self.assertIsInstance(results['other'], llm.Reply)
+
+        # The user over budget asks first; the other still gets a reply
+        cache.delete(f"{llm.CACHE_PREFIX}:{llm.request_key('StubAnthropic', gateway.model, 200, None, 'b' * 400)}")
+        start = threading.Barrier(2)
+        third = User.objects.create_user('third', password='x')
+
+        def ask_together(user, name):
+            start.wait()
+            ask(user, name)
+
+        threads = [threading.Thread(target=ask_together, args=args) for args in ((self.user, 'spender'), (third, 'third'))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertIsInstance(results['spender'], llm.BudgetExceeded)
+        self.assertIsInstance(results['third'], llm.Reply)
+        self.assertEqual(gateway.client.calls, 3)
+
+    @override_settings(LLM_USER_DAILY_TOKENS=100)
+    def test_search_helper_surfaces_budget(self):
+        helper = AISearchHelper(user=self.user)
+        helper.llm = self.gateway
+        with self.assertRaises(llm.BudgetExceeded):
+            helper.enhance_query('border', 'immigration')
+        with self.assertRaises(llm.BudgetExceeded):
+            helper.curate_results('border', [{'title': 'A', 'source': 'B'}], 'immigration')
+        self.assertEqual(self.stub.calls, 0)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class TimelineTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user('author', password='x')
+        self.follower = User.objects.create_user('follower', password='x')
+        with self.captureOnCommitCallbacks(execute=True):
+            Follow.objects.create(follower=self.follower, following=self.author)
+
+    def stored(self, user):
+        data = cache.get(timeline._key(user.id))
+        return None if data is None else timeline._decode(data)
+
+    def test_card_made_public_is_pushed_and_made_private_is_dropped(self):
+        card = make_card(self.author, title='Draft', visibility='private')
+        self.assertEqual(timeline.card_ids(self.follower, 10), [])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            card.visibility = 'public'
+            card.save()
+        self.assertEqual([card_id for _, card_id in self.stored(self.follower)[1]], [card.id])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            card.visibility = 'private'
+            card.save()
+        self.assertEqual(self.stored(self.follower)[1], [])
+
+    def test_push_keeps_the_expiry(self):
+        timeline.card_ids(self.follower, 10)
+        expires_at, _ = self.stored(self.follower)
+        with self.captureOnCommitCallbacks(execute=True):
+            card = make_card(self.author)
+        self.assertEqual(self.stored(self.follower), (expires_at, [timeline._entry(card.id, card.created_at)]))
+
+    def test_concurrent_pushes_keep_every_entry(self):
+        timeline.card_ids(self.follower, 10)
+        start = threading.Barrier(8)
+
+        def push(number):
+            start.wait()
+            timeline._push({self.follower.id}, (1_000_000 + number, number))
+
+        threads = [threading.Thread(target=push, args=(number,)) for number in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(sorted(card_id for _, card_id in self.stored(self.follower)[1]), list(range(8)))
+
+    def test_follow_change_resets_timeline_after_commit(self):
+        timeline.card_ids(self.follower, 10)
+        other = User.objects.create_user('other', password='x')
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            Follow.objects.create(follower=self.follower, following=other)
+            self.assertIsNotNone(self.stored(self.follower))
+        self.assertTrue(callbacks)
+        self.assertIsNone(self.stored(self.follower))
+
+
+class CardBuilderTests(TestCase):
+    def test_parse_sources_keeps_commas_in_citations(self):
+        self.assertEqual(parse_sources('Smith, J. (2020). Borders, Journal, https://x.org/a, https://y.org/b.'), [
+            {'title': 'Smith, J. (2020). Borders, Journal'},
+            {'title': 'https://x.org/a', 'url': 'https://x.org/a'},
+            {'title': 'https://y.org/b', 'url': 'https://y.org/b'},
+        ])
+        self.assertEqual(parse_sources('https://a.org,https://b.org\nCensus 2020'), [
+            {'title': 'https://a.org', 'url': 'https://a.org'},
+            {'title': 'https://b.org', 'url': 'https://b.org'},
+            {'title': 'Census 2020'},
+        ])
+
+    def test_long_and_malformed_urls_are_kept_as_text(self):
+        long_url = 'https://example.org/' + 'a' * 300
+        self.assertEqual(parse_sources(long_url), [{'title': long_url[:300], 'notes': long_url}])
+        self.assertEqual(parse_sources('https://bad_host'), [{'title': 'https://bad_host', 'notes': 'https://bad_host'}])
+
+        user = User.objects.create_user('builder', password='x')
+        card = Card(
+            user=user, title='Sourced', topic='immigration_policy', scope='federal', stance='Supports',
+            hypothesis='h', conclusion='c',
+        )
+        assemble_card(card, argument_payload('pro', ['Reason'], sources=[parse_sources(f'{long_url}, https://bad_host')]))
+        notes = Source.objects.filter(argument__card=card).values_list('url', 'notes')
+        self.assertEqual(sorted(notes), [('', 'https://bad_host'), ('', long_url)])
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class NearDuplicateWarningTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def post_card(self, username):
+        self.client.force_login(User.objects.create_user(username, password='x'))
+        return self.client.post(reverse('create_card'), {
+            'card_name': 'Expand legal immigration pathways',
+            'topic': 'immigration_policy',
+            'stance': 'Supports',
+            'visibility': 'public',
+            'hypothesis': 'We should expand legal pathways for skilled workers and their families to enter the country',
+            'conclusion': 'Expanding legal immigration pathways would grow the economy and reunite families',
+            'pro_summary[]': ['More workers fill labour shortages in key industries'],
+        })
+
+    def test_warning_is_shown_on_the_new_card(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.post_card('alice')
+        response = self.post_card('bob')
+        detail = response['Location']
+        page = self.client.get(detail)
+        self.assertContains(page, 'similar to &quot;Expand legal immigration pathways&quot; by @alice')
+        self.assertContains(page, 'Argument card created successfully!')
+        # Shown once, and the page without messages is cached as usual
+        self.assertNotContains(self.client.get(detail), 'by @alice')
+        self.assertNotContains(self.client.get(detail), 'by @alice')
+
+    def test_card_and_argument_writes_index_once_per_transaction(self):
+        user = User.objects.create_user('writer', password='x')
+        with mock.patch.object(duplicates, 'index_card') as index_card:
+            with self.captureOnCommitCallbacks(execute=True):
+                card = make_card(user)
+                for number in range(3):
+                    Argument.objects.create(card=card, type='pro', summary=f'Reason {number}')
+                card.save()
+            self.assertEqual(index_card.call_args_list, [mock.call(card.id)])
+
+            # The next transaction indexes its own cards
+            with self.captureOnCommitCallbacks(execute=True):
+                card.save()
+            self.assertEqual(index_card.call_count, 2)
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class RelatedIndexTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.enterContext(override_settings(RELATED_INDEX_DIR=directory.name))
+        user = User.objects.create_user('alice', password='x')
+        self.immigration = [make_card(user, title=f'Expand legal immigration pathways {n}') for n in range(3)]
+        healthcare = {
+            'topic': 'healthcare_reform',
+            'hypothesis': 'A public insurance option would lower hospital premiums for rural patients',
+            'conclusion': 'Offering public insurance lowers premiums and widens hospital coverage',
+        }
+        self.healthcare = [make_card(user, title=f'Create a public insurance option {n}', **healthcare) for n in range(3)]
+        related.refresh(full=True)
+
+    def refresh(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('refresh_related', stdout=io.StringIO())
+
+    def linked(self, card):
+        return {other for _, other in related.neighbors_of(card.id)[0]}
+
+    def test_incremental_refresh_only_touches_changed_links(self):
+        first, second, third = self.immigration
+        stamps = view_cache.versions(*(f'related:{card.id}' for card in self.healthcare))
+        before = view_cache.versions(f'related:{first.id}')
+
+        Card.objects.filter(id=third.id).update(visibility='private', updated_at=timezone.now())
+        self.refresh()
+
+        self.assertIsNone(related.neighbors_of(third.id))
+        self.assertEqual(self.linked(first), {second.id})
+        self.assertNotEqual(view_cache.versions(f'related:{first.id}'), before)
+        self.assertEqual(view_cache.versions(*(f'related:{card.id}' for card in self.healthcare)), stamps)
+
+    def test_changed_card_joins_other_lists(self):
+        moved = self.immigration[0]
+        Card.objects.filter(id=moved.id).update(
+            title='Create a public insurance option', topic='healthcare_reform',
+            hypothesis='A public insurance option would lower hospital premiums for rural patients',
+            conclusion='Offering public insurance lowers premiums and widens hospital coverage',
+            updated_at=timezone.now(),
+        )
+        result = related.refresh()
+
+        self.assertFalse(result['full'])
+        self.assertEqual(result['changed'], 1)
+        self.assertIn(moved.id, self.linked(self.healthcare[0]))
+        self.assertNotIn(moved.id, self.linked(self.immigration[1]))
+        self.assertIn(self.healthcare[0].id, result['updated'])
+
+
+class FactIndexTests(TestCase):
+    TEXTS = {
+        'immigration_policy': [
+            'Border encounters at the southwest border fell 40 percent in 2024',
+            'Asylum applications reached a record 1.2 million last year',
+            'Visa processing backlogs grew to 9 months for skilled workers',
+            'Immigrants founded a quarter of new businesses in 2023',
+        ],
+        'healthcare_reform': [
+            'Hospital premiums rose 7 percent for rural patients in 2024',
+            'A public insurance option would cover 12 million uninsured adults',
+            'Prescription drug prices doubled over the past decade',
+            'Medicaid expansion lowered uninsured rates in 40 states',
+        ],
+    }
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.enterContext(override_settings(FACT_INDEX_PATH=f'{directory.name}/facts.f32'))
+        self.facts = {
+            text: PolicyFact.objects.create(
+                topic=topic, fact_text=text, source_name='Census', source_url='https://census.gov', fact_type='statistic',
+            )
+            for topic, texts in self.TEXTS.items() for text in texts
+        }
+        fact_index.build()
+
+    def best(self, query, **kwargs):
+        hits = fact_index.search(query, **kwargs)
+        return hits[0][1] if hits else None
+
+    def test_finds_closest_fact_within_and_across_topics(self):
+        asylum = self.facts['Asylum applications reached a record 1.2 million last year']
+        self.assertEqual(self.best('asylum applications', topic='immigration_policy'), asylum.id)
+        self.assertEqual(self.best('asylum applications'), asylum.id)
+        healthcare = {fact.id for fact in self.facts.values() if fact.topic == 'healthcare_reform'}
+        self.assertIn(self.best('asylum applications', topic='healthcare_reform'), healthcare)
+
+    def test_scans_only_the_probed_partitions(self):
+        index = fact_index._get_index()
+        first, end = index.topics['immigration_policy']
+        self.assertEqual(end - first, 2)
+        partitions = [set(index.ids[start:stop]) for start, stop in index.partitions[first:end]]
+        hits = {fact_id for _, fact_id in fact_index.search('percent in 2024', topic='immigration_policy', probes=1)}
+        self.assertTrue(any(hits <= partition for partition in partitions))
+        # Probing every partition is an exact search over all topics
+        everywhere = {fact_id for _, fact_id in fact_index.search('percent in 2024', probes=len(index.partitions))}
+        self.assertIn(self.facts['Hospital premiums rose 7 percent for rural patients in 2024'].id, everywhere)
+        self.assertIn(self.facts['Border encounters at the southwest border fell 40 percent in 2024'].id, everywhere)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class FriendGraphTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.alice = User.objects.create_user('alice', password='x')
+        self.bob = User.objects.create_user('bob', password='x')
+
+    def test_follow_drops_cached_ids_after_commit(self):
+        self.assertEqual(friend_graph.following_ids(self.alice.id), frozenset())
+        with self.captureOnCommitCallbacks(execute=True):
+            Follow.objects.create(follower=self.alice, following=self.bob)
+            # A reader before the commit finds the cached IDs still in place
+            self.assertIsNotNone(cache.get(friend_graph._key('following', self.alice.id)))
+        self.assertEqual(friend_graph.following_ids(self.alice.id), {self.bob.id})
+
+    def test_accepted_request_drops_both_users_after_commit(self):
+        self.assertFalse(friend_graph.are_friends(self.alice.id, self.bob.id))
+        self.assertFalse(friend_graph.are_friends(self.bob.id, self.alice.id))
+        with self.captureOnCommitCallbacks(execute=True):
+            FriendRequest.objects.create(from_user=self.alice, to_user=self.bob, status='accepted')
+        self.assertTrue(friend_graph.are_friends(self.alice.id, self.bob.id))
+        self.assertTrue(friend_graph.are_friends(self.bob.id, self.alice.id))
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class EditHistoryTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user('author', password='x')
+        self.card = make_card(self.author)
+        self.client.force_login(self.author)
+
+    def post_edit(self, **changes):
+        data = {
+            'scope': 'federal', 'topic': 'immigration_policy', 'subcategory': '', 'title': self.card.title,
+            'stance': 'Supports', 'hypothesis': self.card.hypothesis, 'conclusion': self.card.conclusion,
+            'visibility': 'public', **changes,
+        }
+        return self.client.post(reverse('edit_card_forms', args=[self.card.id]), data)
+
+    def test_invalid_edit_records_no_version(self):
+        response = self.post_edit(title='')
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(self.card.versions.exists())
+
+    def test_valid_edit_records_before_and_after(self):
+        response = self.post_edit(title='Expand legal immigration pathways now')
+        self.assertRedirects(response, reverse('card_detail', args=[self.card.id]), fetch_redirect_response=False)
+        versions = list(self.card.versions.order_by('version_number'))
+        self.assertEqual([version.version_number for version in versions], [1, 2])
+        self.assertEqual(versioning.state_at(self.card, 1)['title'], 'Expand legal immigration pathways')
+        self.assertEqual(versioning.state_at(self.card, 2)['title'], 'Expand legal immigration pathways now')
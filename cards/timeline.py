@@ -0,0 +1,238 @@
+"""
+Precomputed home timelines for the friends feed
+
+Each active user has a cached timeline: the newest TIMELINE_LENGTH cards from
+the people they follow, stored as a flat int64 array of (timestamp, card id)
+pairs, newest first. Publishing a card pushes it onto the cached timelines of
+the author's followers (fan-out on write). Authors with very many followers
+skip that step; their recent cards are merged in when a feed is read (fan-out
+on read). A card whose visibility changes is pushed to the followers who can
+now see it and dropped from those who no longer can.
+
+Timelines expire TIMELINE_TTL after they were built and are rebuilt on the
+next visit, so inactive users cost nothing. The expiry is stored with the
+entries, and pushes keep it rather than starting a new TTL. Each push,
+retraction, rebuild or reset of a timeline holds a short lease on it
+(cache.add), so concurrent writers can't lose each other's entries.
+
+Entries are only hints: the final in_bulk() goes through the visibility
+engine, so deleted cards and cards made private since drop out at read time.
+"""
+import time
+import uuid
+from array import array
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count
+
+from . import friend_graph, visibility
+from .instrumentation import cache_get
+from .models import Card, Follow
+
+PULL_AUTHORS_KEY = 'timeline:pull_authors'
+PULL_AUTHORS_TIMEOUT = 60 * 10
+# Extra IDs fetched per page to cover stale entries dropped at read time
+FEED_SLACK = 10
+# A writer holds a timeline's lease for at most this long; others wait up to twice that
+LEASE_SECONDS = 5
+LEASE_POLL = 0.01
+
+
+def _key(user_id):
+    return f'timeline:v2:{user_id}'
+
+
+def _encode(expires_at, entries):
+    """The expiry (unix seconds) followed by the (timestamp, card id) pairs"""
+    return array('q', [int(expires_at), *(value for entry in entries for value in entry)]).tobytes()
+
+
+def _decode(data):
+    """(expires_at, entries)"""
+    values = array('q')
+    values.frombytes(data)
+    return values[0], list(zip(values[1::2], values[2::2]))
+
+
+def _acquire(user_id, wait=True):
+    """A lease token for the user's timeline, or None"""
+    token = uuid.uuid4().hex
+    deadline = time.monotonic() + (2 * LEASE_SECONDS if wait else 0)
+    while True:
+        if cache.add(f'{_key(user_id)}:lease', token, LEASE_SECONDS):
+            return token
+        if time.monotonic() >= deadline:
+            return None
+        time.sleep(LEASE_POLL)
+
+
+def _release(user_id, token):
+    lease = f'{_key(user_id)}:lease'
+    if cache.get(lease) == token:
+        cache.delete(lease)
+
+
+def _entry(card_id, created_at):
+    return (int(created_at.timestamp() * 1_000_000), card_id)
+
+
+def pull_author_ids():
+    """Authors whose cards are merged in on read instead of pushed on write"""
+    ids = cache_get(PULL_AUTHORS_KEY)
+    if ids is None:
+        popular = (
+            Follow.objects.values('following_id')
+            .annotate(n=Count('id'))
+            .filter(n__gt=settings.TIMELINE_FANOUT_LIMIT)
+            .values_list('following_id', flat=True)
+        )
+        listed = User.objects.filter(username__in=settings.TIMELINE_PULL_USERNAMES).values_list('id', flat=True)
+        ids = frozenset(popular) | frozenset(listed)
+        cache.set(PULL_AUTHORS_KEY, ids, PULL_AUTHORS_TIMEOUT)
+    return ids
+
+
+def _rebuild(user):
+    """Newest visible cards of the (pushed) authors the user follows"""
+    authors = friend_graph.following_ids(user.id) - pull_author_ids()
+    if not authors:
+        return []
+    rows = visibility.visible_cards(user, Card.objects.filter(user_id__in=authors)).order_by('-created_at')
+    return [_entry(card_id, created_at) for card_id, created_at in rows.values_list('id', 'created_at')[:settings.TIMELINE_LENGTH]]
+
+
+def _stored_timeline(user):
+    data = cache_get(_key(user.id))
+    if data is not None:
+        return _decode(data)[1]
+    # Rebuild under the lease so a push can't land between the query and the store;
+    # while another writer holds it, serve the rebuilt entries without storing them
+    token = _acquire(user.id, wait=False)
+    try:
+        entries = _rebuild(user)
+        if token:
+            cache.add(_key(user.id), _encode(time.time() + settings.TIMELINE_TTL, entries), settings.TIMELINE_TTL)
+    finally:
+        if token:
+            _release(user.id, token)
+    return entries
+
+
+def _pulled(user, limit):
+    """Newest visible cards from followed pull authors"""
+    authors = friend_graph.following_ids(user.id) & pull_author_ids()
+    if not authors:
+        return []
+    rows = visibility.visible_cards(user, Card.objects.filter(user_id__in=authors)).order_by('-created_at')
+    return [_entry(card_id, created_at) for card_id, created_at in rows.values_list('id', 'created_at')[:limit]]
+
+
+def card_ids(user, limit, offset=0):
+    """Card IDs for one page of the user's feed, newest first"""
+    wanted = offset + limit
+    entries = _stored_timeline(user)[:wanted] + _pulled(user, wanted)
+    seen = set()
+    ids = []
+    for _, card_id in sorted(entries, reverse=True):
+        if card_id not in seen:
+            seen.add(card_id)
+            ids.append(card_id)
+    return ids[offset:wanted]
+
+
+def feed(user, limit=20, offset=0):
+    """One page of the feed as list-ready cards: a bounded ID fetch plus one in_bulk"""
+    ids = card_ids(user, offset + limit + FEED_SLACK)
+    cards = visibility.listing(user).in_bulk(ids)
+    return [cards[card_id] for card_id in ids if card_id in cards][offset:offset + limit]
+
+
+def _followers(card, card_visibility=None):
+    """Followers whose timelines the card belongs on (at card_visibility, default its own)"""
+    card_visibility = card_visibility or card.visibility
+    if card_visibility == 'private' or card.user_id in pull_author_ids():
+        return set()
+    followers = set(Follow.objects.filter(following_id=card.user_id).values_list('follower_id', flat=True))
+    if card_visibility == 'friends':
+        followers &= friend_graph.friend_ids(card.user_id)
+    return followers
+
+
+def _update(user_id, change):
+    """
+    Apply change(entries) to the user's timeline if it is cached, under its
+    lease and keeping its expiry
+    """
+    token = _acquire(user_id)
+    if token is None:
+        # The holder has outlived its lease; drop the timeline so the next visit rebuilds it
+        cache.delete(_key(user_id))
+        return
+    try:
+        data = cache.get(_key(user_id))
+        if data is None:
+            return
+        expires_at, entries = _decode(data)
+        remaining = expires_at - time.time()
+        if remaining < 1:
+            return
+        change(entries)
+        cache.set(_key(user_id), _encode(expires_at, entries[:settings.TIMELINE_LENGTH]), remaining)
+    finally:
+        _release(user_id, token)
+
+
+def _live(user_ids):
+    """Those of the users whose timelines are cached; the rest rebuild on their next visit"""
+    keys = {_key(user_id): user_id for user_id in user_ids}
+    return [keys[key] for key in cache.get_many(list(keys))]
+
+
+def _push(user_ids, entry):
+    def add(entries):
+        if entry not in entries:
+            entries.append(entry)
+            entries.sort(reverse=True)
+    for user_id in _live(user_ids):
+        _update(user_id, add)
+
+
+def _drop(user_ids, entry):
+    def remove(entries):
+        if entry in entries:
+            entries.remove(entry)
+    for user_id in _live(user_ids):
+        _update(user_id, remove)
+
+
+def publish(card):
+    """Push a new card onto the cached timelines of followers who may see it"""
+    _push(_followers(card), _entry(card.id, card.created_at))
+
+
+def republish(card, old_visibility):
+    """Move a card whose visibility changed: onto timelines that may now see it, off the rest"""
+    before = _followers(card, old_visibility)
+    after = _followers(card)
+    entry = _entry(card.id, card.created_at)
+    _push(after - before, entry)
+    _drop(before - after, entry)
+
+
+def retract(card):
+    """Drop a deleted card from the cached timelines it was pushed to"""
+    _drop(_followers(card), _entry(card.id, card.created_at))
+
+
+def invalidate(*user_ids):
+    """Drop the users' timelines (their follows or friendships changed) once the change commits"""
+    def reset():
+        for user_id in user_ids:
+            token = _acquire(user_id)
+            cache.delete(_key(user_id))
+            if token:
+                _release(user_id, token)
+    transaction.on_commit(reset)
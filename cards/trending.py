@@ -1,72 +1,129 @@
+"""
+Trending political headlines from NewsAPI
+
+The cache holds the last good headlines with the time they were fetched, and
+keeps them for TRENDING_STALE_TTL. Once they are older than
+TRENDING_REFRESH_AFTER, the first request to notice takes a short lease
+(cache.add) and refreshes them on a background thread; every other request,
+including that one, keeps serving the stale copy. A failed refresh leaves the
+lease to expire, so NewsAPI is retried at most once per lease period.
+
+Mock topics are only served on a cold cache, i.e. before the first
+successful fetch (see the prewarm_trending command) or without an API key.
+"""
+import logging
+import threading
+import time
+import uuid
+
 from newsapi import NewsApiClient
 from django.conf import settings
 from django.core.cache import cache
-import logging
+from .instrumentation import cache_get
 
 logger = logging.getLogger(__name__)
 
+CACHE_KEY = 'trending_topics'
+LEASE_KEY = 'trending_topics:lease'
 
-def get_trending_topics():
-    """
-    Get trending political topics from NewsAPI
-    Caches results for 1 hour to avoid hitting rate limits
-    """
-    # Check cache first
-    cached_topics = cache.get('trending_topics')
-    if cached_topics:
-        return cached_topics
+
+def fetch_trending_topics():
+    """Call NewsAPI and return up to five headline dicts; raises on failure"""
+    newsapi = NewsApiClient(api_key=settings.NEWSAPI_KEY)
     
-    # If no API key, return mock data
-    if not settings.NEWSAPI_KEY:
-        return get_mock_trending_topics()
+    # Get top headlines for US politics
+    headlines = newsapi.get_top_headlines(
+        country='us',
+        category='politics',
+        page_size=10
+    )
+    if headlines['status'] != 'ok':
+        raise RuntimeError(f"NewsAPI returned status {headlines['status']!r}")
     
-    try:
-        newsapi = NewsApiClient(api_key=settings.NEWSAPI_KEY)
+    topics = []
+    seen_titles = set()
+    
+    for article in headlines['articles']:
+        title = article.get('title', '')
+        description = article.get('description', '')
+        url = article.get('url', '')
+        source = article.get('source', {}).get('name', 'Unknown')
         
-        # Get top headlines for US politics
-        headlines = newsapi.get_top_headlines(
-            country='us',
-            category='politics',
-            page_size=10
-        )
+        # Skip duplicates and articles without titles
+        if not title or title in seen_titles:
+            continue
         
-        if headlines['status'] == 'ok' and headlines['articles']:
-            topics = []
-            seen_titles = set()
-            
-            for article in headlines['articles']:
-                title = article.get('title', '')
-                description = article.get('description', '')
-                url = article.get('url', '')
-                source = article.get('source', {}).get('name', 'Unknown')
-                
-                # Skip duplicates and articles without titles
-                if not title or title in seen_titles:
-                    continue
-                
-                seen_titles.add(title)
-                
-                # Extract key topic (simplified - you could use NLP here)
-                topic = {
-                    'title': title,
-                    'description': description[:150] + '...' if description and len(description) > 150 else description,
-                    'source': source,
-                    'url': url,
-                }
-                
-                topics.append(topic)
-                
-                if len(topics) >= 5:
-                    break
-            
-            # Cache for 1 hour
-            cache.set('trending_topics', topics, 3600)
-            return topics
+        seen_titles.add(title)
         
+        # Extract key topic (simplified - you could use NLP here)
+        topics.append({
+            'title': title,
+            'description': description[:150] + '...' if description and len(description) > 150 else description,
+            'source': source,
+            'url': url,
+        })
+        
+        if len(topics) >= 5:
+            break
+    
+    if not topics:
+        raise RuntimeError('NewsAPI returned no usable headlines')
+    return topics
+
+
+def refresh_trending_topics():
+    """Fetch and store fresh headlines; returns them, or raises if the fetch failed"""
+    topics = fetch_trending_topics()
+    cache.set(CACHE_KEY, {'topics': topics, 'fetched_at': time.time()}, settings.TRENDING_STALE_TTL)
+    return topics
+
+
+def _acquire_lease():
+    token = uuid.uuid4().hex
+    return token if cache.add(LEASE_KEY, token, settings.TRENDING_LEASE_SECONDS) else None
+
+
+def _release_lease(token):
+    if cache.get(LEASE_KEY) == token:
+        cache.delete(LEASE_KEY)
+
+
+def _refresh_under_lease(token):
+    try:
+        refresh_trending_topics()
     except Exception as e:
-        logger.error(f"Error fetching trending topics: {e}")
+        # Keep the lease until it expires so a failing API is not retried by every request
+        logger.error(f"Error refreshing trending topics: {e}")
+    else:
+        _release_lease(token)
+
+
+def get_trending_topics():
+    """
+    Get trending political topics from NewsAPI
+    Serves the cached headlines and refreshes them ahead of expiry, one worker at a time
+    """
+    cached = cache_get(CACHE_KEY)
+    if cached is not None:
+        stale = time.time() - cached['fetched_at'] > settings.TRENDING_REFRESH_AFTER
+        if stale and settings.NEWSAPI_KEY:
+            token = _acquire_lease()
+            if token:
+                threading.Thread(target=_refresh_under_lease, args=(token,), daemon=True).start()
+        return cached['topics']
+    
+    # Cold start: one worker fetches inline, the rest get mock data meanwhile
+    if settings.NEWSAPI_KEY:
+        token = _acquire_lease()
+        if token:
+            try:
+                topics = refresh_trending_topics()
+            except Exception as e:
+                logger.error(f"Error fetching trending topics: {e}")
+            else:
+                _release_lease(token)
+                return topics
     
-    # Fallback to mock data if API fails
     return get_mock_trending_topics()
 
 
@@ -77,6 +77,7 @@ urlpatterns = [
     path('settings/', views.user_settings, name='user_settings'),
     path('notebook/', views.notebook, name='notebook'),
     path('notebook/quick-save/', views.notebook_quick_save_api, name='notebook_quick_save_api'),
+    path('notebook/tags/autocomplete/', views.notebook_tag_autocomplete, name='notebook_tag_autocomplete'),
     path('quick-save/', views.quick_save, name='quick_save'),
     path('notebook/add/', views.add_notebook_entry, name='add_notebook_entry'),
     path('notebook/<int:entry_id>/delete/', views.delete_notebook_entry, name='delete_notebook_entry'),
@@ -107,4 +108,5 @@ urlpatterns = [
     path('api/message-count/', views.get_unread_message_count, name='message_count'),
     path('api/friend-request-count/', views.get_friend_request_count, name='friend_request_count'),
     path('api/search-friends/', views.search_friends, name='search_friends'),
+    path('metrics/', views.metrics, name='metrics'),
 ]
@@ -0,0 +1,248 @@
+"""
+Card version history as deltas with snapshot checkpoints
+
+A card's content (its own fields plus every argument and source) is captured
+as a flat {path: value} state, e.g. "title", "arguments.12.summary",
+"sources.40.url". Each CardVersion stores either the full state (a snapshot)
+or a delta from the version before it: changed values, word-level patches
+for edited text, and removed paths. Every SNAPSHOT_EVERY-th version is a
+snapshot, so rebuilding any version reads one snapshot and at most
+SNAPSHOT_EVERY - 1 deltas.
+
+Views call record() before and after an edit. The first call on a card with
+no history stores its current content as a snapshot; later calls add a
+version only when something changed.
+"""
+import json
+import re
+from difflib import SequenceMatcher
+
+from django.db import transaction
+
+from .models import Argument, Card, CardVersion, Source
+
+SNAPSHOT_EVERY = 10
+
+CARD_FIELDS = ('title', 'stance', 'hypothesis', 'conclusion', 'scope', 'topic', 'subcategory', 'visibility')
+ARGUMENT_FIELDS = ('type', 'summary', 'detail', 'order')
+SOURCE_FIELDS = ('argument', 'title', 'url', 'author', 'publication_date', 'notes')
+
+# Whitespace runs and words, so patches land on word boundaries
+_TOKENS = re.compile(r'\s+|\S+')
+
+
+def capture(card):
+    """The card's current content, read from the database, as a flat state"""
+    state = Card.objects.filter(pk=card.pk).values(*CARD_FIELDS).get()
+    for argument in Argument.objects.filter(card_id=card.pk).values('id', *ARGUMENT_FIELDS):
+        argument_id = argument.pop('id')
+        state.update({f'arguments.{argument_id}.{field}': value for field, value in argument.items()})
+    sources = Source.objects.filter(argument__card_id=card.pk).values('id', 'argument_id', *SOURCE_FIELDS[1:])
+    for source in sources:
+        source_id = source.pop('id')
+        source['argument'] = source.pop('argument_id')
+        if source['publication_date'] is not None:
+            source['publication_date'] = source['publication_date'].isoformat()
+        state.update({f'sources.{source_id}.{field}': value for field, value in source.items()})
+    return state
+
+
+def _entity(path):
+    """"arguments.12" for "arguments.12.summary"; None for card fields"""
+    parts = path.split('.')
+    return '.'.join(parts[:2]) if len(parts) == 3 else None
+
+
+def _spans(old, new):
+    """Non-equal word opcodes between two strings, in character offsets"""
+    a, b = _TOKENS.findall(old), _TOKENS.findall(new)
+    a_at, b_at = [0], [0]
+    for token in a:
+        a_at.append(a_at[-1] + len(token))
+    for token in b:
+        b_at.append(b_at[-1] + len(token))
+    for tag, i1, i2, j1, j2 in SequenceMatcher(None, a, b, autojunk=False).get_opcodes():
+        yield tag, a_at[i1], a_at[i2], b_at[j1], b_at[j2]
+
+
+def text_patch(old, new):
+    """[[start, end, replacement], ...] turning old into new"""
+    return [[i1, i2, new[j1:j2]] for tag, i1, i2, j1, j2 in _spans(old, new) if tag != 'equal']
+
+
+def apply_text_patch(text, patch):
+    for start, end, replacement in reversed(patch):
+        text = text[:start] + replacement + text[end:]
+    return text
+
+
+def diff(old, new):
+    """Delta turning state old into state new ({} when they're equal)"""
+    delta = {}
+    for path, value in new.items():
+        before = old.get(path)
+        if path in old and before == value:
+            continue
+        if isinstance(before, str) and isinstance(value, str):
+            patch = text_patch(before, value)
+            if len(json.dumps(patch)) < len(json.dumps(value)):
+                delta.setdefault('patch', {})[path] = patch
+                continue
+        delta.setdefault('set', {})[path] = value
+
+    removed = [path for path in old if path not in new]
+    if removed:
+        # A wholly deleted argument or source is recorded once, by its prefix
+        remaining = {_entity(path) for path in new}
+        gone = sorted({_entity(path) for path in removed if _entity(path) and _entity(path) not in remaining})
+        delta['del'] = gone + [path for path in removed if _entity(path) not in gone]
+    return delta
+
+
+def apply(state, delta):
+    state = dict(state)
+    for path in delta.get('del', ()):
+        if path in state:
+            del state[path]
+        else:
+            prefix = path + '.'
+            for key in [key for key in state if key.startswith(prefix)]:
+                del state[key]
+    for path, patch in delta.get('patch', {}).items():
+        state[path] = apply_text_patch(state[path], patch)
+    state.update(delta.get('set', {}))
+    return state
+
+
+def state_at(card, number):
+    """Content of version `number`: the nearest snapshot plus the deltas after it"""
+    base = (
+        card.versions.filter(version_number__lte=number, snapshot__isnull=False)
+        .order_by('-version_number')
+        .values_list('version_number', flat=True)
+        .first()
+    )
+    if base is None:
+        raise CardVersion.DoesNotExist(f'Card {card.pk} has no version {number}')
+    state = None
+    rows = card.versions.filter(version_number__gte=base, version_number__lte=number).order_by('version_number')
+    for snapshot, delta in rows.values_list('snapshot', 'delta'):
+        state = snapshot if snapshot is not None else apply(state, delta)
+    return state
+
+
+def _label(state, entity):
+    kind, _ = entity.split('.')
+    if kind == 'arguments':
+        return f"{state.get(entity + '.type', '')} argument".strip()
+    return 'source'
+
+
+def describe(old, new):
+    """Short change summary, e.g. "Edited title, conclusion; added pro argument" """
+    edited = [field for field in CARD_FIELDS if old.get(field) != new.get(field)]
+    old_entities = {_entity(path) for path in old} - {None}
+    new_entities = {_entity(path) for path in new} - {None}
+    parts = []
+    if edited:
+        parts.append('Edited ' + ', '.join(field.replace('_', ' ') for field in edited))
+    for verb, entities, state in (
+        ('added', new_entities - old_entities, new),
+        ('removed', old_entities - new_entities, old),
+    ):
+        parts.extend(f'{verb} {_label(state, entity)}' for entity in sorted(entities))
+    changed = {
+        _entity(path) for path in new
+        if _entity(path) in old_entities and old.get(path) != new[path]
+    }
+    parts.extend(f'edited {_label(new, entity)}' for entity in sorted(changed))
+    summary = '; '.join(parts)
+    summary = summary[:1].upper() + summary[1:]
+    return summary if len(summary) <= 200 else summary[:197] + '...'
+
+
+def record(card, user, summary=''):
+    """
+    Add a version if the card's content differs from its latest version.
+    Returns the new CardVersion, or None when nothing changed.
+    """
+    with transaction.atomic():
+        # Concurrent edits of one card take turns, so each numbers its version after the other's
+        Card.objects.select_for_update().filter(pk=card.pk).values_list('pk', flat=True).get()
+        current = capture(card)
+        last = card.versions.order_by('-version_number').values_list('version_number', flat=True).first()
+        if last is None:
+            return CardVersion.objects.create(
+                card=card, user=user, version_number=1, snapshot=current,
+                change_summary=summary or 'Earliest tracked version',
+            )
+
+        previous = state_at(card, last)
+        delta = diff(previous, current)
+        if not delta:
+            return None
+        number = last + 1
+        version = CardVersion(
+            card=card, user=user, version_number=number,
+            change_summary=summary or describe(previous, current),
+        )
+        # Also snapshot when the delta would be no smaller than the content itself
+        if (number - 1) % SNAPSHOT_EVERY == 0 or len(json.dumps(delta)) >= len(json.dumps(current)):
+            version.snapshot = current
+        else:
+            version.delta = delta
+        version.save()
+        return version
+
+
+def word_diff(old, new):
+    """[(op, text)] segments with op "same", "del" or "ins", for display"""
+    old, new = old or '', new or ''
+    segments = []
+    for tag, i1, i2, j1, j2 in _spans(old, new):
+        if tag == 'equal':
+            segments.append(('same', old[i1:i2]))
+            continue
+        if i2 > i1:
+            segments.append(('del', old[i1:i2]))
+        if j2 > j1:
+            segments.append(('ins', new[j1:j2]))
+    return segments
+
+
+def changes(old, new):
+    """What changed between two states, as display rows for card_history"""
+    rows = []
+    for field in CARD_FIELDS:
+        if old.get(field) != new.get(field):
+            rows.append({'kind': 'edited', 'label': field.replace('_', ' ').capitalize(),
+                         'segments': word_diff(str(old.get(field) or ''), str(new.get(field) or ''))})
+
+    old_entities = {_entity(path) for path in old} - {None}
+    new_entities = {_entity(path) for path in new} - {None}
+    for entity in sorted(old_entities | new_entities, key=lambda e: (e.split('.')[0], int(e.split('.')[1]))):
+        text_field = '.summary' if entity.startswith('arguments.') else '.title'
+        if entity not in old_entities:
+            rows.append({'kind': 'added', 'label': _label(new, entity).capitalize(), 'text': new.get(entity + text_field, '')})
+        elif entity not in new_entities:
+            rows.append({'kind': 'removed', 'label': _label(old, entity).capitalize(), 'text': old.get(entity + text_field, '')})
+        else:
+            fields = ARGUMENT_FIELDS if entity.startswith('arguments.') else SOURCE_FIELDS
+            for field in fields:
+                path = f'{entity}.{field}'
+                if old.get(path) != new.get(path) and field != 'argument':
+                    rows.append({'kind': 'edited', 'label': f'{_label(new, entity).capitalize()} {field.replace("_", " ")}',
+                                 'segments': word_diff(str(old.get(path) or ''), str(new.get(path) or ''))})
+    return rows
+
+
+def history(card):
+    """[{version, changes}] newest first, each compared with the version before it"""
+    entries = []
+    state = None
+    for version in card.versions.select_related('user').order_by('version_number'):
+        current = version.snapshot if version.snapshot is not None else apply(state, version.delta)
+        entries.append({'version': version, 'changes': changes(state, current) if state is not None else []})
+        state = current
+    entries.reverse()
+    return entries
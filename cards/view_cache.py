@@ -0,0 +1,176 @@
+"""
+Per-viewer page cache with version stamps
+
+cache_per_viewer() caches a GET view's rendered page under a key built from
+the path, the viewer (anonymous or user id, plus their CSRF cookie so embedded
+form tokens stay valid) and a set of version stamps. Writes never delete
+cached pages; they bump the stamps the pages depend on, so the next request
+builds a new key and the old entries age out.
+
+conditional() derives ETag and Last-Modified from the same stamps, so
+conditional GETs are answered without rendering.
+
+Both render the view with @primary_reads: a stamp is bumped as soon as its
+write commits, and a page read from a lagging replica would otherwise be
+stored (or given an ETag) under the new stamp while showing the old content.
+For a page that shows flash messages (shows_messages=True), neither applies
+while the viewer has messages queued, such as the near-duplicate warning
+after creating a card: the page is rendered, showing and consuming them, and
+isn't cached.
+
+Stamps in use (bumped from signals.py):
+    cards              - any card, argument, source or save changed (list pages)
+    card:<id>          - that card or its arguments or sources changed; also
+                         keys card_detail's cached argument fragment
+    viewer:<id>        - the user's follows, friendships, saves or settings changed
+    follows            - any follow changed (explore leaderboards)
+    notifications:<id> - the user's notifications changed
+    messages:<id>      - direct messages to the user changed
+    friend_requests:<id> - friend requests to the user changed
+    related:<id>       - refresh_related changed that card's related or
+                         opposing links
+"""
+import hashlib
+import time
+from datetime import datetime, timezone as dt_timezone
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.http import HttpResponse
+from django.middleware.csrf import get_token
+from django.views.decorators.http import condition
+
+from debrief.routers import primary_reads
+
+from .instrumentation import cache_get
+
+
+def _stamp_key(name):
+    return f'version:{name}'
+
+
+def versions(*names):
+    """Current stamp for each name, starting a fresh one for names never seen"""
+    keys = [_stamp_key(name) for name in names]
+    found = cache.get_many(keys)
+    for key in keys:
+        if key not in found:
+            # A fresh value (never 0) so an evicted stamp can't revive old pages
+            cache.add(key, time.time_ns(), None)
+            found[key] = cache.get(key)
+    return tuple(found[key] for key in keys)
+
+
+def bump(*names):
+    """
+    Invalidate every cached page that depends on any of these stamps. Runs
+    once the current transaction commits, so a concurrent request can't cache
+    the old content under the new stamp.
+    """
+    keys = [_stamp_key(name) for name in names]
+    transaction.on_commit(lambda: cache.set_many({key: time.time_ns() for key in keys}, None))
+
+
+def _viewer(request):
+    csrf = request.COOKIES.get(settings.CSRF_COOKIE_NAME, '')
+    if request.user.is_authenticated:
+        return f'user:{request.user.id}:{csrf}', [f'viewer:{request.user.id}']
+    return f'anon:{csrf}', []
+
+
+def _cacheable(request, response):
+    if response.status_code != 200 or response.streaming or response.cookies:
+        return False
+    # A page whose form token comes from a CSRF secret minted for this response
+    # (the client sent none, or a stale one) must not be shared with later requests
+    if request.META.get('CSRF_COOKIE_NEEDS_UPDATE'):
+        return request.META.get('CSRF_COOKIE') == request.COOKIES.get(settings.CSRF_COOKIE_NAME)
+    return True
+
+
+def _has_messages(request):
+    """Whether flash messages are waiting to be shown (checked without consuming them)"""
+    storage = getattr(request, '_messages', None)
+    return storage is not None and len(storage) > 0
+
+
+def _page_state(request, depends_on, args, kwargs):
+    """(viewer key, stamp values) for a request, read once per request"""
+    viewer, viewer_stamps = _viewer(request)
+    names = tuple(depends_on(request, *args, **kwargs)) + tuple(viewer_stamps)
+    memo = request.__dict__.setdefault('_page_stamps', {})
+    if names not in memo:
+        memo[names] = versions(*names)
+    return viewer, memo[names]
+
+
+def list_stamps(request, *args, **kwargs):
+    """Default dependency: any card list"""
+    return ['cards']
+
+
+def cache_per_viewer(depends_on=list_stamps, timeout=None, shows_messages=False):
+    """
+    Cache a view's 200 responses per viewer. depends_on(request, *args,
+    **kwargs) names the version stamps the page reads; shows_messages
+    bypasses the cache while flash messages are queued.
+    """
+    def decorator(view):
+        render = primary_reads(view)
+
+        @wraps(view)
+        def wrapped(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return view(request, *args, **kwargs)
+            if shows_messages and _has_messages(request):
+                return render(request, *args, **kwargs)
+
+            viewer, stamps = _page_state(request, depends_on, args, kwargs)
+            raw = '|'.join([view.__module__, view.__qualname__, request.get_full_path(), viewer, repr(stamps)])
+            key = f'page:{view.__name__}:{hashlib.sha1(raw.encode()).hexdigest()}'
+
+            cached = cache_get(key)
+            if cached is not None:
+                content, content_type, uses_csrf = cached
+                if uses_csrf:
+                    # Renew the CSRF cookie as rendering the form would have
+                    get_token(request)
+                return HttpResponse(content, content_type=content_type)
+
+            response = render(request, *args, **kwargs)
+            if _cacheable(request, response):
+                uses_csrf = bool(request.META.get('CSRF_COOKIE_NEEDS_UPDATE'))
+                cache.set(key, (response.content, response['Content-Type'], uses_csrf),
+                          settings.VIEW_CACHE_TIMEOUT if timeout is None else timeout)
+            return response
+        return wrapped
+    return decorator
+
+
+def conditional(depends_on=list_stamps, shows_messages=False):
+    """
+    condition() whose ETag and Last-Modified come from the same stamps, so an
+    unchanged page or count answers 304 without the view running at all.
+    Last-Modified is the newest stamp: the last write the page depends on.
+    With shows_messages, queued flash messages skip both.
+    """
+    def etag(request, *args, **kwargs):
+        if shows_messages and _has_messages(request):
+            return None
+        viewer, stamps = _page_state(request, depends_on, args, kwargs)
+        raw = '|'.join([request.get_full_path(), viewer, repr(stamps)])
+        return hashlib.sha1(raw.encode()).hexdigest()
+
+    def last_modified(request, *args, **kwargs):
+        if shows_messages and _has_messages(request):
+            return None
+        _, stamps = _page_state(request, depends_on, args, kwargs)
+        if not stamps:
+            return None
+        return datetime.fromtimestamp(max(stamps) / 1_000_000_000, tz=dt_timezone.utc)
+
+    def decorator(view):
+        return condition(etag_func=etag, last_modified_func=last_modified)(primary_reads(view))
+    return decorator
@@ -8,41 +8,51 @@ from django.contrib.auth.models import User
 from django.contrib import messages
 from .models import Conversation, Card, Argument, Source, Follow, Notification, SavedCard, UserSettings, DirectMessage, FriendRequest, NotebookEntry, NotebookNote, TopicSurvey, SurveyQuestion, QuestionOption, PolicyFact, FactSource
 from .forms import CardForm, ArgumentForm, SourceForm, ArgumentFormSet
+from .card_builder import argument_payload, assemble_card, parse_sources, url_source
+from . import duplicates, fact_index, friend_graph, related, rollups, survey_cache, tagging, timeline, versioning, view_cache, visibility
+from .view_cache import cache_per_viewer, conditional
+from debrief.routers import replica_reads
+from django.core.exceptions import ValidationError
 from datetime import timedelta
 from django.utils import timezone
 
 
+@cache_per_viewer()
 def index(request):
     """Homepage showing public cards"""
-    cards = Card.objects.filter(visibility='public').order_by('-created_at')[:10]
+    cards = visibility.listing(request.user).order_by('-created_at')[:10]
     return render(request, 'cards/index.html', {'cards': cards})
 
 
+def _card_stamps(request, card_id):
+    return [f'card:{card_id}', f'related:{card_id}']
+
+
+def _profile_stamps(request, username):
+    profile_id = User.objects.filter(username=username).values_list('id', flat=True).first()
+    return ['cards', 'follows', f'viewer:{profile_id}']
+
+
+@conditional(_card_stamps, shows_messages=True)
+@cache_per_viewer(_card_stamps, shows_messages=True)
 def card_detail(request, card_id):
     """Detail view for a single card"""
-    card = get_object_or_404(Card, id=card_id)
+    card = get_object_or_404(Card.objects.select_related('user'), id=card_id)
     
     # Check permissions for private/friends cards
-    if card.visibility == 'private' and card.user != request.user:
-        messages.error(request, "This card is private.")
-        return redirect('index')
-    
-    if card.visibility == 'friends':
+    if not visibility.can_view(request.user, card):
+        if card.visibility == 'private':
+            messages.error(request, "This card is private.")
+            return redirect('index')
         if not request.user.is_authenticated:
             messages.error(request, "You must be logged in to view this card.")
             return redirect('account_login')
-        
-        is_following = Follow.objects.filter(
-            follower=request.user,
-            following=card.user
-        ).exists()
-        
-        if not is_following and card.user != request.user:
-            messages.error(request, "This card is only visible to friends.")
-            return redirect('index')
+        messages.error(request, "This card is only visible to friends.")
+        return redirect('index')
     
-    pros = card.arguments.filter(type='pro')
-    cons = card.arguments.filter(type='con')
+    # Lazy: only evaluated when the cached argument fragment has to be rebuilt
+    pros = card.arguments.filter(type='pro').prefetch_related('sources')
+    cons = card.arguments.filter(type='con').prefetch_related('sources')
     
     # Check if current user has saved this card
     is_saved = False
@@ -51,70 +61,68 @@ def card_detail(request, card_id):
     
     return render(request, 'cards/card_detail.html', {
         'card': card,
+        'card_version': view_cache.versions(f'card:{card.id}')[0],
         'pros': pros,
         'cons': cons,
         'is_saved': is_saved,
+        'recommendations': related.for_card(card),
     })
 
 
+def _warn_near_duplicates(request, card):
+    """Point the author at an existing card the new one nearly repeats"""
+    for other in duplicates.similar_cards(request.user, duplicates.card_text(card.id), exclude=card.id, limit=1):
+        messages.warning(
+            request,
+            f'This card is {other.similarity:.0%} similar to "{other.title}" by @{other.user.username}.',
+        )
+
+
 @login_required
 def create_card(request):
     """Create a new card with enhanced argument structure"""
     if request.method == 'POST':
-        # Create the card
-        card = Card.objects.create(
+        card = Card(
             user=request.user,
             scope=request.POST.get('scope', 'federal'),
-            topic=request.POST['topic'],
+            topic=request.POST.get('topic', ''),
             subcategory=request.POST.get('subcategory', ''),
-            title=request.POST['card_name'],
+            title=request.POST.get('card_name', ''),
             stance=request.POST.get('stance', 'Analyzing'),
-            hypothesis=request.POST['hypothesis'],
-            conclusion=request.POST['conclusion'],
+            hypothesis=request.POST.get('hypothesis', ''),
+            conclusion=request.POST.get('conclusion', ''),
             visibility=request.POST.get('visibility', 'private')
         )
         
-        # Add pros with enhanced structure
-        pro_names = request.POST.getlist('pro_name[]')
-        pro_summaries = request.POST.getlist('pro_summary[]')
-        pro_sources = request.POST.getlist('pro_sources[]')
-        
-        for i, summary in enumerate(pro_summaries):
-            if summary.strip():
-                name = pro_names[i] if i < len(pro_names) else 'Supporting Point'
-                sources = pro_sources[i] if i < len(pro_sources) else ''
-                
-                full_summary = f"{name}: {summary}" if name else summary
-                
-                Argument.objects.create(
-                    card=card,
-                    type='pro',
-                    summary=full_summary,
-                    detail=f"Sources: {sources}" if sources else "",
-                    order=i
-                )
-        
-        # Add cons with enhanced structure
-        con_names = request.POST.getlist('con_name[]')
-        con_summaries = request.POST.getlist('con_summary[]')
-        con_sources = request.POST.getlist('con_sources[]')
+        # Pros and cons with enhanced structure: "Name: summary" plus parsed sources
+        arguments = []
+        for arg_type, default_name in [('pro', 'Supporting Point'), ('con', 'Opposing Point')]:
+            names = request.POST.getlist(f'{arg_type}_name[]')
+            summaries = request.POST.getlist(f'{arg_type}_summary[]')
+            sources = request.POST.getlist(f'{arg_type}_sources[]')
+            
+            full_summaries = []
+            for i, summary in enumerate(summaries):
+                name = names[i] if i < len(names) else default_name
+                full_summaries.append(f"{name}: {summary}" if name and summary.strip() else summary)
+            
+            arguments += argument_payload(
+                arg_type,
+                full_summaries,
+                sources=[parse_sources(text) for text in sources],
+            )
         
-        for i, summary in enumerate(con_summaries):
-            if summary.strip():
-                name = con_names[i] if i < len(con_names) else 'Opposing Point'
-                sources = con_sources[i] if i < len(con_sources) else ''
-                
-                full_summary = f"{name}: {summary}" if name else summary
-                
-                Argument.objects.create(
-                    card=card,
-                    type='con',
-                    summary=full_summary,
-                    detail=f"Sources: {sources}" if sources else "",
-                    order=i
-                )
+        try:
+            assemble_card(card, arguments)
+        except ValidationError as e:
+            for error in e.messages:
+                messages.error(request, error)
+            return render(request, 'cards/create_card.html', {
+                'topics': Card.TOPIC_CHOICES
+            })
         
         messages.success(request, 'Argument card created successfully!')
+        _warn_near_duplicates(request, card)
         
         # Send email notifications to friends if card is public
         if card.visibility == 'public':
@@ -140,36 +148,21 @@ def create_card_with_forms(request):
         if form.is_valid():
             card = form.save(commit=False)
             card.user = request.user
-            card.save()
-            
-            # Add pros
-            pro_summaries = request.POST.getlist('pro_summary[]')
-            pro_details = request.POST.getlist('pro_detail[]')
-            for i, summary in enumerate(pro_summaries):
-                if summary.strip():
-                    Argument.objects.create(
-                        card=card,
-                        type='pro',
-                        summary=summary,
-                        detail=pro_details[i] if i < len(pro_details) else '',
-                        order=i
-                    )
             
-            # Add cons
-            con_summaries = request.POST.getlist('con_summary[]')
-            con_details = request.POST.getlist('con_detail[]')
-            for i, summary in enumerate(con_summaries):
-                if summary.strip():
-                    Argument.objects.create(
-                        card=card,
-                        type='con',
-                        summary=summary,
-                        detail=con_details[i] if i < len(con_details) else '',
-                        order=i
-                    )
+            arguments = (
+                argument_payload('pro', request.POST.getlist('pro_summary[]'), request.POST.getlist('pro_detail[]')) +
+                argument_payload('con', request.POST.getlist('con_summary[]'), request.POST.getlist('con_detail[]'))
+            )
             
-            messages.success(request, 'Card created successfully!')
-            return redirect('card_detail', card_id=card.id)
+            try:
+                assemble_card(card, arguments)
+            except ValidationError as e:
+                for error in e.messages:
+                    messages.error(request, error)
+            else:
+                messages.success(request, 'Card created successfully!')
+                _warn_near_duplicates(request, card)
+                return redirect('card_detail', card_id=card.id)
     else:
         form = CardForm()
     
@@ -191,7 +184,11 @@ def edit_card_with_forms(request, card_id):
         form = CardForm(request.POST, instance=card)
         
         if form.is_valid():
+            # Starts the history with the pre-edit content if there is none yet
+            # (capture() reads the database, not the form-updated instance)
+            versioning.record(card, request.user)
             form.save()
+            versioning.record(card, request.user)
             messages.success(request, 'Card updated successfully!')
             return redirect('card_detail', card_id=card.id)
     else:
@@ -217,9 +214,11 @@ def add_argument_with_forms(request, card_id):
         form = ArgumentForm(request.POST)
         
         if form.is_valid():
+            versioning.record(card, request.user)
             argument = form.save(commit=False)
             argument.card = card
             argument.save()
+            versioning.record(card, request.user)
             
             messages.success(request, f'{argument.get_type_display()} argument added successfully!')
             return redirect('card_detail', card_id=card.id)
@@ -248,7 +247,9 @@ def edit_argument_with_forms(request, argument_id):
         form = ArgumentForm(request.POST, instance=argument)
         
         if form.is_valid():
+            versioning.record(card, request.user)
             form.save()
+            versioning.record(card, request.user)
             messages.success(request, 'Argument updated successfully!')
             return redirect('card_detail', card_id=card.id)
     else:
@@ -272,7 +273,9 @@ def delete_argument(request, argument_id):
         return redirect('card_detail', card_id=card.id)
     
     if request.method == 'POST':
+        versioning.record(card, request.user)
         argument.delete()
+        versioning.record(card, request.user)
         messages.success(request, 'Argument deleted successfully!')
         return redirect('card_detail', card_id=card.id)
     
@@ -296,9 +299,11 @@ def add_source_with_forms(request, argument_id):
         form = SourceForm(request.POST)
         
         if form.is_valid():
+            versioning.record(card, request.user)
             source = form.save(commit=False)
             source.argument = argument
             source.save()
+            versioning.record(card, request.user)
             
             messages.success(request, 'Source added successfully!')
             return redirect('card_detail', card_id=card.id)
@@ -386,15 +391,22 @@ def create_card_with_formset(request):
         if card_form.is_valid() and argument_formset.is_valid():
             card = card_form.save(commit=False)
             card.user = request.user
-            card.save()
             
-            arguments = argument_formset.save(commit=False)
-            for argument in arguments:
-                argument.card = card
-                argument.save()
+            arguments = [
+                {field: form.cleaned_data[field] for field in ['type', 'summary', 'detail', 'order']}
+                for form in argument_formset.forms
+                if form.has_changed() and not form.cleaned_data.get('DELETE')
+            ]
             
-            messages.success(request, 'Card created successfully with all arguments!')
-            return redirect('card_detail', card_id=card.id)
+            try:
+                assemble_card(card, arguments)
+            except ValidationError as e:
+                for error in e.messages:
+                    messages.error(request, error)
+            else:
+                messages.success(request, 'Card created successfully with all arguments!')
+                _warn_near_duplicates(request, card)
+                return redirect('card_detail', card_id=card.id)
     else:
         card_form = CardForm()
         argument_formset = ArgumentFormSet()
@@ -440,13 +452,15 @@ def unfollow_user(request, user_id):
     return redirect(request.META.get('HTTP_REFERER', 'index'))
 
 
+@conditional(_profile_stamps)
 def user_profile(request, username):
     """View a user's profile"""
     profile_user = get_object_or_404(User, username=username)
-    user_cards = Card.objects.filter(user=profile_user, visibility='public').order_by('-created_at')
+    user_cards = visibility.listing(request.user, Card.objects.filter(user=profile_user)).order_by('-created_at')
     
     # Get public saved cards
     public_saves = SavedCard.objects.filter(
+        visibility.visible_q(request.user, prefix='card__'),
         user=profile_user, 
         visibility='public'
     ).select_related('card', 'card__user').order_by('-saved_at')
@@ -462,10 +476,7 @@ def user_profile(request, username):
     is_following = False
     friend_request_pending = False
     if request.user.is_authenticated:
-        is_following = Follow.objects.filter(
-            follower=request.user, 
-            following=profile_user
-        ).exists()
+        is_following = friend_graph.is_following(request.user.id, profile_user.id)
         
         # Check if there's a pending friend request
         friend_request_pending = FriendRequest.objects.filter(
@@ -480,8 +491,9 @@ def user_profile(request, username):
     # Check if user allows messages
     allows_messages = True
     if request.user.is_authenticated:
-        settings, created = UserSettings.objects.get_or_create(user=profile_user)
-        allows_messages = settings.allow_messages
+        # A plain read (no get_or_create), so viewing a profile doesn't pin the viewer to the primary
+        stored = UserSettings.objects.filter(user=profile_user).values_list('allow_messages', flat=True).first()
+        allows_messages = stored is not False
     
     # Get follower/following counts
     followers_count = Follow.objects.filter(following=profile_user).count()
@@ -490,10 +502,7 @@ def user_profile(request, username):
     # Check if friends
     is_friends = False
     if request.user.is_authenticated:
-        is_friends = (
-            Follow.objects.filter(follower=request.user, following=profile_user).exists() and
-            Follow.objects.filter(follower=profile_user, following=request.user).exists()
-        )
+        is_friends = friend_graph.follows_each_other(request.user.id, profile_user.id)
     
     context = {
         'profile_user': profile_user,
@@ -516,82 +525,52 @@ def user_profile(request, username):
     return render(request, 'cards/user_profile.html', context)
 
 
+@cache_per_viewer(lambda request: ['cards', 'follows'])
 def explore(request):
     """Explore page showing recent cards and active users with search"""
-    from django.db.models import Count, Q
+    from django.db.models import Q
     
     search_query = request.GET.get('q', '').strip()
     
     if search_query:
-        recent_cards = Card.objects.filter(
-            Q(visibility='public') &
-            (Q(title__icontains=search_query) | 
-             Q(hypothesis__icontains=search_query) |
-             Q(subcategory__icontains=search_query) |
-             Q(user__username__icontains=search_query))
-        ).order_by('-created_at')[:12]
-        
-        active_users = User.objects.filter(
-            username__icontains=search_query
-        ).annotate(
-            card_count=Count('cards')
-        ).order_by('-card_count')[:8]
-        
-        popular_users = User.objects.filter(
-            username__icontains=search_query
-        ).annotate(
-            follower_count=Count('followers')
-        ).order_by('-follower_count')[:8]
+        recent_cards = duplicates.collapse(visibility.listing(request.user, Card.objects.filter(
+            Q(title__icontains=search_query) | 
+            Q(hypothesis__icontains=search_query) |
+            Q(subcategory__icontains=search_query) |
+            Q(user__username__icontains=search_query)
+        ))).order_by('-created_at')[:12]
+        
+        matching_users = User.objects.filter(username__icontains=search_query)
+        active_users = rollups.active_users(matching_users, include_zero=True)
+        popular_users = rollups.popular_users(matching_users, include_zero=True)
     else:
-        recent_cards = Card.objects.filter(visibility='public').order_by('-created_at')[:12]
-        
-        active_users = User.objects.annotate(
-            card_count=Count('cards')
-        ).filter(card_count__gt=0).order_by('-card_count')[:8]
-        
-        popular_users = User.objects.annotate(
-            follower_count=Count('followers')
-        ).filter(follower_count__gt=0).order_by('-follower_count')[:8]
-    
-    thirty_days_ago = timezone.now() - timedelta(days=30)
-    trending_topics = Card.objects.filter(
-        visibility='public',
-        created_at__gte=thirty_days_ago
-    ).values('topic').annotate(
-        card_count=Count('id')
-    ).order_by('-card_count')[:3]
-    
-    trending_topics_data = []
-    for topic_data in trending_topics:
-        topic_code = topic_data['topic']
-        topic_display = dict(Card.TOPIC_CHOICES).get(topic_code, topic_code)
-        trending_topics_data.append({
-            'code': topic_code,
-            'display': topic_display,
-            'count': topic_data['card_count']
-        })
+        recent_cards = duplicates.collapse(visibility.listing(request.user)).order_by('-created_at')[:12]
+        active_users = rollups.active_users()
+        popular_users = rollups.popular_users()
+    
+    window = request.GET.get('window')
+    if window not in rollups.WINDOWS:
+        window = rollups.DEFAULT_WINDOW
     
     context = {
         'recent_cards': recent_cards,
         'active_users': active_users,
         'popular_users': popular_users,
         'search_query': search_query,
-        'trending_topics': trending_topics_data,
+        'trending_topics': rollups.trending_topics(window),
+        'trending_window': window,
+        'trending_windows': list(rollups.WINDOWS),
     }
     
     return render(request, 'cards/explore.html', context)
 
 
 @login_required
+@replica_reads
 def friends_feed(request):
     """Feed showing cards from users you follow"""
-    following_users = Follow.objects.filter(follower=request.user).values_list('following', flat=True)
-    
-    from django.db.models import Q
-    friends_cards = Card.objects.filter(
-        Q(user__in=following_users) & 
-        (Q(visibility='public') | Q(visibility='friends'))
-    ).order_by('-created_at')[:20]
+    following_users = friend_graph.following_ids(request.user.id)
+    friends_cards = timeline.feed(request.user, limit=20)
     
     context = {
         'cards': friends_cards,
@@ -601,6 +580,8 @@ def friends_feed(request):
     return render(request, 'cards/friends_feed.html', context)
 
 
+@conditional()
+@cache_per_viewer()
 def topic_cards(request, topic):
     """View all cards for a specific topic"""
     topic_choices = dict(Card.TOPIC_CHOICES)
@@ -609,10 +590,7 @@ def topic_cards(request, topic):
         return redirect('explore')
     
     topic_display = topic_choices[topic]
-    cards = Card.objects.filter(
-        visibility='public',
-        topic=topic
-    ).order_by('-created_at')
+    cards = duplicates.collapse(visibility.listing(request.user, Card.objects.filter(topic=topic))).order_by('-created_at')
     
     context = {
         'topic': topic,
@@ -654,11 +632,14 @@ def mark_notification_read(request, notification_id):
 def mark_all_notifications_read(request):
     """Mark all notifications as read"""
     Notification.objects.filter(recipient=request.user, is_read=False).update(is_read=True)
+    # update() sends no signals
+    view_cache.bump(f'notifications:{request.user.id}')
     messages.success(request, 'All notifications marked as read!')
     return redirect('notifications')
 
 
 @login_required
+@conditional(lambda request: [f'notifications:{request.user.id}'])
 def get_notification_count(request):
     """API endpoint to get unread notification count"""
     count = Notification.objects.filter(recipient=request.user, is_read=False).count()
@@ -668,7 +649,7 @@ def get_notification_count(request):
 @login_required
 def save_card(request, card_id):
     """Save/bookmark a card with visibility option"""
-    card = get_object_or_404(Card, id=card_id)
+    card = get_object_or_404(visibility.visible_cards(request.user), id=card_id)
     
     if card.user == request.user:
         messages.error(request, "You can't save your own card!")
@@ -678,16 +659,16 @@ def save_card(request, card_id):
     existing_save = SavedCard.objects.filter(user=request.user, card=card).first()
     
     if request.method == 'POST':
-        visibility = request.POST.get('visibility', 'public')
+        save_visibility = request.POST.get('visibility', 'public')
         
         if existing_save:
             # Update visibility if already saved
-            existing_save.visibility = visibility
+            existing_save.visibility = save_visibility
             existing_save.save()
-            messages.success(request, f"Card visibility updated to {visibility}!")
+            messages.success(request, f"Card visibility updated to {save_visibility}!")
         else:
             # Create new save
-            SavedCard.objects.create(user=request.user, card=card, visibility=visibility)
+            SavedCard.objects.create(user=request.user, card=card, visibility=save_visibility)
             Notification.objects.create(
                 recipient=card.user,
                 sender=request.user,
@@ -695,7 +676,7 @@ def save_card(request, card_id):
                 card=card,
                 message=f"{request.user.username} saved your card: {card.title}"
             )
-            messages.success(request, f"Card saved to your {visibility} collection!")
+            messages.success(request, f"Card saved to your {save_visibility} collection!")
         
         return redirect('card_detail', card_id=card.id)
     
@@ -731,7 +712,10 @@ def saved_cards(request):
     """View all saved cards with visibility filter"""
     visibility_filter = request.GET.get('visibility', 'all')
     
-    saves = SavedCard.objects.filter(user=request.user).select_related('card', 'card__user')
+    saves = SavedCard.objects.filter(
+        visibility.visible_q(request.user, prefix='card__'),
+        user=request.user,
+    )
     
     if visibility_filter == 'public':
         saves = saves.filter(visibility='public')
@@ -741,6 +725,11 @@ def saved_cards(request):
     public_count = SavedCard.objects.filter(user=request.user, visibility='public').count()
     private_count = SavedCard.objects.filter(user=request.user, visibility='private').count()
     
+    # Load the cards once, with the counts the list template shows
+    cards = visibility.listing(request.user, Card.objects.filter(id__in=[save.card_id for save in saves])).in_bulk()
+    for save in saves:
+        save.card = cards[save.card_id]
+    
     context = {
         'saved_cards': [save.card for save in saves],
         'saves': saves,
@@ -754,6 +743,7 @@ def saved_cards(request):
 
 @login_required
 @login_required
+@conditional(lambda request: [f'messages:{request.user.id}'])
 def get_unread_message_count(request):
     """API endpoint to get unread message count"""
     from django.db.models import Q
@@ -837,7 +827,7 @@ def search_friends(request):
         return JsonResponse({'friends': []})
     
     # Get users that current user follows
-    following_ids = Follow.objects.filter(follower=request.user).values_list('following_id', flat=True)
+    following_ids = friend_graph.following_ids(request.user.id)
     
     # Search within followed users
     friends = User.objects.filter(
@@ -862,7 +852,7 @@ def share_card_message(request, card_id):
     from django.urls import reverse
     from django.db.models import Q
     
-    card = get_object_or_404(Card, id=card_id)
+    card = get_object_or_404(visibility.visible_cards(request.user), id=card_id)
     
     if request.method == 'POST':
         recipient_username = request.POST.get('recipient')
@@ -933,7 +923,7 @@ def send_friend_request(request, user_id):
         return redirect('explore')
     
     # Check if already following
-    if Follow.objects.filter(follower=request.user, following=to_user).exists():
+    if friend_graph.is_following(request.user.id, to_user.id):
         messages.info(request, f"You are already friends with {to_user.username}!")
         return redirect('user_profile', username=to_user.username)
     
@@ -1035,6 +1025,7 @@ def pending_friend_requests(request):
     return render(request, 'cards/friend_requests.html', context)
 
 @login_required
+@conditional(lambda request: [f'friend_requests:{request.user.id}'])
 def get_friend_request_count(request):
     """API endpoint to get pending friend request count"""
     count = FriendRequest.objects.filter(to_user=request.user, status='pending').count()
@@ -1047,7 +1038,7 @@ def find_friends(request):
     query = request.GET.get('q', '').strip()
     
     # Get users you're already following
-    following_ids = Follow.objects.filter(follower=request.user).values_list('following_id', flat=True)
+    following_ids = friend_graph.following_ids(request.user.id)
     
     # Get pending friend requests (both sent and received)
     pending_sent_ids = FriendRequest.objects.filter(
@@ -1191,21 +1182,21 @@ def card_history(request, card_id):
         messages.error(request, "You can only view history of your own cards.")
         return redirect('card_detail', card_id=card.id)
     
-    versions = card.versions.all()
-    
     context = {
         'card': card,
-        'versions': versions,
+        'history': versioning.history(card),
     }
     
     return render(request, 'cards/card_history.html', context)
 
 
+@conditional()
+@cache_per_viewer()
 def commons_cards(request):
     """View all cards from Debrief Commons"""
     try:
         commons_user = User.objects.get(username='DebriefCommons')
-        cards = Card.objects.filter(user=commons_user, visibility='public').order_by('-created_at')
+        cards = visibility.listing(request.user, Card.objects.filter(user=commons_user)).order_by('-created_at')
         
         context = {
             'cards': cards,
@@ -1225,6 +1216,7 @@ def notebook(request):
     stance_filter = request.GET.get('stance', '')
     type_filter = request.GET.get('type', '')
     search_query = request.GET.get('search', '')
+    tag_filter = tagging.normalize_tag(request.GET.get('tag', ''))
     
     entries = NotebookEntry.objects.filter(user=request.user)
     
@@ -1234,12 +1226,16 @@ def notebook(request):
         entries = entries.filter(stance=stance_filter)
     if type_filter:
         entries = entries.filter(entry_type=type_filter)
+    if tag_filter:
+        entries = entries.filter(tag_index__name=tag_filter)
     if search_query:
         from django.db.models import Q
+        tagged = tagging.EntryTag.objects.filter(tag__name=tagging.normalize_tag(search_query))
         entries = entries.filter(
             Q(title__icontains=search_query) | 
-            Q(description__icontains=search_query) |
-            Q(tags__icontains=search_query)
+            Q(user_notes__icontains=search_query) |
+            Q(auto_summary__icontains=search_query) |
+            Q(id__in=tagged.values('notebookentry_id'))
         )
     
     # Get counts by topic for sidebar
@@ -1254,8 +1250,10 @@ def notebook(request):
         'topic_filter': topic_filter,
         'stance_filter': stance_filter,
         'type_filter': type_filter,
+        'tag_filter': tag_filter,
         'search_query': search_query,
         'topic_counts': topic_counts,
+        'tag_cloud': tagging.tag_cloud(request.user),
         'topics': NotebookEntry.NOTEBOOK_TOPICS,
     }
     
@@ -1279,47 +1277,45 @@ def add_notebook_entry(request):
     # Auto-save if coming from bookmarklet with URL and title
     if from_popup and prefill_url and prefill_title and request.method == 'GET':
         # Auto-create the entry
-        # Try to get content summary based on type
-        description = prefill_selection if prefill_selection else ''
+        entry = NotebookEntry(
+            user=request.user,
+            entry_type=entry_type,
+            title=prefill_title,
+            content=prefill_url,
+            user_notes=prefill_selection,
+            topic='general',  # General Research - user can change later
+            stance='neutral',
+            tags='quick-save',
+        )
         
+        # Try to get content summary based on type
         if entry_type == 'youtube':
             video_id = extract_video_id(prefill_url)
             if video_id:
                 transcript = get_youtube_transcript(video_id)
                 if transcript:
-                    summary = summarize_transcript(transcript, max_length=500)
-                    description = f"📝 Auto-summary: {summary}\n\n{description}" if description else f"📝 Auto-summary: {summary}"
+                    entry.auto_summary = summarize_transcript(transcript, max_length=500)
+                    entry.summary_source = 'transcript'
+                    entry.enrichment_status = 'summarized'
                     print(f"✅ Successfully extracted transcript for {video_id}")
                 else:
-                    no_transcript_msg = "⏳ No transcript available yet. This could be because:\n• Video was recently uploaded (captions take time to generate)\n• Creator disabled captions\n• Live stream hasn't ended yet\n\nTry using the 'Regenerate Summary' button later!"
-                    description = f"{no_transcript_msg}\n\n{description}" if description else no_transcript_msg
+                    entry.enrichment_status = 'no_transcript'
         
         elif entry_type == 'article' and is_valid_url(prefill_url):
             # Try to fetch and summarize article
             article_text = fetch_article_text(prefill_url)
-            if article_text:
-                summary = summarize_article(article_text, max_sentences=5)
-                if summary:
-                    description = f"📝 Auto-summary: {summary}\n\n{description}" if description else f"📝 Auto-summary: {summary}"
-                    print(f"✅ Successfully summarized article from {prefill_url}")
-                else:
-                    description = f"⚠️ Could not generate summary for this article.\n\n{description}" if description else "⚠️ Could not generate summary for this article."
+            summary = summarize_article(article_text, max_sentences=5) if article_text else None
+            if summary:
+                entry.auto_summary = summary
+                entry.summary_source = 'article'
+                entry.enrichment_status = 'summarized'
+                print(f"✅ Successfully summarized article from {prefill_url}")
             else:
-                description = f"⚠️ Could not extract article content. Site may be protected or require login.\n\n{description}" if description else "⚠️ Could not extract article content."
-        
-        if not description:
-            description = 'Quick saved from browser'
+                entry.enrichment_status = 'failed'
         
-        entry = NotebookEntry.objects.create(
-            user=request.user,
-            entry_type=entry_type,
-            title=prefill_title,
-            content=prefill_url,
-            description=description,
-            topic='general',  # General Research - user can change later
-            stance='neutral',
-            tags='quick-save',
-        )
+        if not entry.user_notes and not entry.auto_summary:
+            entry.user_notes = 'Quick saved from browser'
+        entry.save()
         messages.success(request, "📝 Saved to notebook!")
         return render(request, 'cards/close_popup.html', {'entry': entry})
     
@@ -1329,7 +1325,7 @@ def add_notebook_entry(request):
             entry_type=request.POST.get('entry_type'),
             title=request.POST.get('title'),
             content=request.POST.get('content'),
-            description=request.POST.get('description', ''),
+            user_notes=request.POST.get('description', ''),
             topic=request.POST.get('topic'),
             stance=request.POST.get('stance', 'neutral'),
             tags=request.POST.get('tags', ''),
@@ -1352,6 +1348,12 @@ def add_notebook_entry(request):
     return render(request, 'cards/add_notebook_entry.html', context)
 
 
+@login_required
+def notebook_tag_autocomplete(request):
+    """The user's tags matching a prefix, most used first"""
+    return JsonResponse({'tags': tagging.autocomplete(request.user, request.GET.get('q', ''))})
+
+
 @login_required
 def delete_notebook_entry(request, entry_id):
     """Delete a notebook entry"""
@@ -1371,54 +1373,6 @@ def notebook_entry_detail(request, entry_id):
     """View detailed notebook entry"""
     entry = get_object_or_404(NotebookEntry, id=entry_id, user=request.user)
     
-    # Extract YouTube video ID if it's a YouTube link
-    youtube_id = None
-    if entry.entry_type == 'youtube' or 'youtube.com' in entry.content or 'youtu.be' in entry.content:
-        import re
-        # Match various YouTube URL formats (handles &t= and other params)
-        patterns = [
-            r'(?:youtube\.com\/watch\?v=)([a-zA-Z0-9_-]{11})',  # watch?v=ID&...
-            r'(?:youtu\.be\/)([a-zA-Z0-9_-]{11})',  # youtu.be/ID
-            r'youtube\.com\/embed\/([a-zA-Z0-9_-]{11})',  # embed/ID
-        ]
-        for pattern in patterns:
-            match = re.search(pattern, entry.content)
-            if match:
-                youtube_id = match.group(1)
-                break
-    
-    # Parse auto-summary from description
-    auto_summary = None
-    remaining_description = entry.description
-    
-    if entry.description and '📝 Auto-summary:' in entry.description:
-        parts = entry.description.split('📝 Auto-summary:', 1)
-        if len(parts) > 1:
-            # Extract the summary (everything after the marker until double newline or end)
-            summary_part = parts[1]
-            if '\n\n' in summary_part:
-                auto_summary = summary_part.split('\n\n', 1)[0].strip()
-                remaining_description = summary_part.split('\n\n', 1)[1].strip() if len(summary_part.split('\n\n', 1)) > 1 else ''
-            else:
-                auto_summary = summary_part.strip()
-                remaining_description = ''
-    
-    # Remove transcript unavailable message from personal notes
-    if remaining_description and '⏳ No transcript available yet' in remaining_description:
-        # Remove the entire message
-        lines = remaining_description.split('\n')
-        filtered_lines = []
-        skip = False
-        for line in lines:
-            if '⏳ No transcript available yet' in line:
-                skip = True
-            elif skip and "Try using the 'Regenerate Summary' button later!" in line:
-                skip = False
-                continue
-            elif not skip:
-                filtered_lines.append(line)
-        remaining_description = '\n'.join(filtered_lines).strip()
-    
     # Parse tags
     tags = [tag.strip() for tag in entry.tags.split(',') if tag.strip()] if entry.tags else []
     
@@ -1427,12 +1381,10 @@ def notebook_entry_detail(request, entry_id):
     
     context = {
         'entry': entry,
-        'auto_summary': auto_summary,
-        'remaining_description': remaining_description,
         'tags': tags,
         'topics': NotebookEntry.NOTEBOOK_TOPICS,
         'notes': notes,
-        'youtube_id': youtube_id,
+        'youtube_id': entry.get_youtube_id(),
     }
     
     return render(request, 'cards/notebook_entry_detail_enhanced.html', context)
@@ -1450,7 +1402,7 @@ def regenerate_summary(request, entry_id):
     success = False
     
     if entry.entry_type == 'youtube':
-        video_id = extract_video_id(entry.content)
+        video_id = entry.youtube_id
         if not video_id:
             messages.error(request, "Could not extract video ID from URL.")
             return redirect('notebook_entry_detail', entry_id=entry.id)
@@ -1462,6 +1414,8 @@ def regenerate_summary(request, entry_id):
             summary = summarize_transcript(transcript, max_length=500)
             success = True
         else:
+            entry.enrichment_status = 'no_transcript'
+            entry.save(update_fields=['enrichment_status', 'updated_at'])
             messages.error(request, "⏳ Transcript still not available. Try again later!")
             return redirect('notebook_entry_detail', entry_id=entry.id)
     
@@ -1473,32 +1427,21 @@ def regenerate_summary(request, entry_id):
             if summary:
                 success = True
             else:
+                entry.enrichment_status = 'failed'
+                entry.save(update_fields=['enrichment_status', 'updated_at'])
                 messages.error(request, "Could not generate summary for this article.")
                 return redirect('notebook_entry_detail', entry_id=entry.id)
         else:
+            entry.enrichment_status = 'failed'
+            entry.save(update_fields=['enrichment_status', 'updated_at'])
             messages.error(request, "⚠️ Could not extract article content. Site may be protected.")
             return redirect('notebook_entry_detail', entry_id=entry.id)
     
     if success:
-        # Update description - replace old summary or error messages
-        description = entry.description or ''
-        
-        # Remove old auto-summary if exists
-        if '📝 Auto-summary:' in description:
-            parts = description.split('📝 Auto-summary:', 1)
-            if len(parts) > 1 and '\n\n' in parts[1]:
-                description = parts[1].split('\n\n', 1)[1] if len(parts[1].split('\n\n', 1)) > 1 else ''
-            else:
-                description = parts[0]
-        
-        # Remove error messages
-        if '⏳ No transcript available yet' in description or '⚠️ Could not' in description:
-            parts = description.split('\n\n', 1)
-            description = parts[1] if len(parts) > 1 else ''
-        
-        # Add new summary
-        entry.description = f"📝 Auto-summary: {summary}\n\n{description}".strip()
-        entry.save()
+        entry.auto_summary = summary
+        entry.summary_source = 'transcript' if entry.entry_type == 'youtube' else 'article'
+        entry.enrichment_status = 'summarized'
+        entry.save(update_fields=['auto_summary', 'summary_source', 'enrichment_status', 'updated_at'])
         
         messages.success(request, "✅ Summary generated successfully!")
     
@@ -1526,31 +1469,8 @@ def update_entry_notes(request, entry_id):
     entry = get_object_or_404(NotebookEntry, id=entry_id, user=request.user)
     
     if request.method == 'POST':
-        new_notes = request.POST.get('notes', '').strip()
-        
-        # Preserve auto-summary if it exists
-        if entry.description and '📝 Auto-summary:' in entry.description:
-            # Extract the summary
-            parts = entry.description.split('📝 Auto-summary:', 1)
-            if len(parts) > 1:
-                summary_part = parts[1]
-                if '\n\n' in summary_part:
-                    auto_summary = summary_part.split('\n\n', 1)[0].strip()
-                else:
-                    auto_summary = summary_part.strip()
-                
-                # Combine summary with new notes
-                if new_notes:
-                    entry.description = f"📝 Auto-summary: {auto_summary}\n\n{new_notes}"
-                else:
-                    entry.description = f"📝 Auto-summary: {auto_summary}"
-            else:
-                entry.description = new_notes
-        else:
-            # No auto-summary, just save the notes
-            entry.description = new_notes
-        
-        entry.save()
+        entry.user_notes = request.POST.get('notes', '').strip()
+        entry.save(update_fields=['user_notes', 'updated_at'])
         messages.success(request, "✅ Notes saved successfully!")
     
     return redirect('notebook_entry_detail', entry_id=entry.id)
@@ -1636,8 +1556,11 @@ def card_wizard(request):
         conclusion = request.POST.get('conclusion')
         alternative = request.POST.get('alternative', '')
         
-        # Create the card
-        card = Card.objects.create(
+        # Add alternative as a note in conclusion if provided
+        if alternative.strip():
+            conclusion = f"{conclusion}\n\nAlternative Solution: {alternative}"
+        
+        card = Card(
             user=request.user,
             title=title,
             topic=topic,
@@ -1647,35 +1570,20 @@ def card_wizard(request):
             stance=stance,
             visibility='public'
         )
+        arguments = (
+            argument_payload('pro', request.POST.getlist('supporting_args[]'), start=1) +
+            argument_payload('con', request.POST.getlist('opposing_args[]'), start=1)
+        )
         
-        # Add supporting arguments
-        supporting_args = request.POST.getlist('supporting_args[]')
-        for i, arg_text in enumerate(supporting_args, 1):
-            if arg_text.strip():
-                Argument.objects.create(
-                    card=card,
-                    type='pro',
-                    summary=arg_text.strip(),
-                    order=i
-                )
-        
-        # Add opposing arguments
-        opposing_args = request.POST.getlist('opposing_args[]')
-        for i, arg_text in enumerate(opposing_args, 1):
-            if arg_text.strip():
-                Argument.objects.create(
-                    card=card,
-                    type='con',
-                    summary=arg_text.strip(),
-                    order=i
-                )
-        
-        # Add alternative as a note in conclusion if provided
-        if alternative.strip():
-            card.conclusion = f"{conclusion}\n\nAlternative Solution: {alternative}"
-            card.save()
+        try:
+            assemble_card(card, arguments)
+        except ValidationError as e:
+            for error in e.messages:
+                messages.error(request, error)
+            return render(request, 'cards/card_wizard.html', {'topics': Card.TOPIC_CHOICES})
         
         messages.success(request, "🎉 Argument card created successfully!")
+        _warn_near_duplicates(request, card)
         return redirect('card_detail', card_id=card.id)
     
     context = {
@@ -1708,7 +1616,7 @@ def synthesize_public_figure_card(request):
         # Create card as DebriefCommons user
         commons_user = User.objects.get(username='DebriefCommons')
         
-        card = Card.objects.create(
+        card = Card(
             user=commons_user,
             title=title,
             topic=topic,
@@ -1717,34 +1625,27 @@ def synthesize_public_figure_card(request):
             conclusion=conclusion,
             stance=stance,
             visibility='public',
-            source_type='public_figure',
-            original_source=original_source,
-            source_url=source_url,
-            synthesized_by=request.user
         )
         
-        # Add arguments
+        # Every argument cites the public figure's original content
+        citation_title = f"{original_source} (original content)"
+        citation = [url_source(source_url, citation_title) if source_url else {'title': citation_title[:300]}]
         supporting_args = request.POST.getlist('supporting_args[]')
-        for i, arg_text in enumerate(supporting_args, 1):
-            if arg_text.strip():
-                Argument.objects.create(
-                    card=card,
-                    argument_type='supporting',
-                    text=arg_text.strip(),
-                    order=i
-                )
-        
         opposing_args = request.POST.getlist('opposing_args[]')
-        for i, arg_text in enumerate(opposing_args, 1):
-            if arg_text.strip():
-                Argument.objects.create(
-                    card=card,
-                    argument_type='opposing',
-                    text=arg_text.strip(),
-                    order=i
-                )
+        arguments = (
+            argument_payload('pro', supporting_args, sources=[citation] * len(supporting_args), start=1) +
+            argument_payload('con', opposing_args, sources=[citation] * len(opposing_args), start=1)
+        )
+        
+        try:
+            assemble_card(card, arguments)
+        except ValidationError as e:
+            for error in e.messages:
+                messages.error(request, error)
+            return render(request, 'cards/synthesize_figure_card.html', {'topics': Card.TOPIC_CHOICES})
         
         messages.success(request, f"✅ Synthesized argument card for {original_source}!")
+        _warn_near_duplicates(request, card)
         return redirect('commons_cards')
     
     context = {
@@ -1756,17 +1657,14 @@ def synthesize_public_figure_card(request):
 @login_required
 def topic_survey(request, topic):
     """Interactive survey for a specific topic"""
-    try:
-        survey = TopicSurvey.objects.get(topic=topic, is_active=True)
-    except TopicSurvey.DoesNotExist:
+    survey = survey_cache.get_survey(topic, active_only=True)
+    if survey is None:
         messages.error(request, "Survey not available for this topic yet.")
         return redirect('create_card_wizard')
     
-    questions = survey.questions.prefetch_related('options').all()
-    
     context = {
         'survey': survey,
-        'questions': questions,
+        'questions': survey.questions,
         'topic_display': dict(Card.TOPIC_CHOICES).get(topic, topic),
     }
     
@@ -1811,9 +1709,8 @@ def process_survey(request, topic):
     if request.method != 'POST':
         return redirect('topic_survey', topic=topic)
     
-    try:
-        survey = TopicSurvey.objects.get(topic=topic)
-    except TopicSurvey.DoesNotExist:
+    survey = survey_cache.get_survey(topic)
+    if survey is None:
         messages.error(request, "Survey not found.")
         return redirect('survey_list')
     
@@ -1827,18 +1724,18 @@ def process_survey(request, topic):
         'conclusion': [],
     }
     
-    for question in survey.questions.all():
+    # Options resolve against the cached survey definition - no per-option queries
+    for question in survey.questions:
         option_ids = request.POST.getlist(f'question_{question.id}')
+        maps_to = question.maps_to
         
-        for option_id in option_ids:
-            if option_id:
-                option = QuestionOption.objects.get(id=option_id)
-                maps_to = question.maps_to
-                
-                if maps_to in ['stance', 'scope']:
-                    collected[maps_to] = option.card_value
-                else:
-                    collected[maps_to].append(option.card_value)
+        for option in survey.resolve(question, option_ids):
+            if maps_to == 'scope' and option.card_value not in dict(Card.SCOPE_CHOICES):
+                continue
+            if maps_to in ['stance', 'scope']:
+                collected[maps_to] = option.card_value
+            else:
+                collected[maps_to].append(option.card_value)
     
     # Combine hypothesis statements
     hypothesis_text = ' '.join(collected['hypothesis']) if collected['hypothesis'] else 'Immigration policy reform is needed.'
@@ -1874,44 +1771,33 @@ def edit_survey_card(request):
         return redirect('create_card_wizard')
     
     if request.method == 'POST':
-        # Create the card
-        card = Card.objects.create(
+        card = Card(
             user=request.user,
-            title=request.POST.get('title'),
+            title=request.POST.get('title', ''),
             topic=draft['topic'],
-            scope=request.POST.get('scope'),
-            hypothesis=request.POST.get('hypothesis'),
-            conclusion=request.POST.get('conclusion'),
-            stance=request.POST.get('stance'),
+            scope=request.POST.get('scope', ''),
+            hypothesis=request.POST.get('hypothesis', ''),
+            conclusion=request.POST.get('conclusion', ''),
+            stance=request.POST.get('stance', ''),
             visibility='public'
         )
+        arguments = (
+            argument_payload('pro', request.POST.getlist('supporting_args[]'), start=1) +
+            argument_payload('con', request.POST.getlist('opposing_args[]'), start=1)
+        )
         
-        # Add supporting arguments
-        supporting_args = request.POST.getlist('supporting_args[]')
-        for i, arg_text in enumerate(supporting_args, 1):
-            if arg_text.strip():
-                Argument.objects.create(
-                    card=card,
-                    type='pro',
-                    summary=arg_text.strip(),
-                    order=i
-                )
-        
-        # Add opposing arguments
-        opposing_args = request.POST.getlist('opposing_args[]')
-        for i, arg_text in enumerate(opposing_args, 1):
-            if arg_text.strip():
-                Argument.objects.create(
-                    card=card,
-                    type='con',
-                    summary=arg_text.strip(),
-                    order=i
-                )
+        try:
+            assemble_card(card, arguments)
+        except ValidationError as e:
+            for error in e.messages:
+                messages.error(request, error)
+            return redirect('edit_survey_card')
         
         # Clear session
         del request.session['draft_card']
         
         messages.success(request, "🎉 Argument card published!")
+        _warn_near_duplicates(request, card)
         return redirect('card_detail', card_id=card.id)
     
     context = {
@@ -1932,10 +1818,15 @@ def survey_card_preview(request):
         return redirect('survey_list')
     
     topic_name = dict(Card.TOPIC_CHOICES).get(draft['topic'], draft['topic'])
+    draft_text = duplicates.text_for(
+        draft['title'], draft['stance'], draft['hypothesis'], draft['conclusion'],
+        draft.get('supporting_args', []) + draft.get('opposing_args', []),
+    )
     
     context = {
         'draft': draft,
         'topic_display': topic_name,
+        'near_duplicates': duplicates.similar_cards(request.user, draft_text),
     }
     
     return render(request, 'cards/survey_card_preview.html', context)
@@ -1953,8 +1844,7 @@ def publish_survey_card(request):
         messages.error(request, "No draft card found.")
         return redirect('survey_list')
     
-    # Create the card
-    card = Card.objects.create(
+    card = Card(
         user=request.user,
         title=draft['title'],
         topic=draft['topic'],
@@ -1964,31 +1854,23 @@ def publish_survey_card(request):
         stance=draft['stance'],
         visibility='public'
     )
+    arguments = (
+        argument_payload('pro', draft.get('supporting_args', []), start=1) +
+        argument_payload('con', draft.get('opposing_args', []), start=1)
+    )
     
-    # Add supporting arguments
-    for i, arg_text in enumerate(draft.get('supporting_args', []), 1):
-        if arg_text:
-            Argument.objects.create(
-                card=card,
-                type='pro',
-                summary=arg_text,
-                order=i
-            )
-    
-    # Add opposing arguments
-    for i, arg_text in enumerate(draft.get('opposing_args', []), 1):
-        if arg_text:
-            Argument.objects.create(
-                card=card,
-                type='con',
-                summary=arg_text,
-                order=i
-            )
+    try:
+        assemble_card(card, arguments)
+    except ValidationError as e:
+        for error in e.messages:
+            messages.error(request, error)
+        return redirect('edit_survey_card')
     
     # Clear session
     del request.session['draft_card']
     
     messages.success(request, "🎉 Your argument card has been published!")
+    _warn_near_duplicates(request, card)
     return redirect('card_detail', card_id=card.id)
 
 
@@ -2097,15 +1979,24 @@ def enhanced_fact_search(request):
     if topic:
         db_facts = db_facts.filter(topic=topic)
     
-    # Score by relevance - count how many query words match
-    db_facts = db_facts.annotate(
+    # Candidates: facts sharing a query word, plus the closest facts in the
+    # vector index (which also catches other word forms and phrasings)
+    candidate_ids = set(db_facts.order_by('-relevance_score').values_list('id', flat=True)[:50])
+    candidate_ids.update(
+        fact_id for score, fact_id in fact_index.search(query, topic=topic or None, limit=20)
+        if score >= fact_index.MIN_SIMILARITY
+    )
+    
+    # Count how many query words match, then rank by meaning
+    db_facts = PolicyFact.objects.filter(id__in=candidate_ids).annotate(
         match_score=Count(
             Case(
                 *[When(fact_text__icontains=word, then=1) for word in words],
                 output_field=IntegerField()
             )
         )
-    ).order_by('-match_score', '-relevance_score')[:10]
+    )
+    db_facts = fact_index.rank(query, list(db_facts))[:10]
     
     # Filter out facts already shown
     for fact in db_facts:
@@ -2120,8 +2011,11 @@ def enhanced_fact_search(request):
                 'date': fact.date_published.strftime('%Y-%m-%d') if fact.date_published else None,
                 'type': 'fact',
                 'excerpt': '',
-                'ai_recommended': fact.match_score >= len(words) / 2,  # Matches 50%+ of query words
-                'ai_explanation': f'Matches {fact.match_score} of {len(words)} search terms' if fact.match_score > 1 else ''
+                'ai_recommended': fact.match_score >= len(words) / 2 or fact.similarity >= fact_index.STRONG_SIMILARITY,
+                'ai_explanation': (
+                    f'Matches {fact.match_score} of {len(words)} search terms' if fact.match_score > 1
+                    else 'Closely related to your search' if fact.similarity >= fact_index.STRONG_SIMILARITY else ''
+                )
             })
     
     # Only fetch external sources if we need more results
@@ -2324,35 +2218,32 @@ def notebook_quick_save_api(request):
         if not url:
             return JsonResponse({'success': False, 'error': 'URL required'})
         
-        # Determine entry type based on URL
-        entry_type = 'article'
-        if 'youtube.com' in url or 'youtu.be' in url:
-            entry_type = 'video'
-        
-        # Create notebook entry
+        # Create notebook entry (YouTube links are typed on save)
         try:
             entry = NotebookEntry.objects.create(
                 user=request.user,
                 title=title or url,
                 content=url,  # URL goes in content field
-                description=description or '',  # Will be updated with summary
+                user_notes=description,
                 topic=topic,
-                entry_type=entry_type,
+                entry_type='article',
                 stance='neutral',  # Default stance
                 tags=f'{source},{topic}' if source != 'quick-save' else topic
             )
             
             # Auto-summarize only if explicitly requested
             auto_summarize = request.POST.get('auto_summarize', 'false') == 'true'
-            if entry_type == 'article' and not description and auto_summarize:
+            if entry.entry_type == 'article' and not description and auto_summarize:
                 try:
                     from .article_utils import ArticleSummarizer
-                    summarizer = ArticleSummarizer()
+                    summarizer = ArticleSummarizer(user=request.user)
                     summary = summarizer.summarize_article(url)
                     
                     if summary:
-                        entry.description = f"📝 Auto-summary:\n{summary}"
-                        entry.save()
+                        entry.auto_summary = summary
+                        entry.summary_source = 'ai'
+                        entry.enrichment_status = 'summarized'
+                        entry.save(update_fields=['auto_summary', 'summary_source', 'enrichment_status', 'updated_at'])
                 except Exception as e:
                     print(f"Summarization failed: {e}")
                     # Continue anyway - entry is saved without summary
@@ -2397,22 +2288,19 @@ def share_to_squad(request, entry_id):
         )
         
         # Notify all friends
-        from django.db.models import Q
-        friendships = FriendRequest.objects.filter(
-            Q(from_user=request.user) | Q(to_user=request.user),
-            status='accepted'
-        )
-        
-        friend_count = 0
-        for friendship in friendships:
-            friend = friendship.to_user if friendship.from_user == request.user else friendship.from_user
-            Notification.objects.create(
-                recipient=friend,
+        friend_ids = friend_graph.friend_ids(request.user.id)
+        Notification.objects.bulk_create([
+            Notification(
+                recipient_id=friend_id,
                 sender=request.user,
                 notification_type='squad_share',
                 message=f"{request.user.username} shared a video to Squad Digest: {entry.title}"
             )
-            friend_count += 1
+            for friend_id in friend_ids
+        ])
+        # bulk_create sends no signals
+        view_cache.bump(*[f'notifications:{friend_id}' for friend_id in friend_ids])
+        friend_count = len(friend_ids)
         
         return JsonResponse({
             'success': True,
@@ -2430,38 +2318,26 @@ def squad_digest(request):
     from .models import SquadDigest
     
     # Get user's friends
-    friendships = FriendRequest.objects.filter(
-        Q(from_user=request.user) | Q(to_user=request.user),
-        status='accepted'
-    )
-    
-    friend_ids = []
-    for friendship in friendships:
-        friend = friendship.to_user if friendship.from_user == request.user else friendship.from_user
-        friend_ids.append(friend.id)
+    friend_ids = friend_graph.friend_ids(request.user.id)
     
     # Get digests shared by friends + user's own shares
     digests = SquadDigest.objects.filter(
         Q(shared_by__id__in=friend_ids) | Q(shared_by=request.user)
     ).select_related('shared_by', 'notebook_entry').prefetch_related('squad_notes')
     
-    # Extract YouTube IDs for each digest
-    import re
+    # Several friends sharing the same video collapse into its latest share
+    feed = []
+    latest_share = {}
     for digest in digests:
-        if digest.notebook_entry.entry_type == 'youtube':
-            patterns = [
-                r'(?:youtube\.com\/watch\?v=)([a-zA-Z0-9_-]{11})',
-                r'(?:youtu\.be\/)([a-zA-Z0-9_-]{11})',
-                r'youtube\.com\/embed\/([a-zA-Z0-9_-]{11})',
-            ]
-            youtube_id = None
-            for pattern in patterns:
-                match = re.search(pattern, digest.notebook_entry.content)
-                if match:
-                    youtube_id = match.group(1)
-                    break
-            digest.youtube_id = youtube_id
-            print(f"DEBUG: Set youtube_id={youtube_id} for {digest.notebook_entry.title}")
+        digest.youtube_id = digest.notebook_entry.youtube_id
+        digest.also_shared_by = []
+        if digest.youtube_id in latest_share:
+            latest_share[digest.youtube_id].also_shared_by.append(digest.shared_by)
+            continue
+        if digest.youtube_id:
+            latest_share[digest.youtube_id] = digest
+        feed.append(digest)
+    digests = feed
     
     context = {
         'digests': digests,
@@ -2477,28 +2353,13 @@ def squad_digest(request):
 def squad_digest_detail(request, digest_id):
     """View detailed squad digest with full notes"""
     from .models import SquadDigest
-    digest = get_object_or_404(SquadDigest, id=digest_id)
-    
-    # Extract YouTube ID
-    import re
-    youtube_id = None
-    if digest.notebook_entry.entry_type == 'youtube':
-        patterns = [
-            r'(?:youtube\.com\/watch\?v=)([a-zA-Z0-9_-]{11})',
-            r'(?:youtu\.be\/)([a-zA-Z0-9_-]{11})',
-            r'youtube\.com\/embed\/([a-zA-Z0-9_-]{11})',
-        ]
-        for pattern in patterns:
-            match = re.search(pattern, digest.notebook_entry.content)
-            if match:
-                youtube_id = match.group(1)
-                break
+    digest = get_object_or_404(SquadDigest.objects.select_related('shared_by', 'notebook_entry'), id=digest_id)
     
     notes = digest.squad_notes.all().order_by('created_at')
     
     context = {
         'digest': digest,
-        'youtube_id': youtube_id,
+        'youtube_id': digest.notebook_entry.get_youtube_id(),
         'notes': notes,
     }
     
@@ -2568,20 +2429,20 @@ def generate_summary(request, entry_id):
         if entry.entry_type != 'article':
             return JsonResponse({'success': False, 'error': 'Can only summarize articles'})
         
-        # Check if API key exists
-        import os
-        if not os.environ.get('ANTHROPIC_API_KEY'):
+        # Check that AI is configured (API key or stub backend)
+        from .article_utils import ArticleSummarizer
+        summarizer = ArticleSummarizer(user=request.user)
+        if not summarizer.available:
             return JsonResponse({'success': False, 'error': 'AI summarization not configured. Please add ANTHROPIC_API_KEY to environment variables.'})
         
         try:
-            from .article_utils import ArticleSummarizer
-            summarizer = ArticleSummarizer()
             summary = summarizer.summarize_article(entry.content)
             
             if summary:
-                # Update description with new summary
-                entry.description = f"📝 Auto-summary:\n{summary}"
-                entry.save()
+                entry.auto_summary = summary
+                entry.summary_source = 'ai'
+                entry.enrichment_status = 'summarized'
+                entry.save(update_fields=['auto_summary', 'summary_source', 'enrichment_status', 'updated_at'])
                 
                 return JsonResponse({
                     'success': True,
@@ -2598,3 +2459,21 @@ def generate_summary(request, entry_id):
     
     return JsonResponse({'success': False, 'error': 'POST required'})
 
+
+
+def metrics(request):
+    """Prometheus metrics for staff, or for a scraper holding METRICS_TOKEN"""
+    import hmac
+    from django.conf import settings
+    from django.http import HttpResponse, HttpResponseForbidden
+    from .instrumentation import registry
+    
+    authorized = request.user.is_authenticated and request.user.is_staff
+    token = settings.METRICS_TOKEN
+    if not authorized and token:
+        authorized = hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}')
+    
+    if not authorized:
+        return HttpResponseForbidden('Staff only')
+    
+    return HttpResponse(registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -0,0 +1,93 @@
+"""
+Card visibility rules in one place
+
+    public   - everyone
+    friends  - the owner and their accepted friends
+    private  - the owner only
+
+Filtering a queryset adds a WHERE clause built from the viewer's cached
+friend set (friend_graph), so a list page costs the same number of queries
+whether it shows ten cards or a thousand.
+"""
+from django.db.models import Count, IntegerField, OuterRef, Q, Subquery, Value
+from django.db.models.functions import Coalesce
+
+from . import friend_graph
+from .models import Argument, Card, FriendRequest, SavedCard
+
+# Beyond this many friends, match them with a subquery instead of inlined IDs
+MAX_INLINE_FRIENDS = 500
+
+
+def _is_authenticated(viewer):
+    return viewer is not None and viewer.is_authenticated
+
+
+def visible_q(viewer, prefix=''):
+    """Q object for cards the viewer may see; prefix is e.g. 'card__' for related lookups"""
+    public = Q(**{f'{prefix}visibility': 'public'})
+    if not _is_authenticated(viewer):
+        return public
+
+    condition = public | Q(**{f'{prefix}user_id': viewer.id})
+    friend_ids = friend_graph.friend_ids(viewer.id)
+    if not friend_ids:
+        return condition
+
+    friends_only = Q(**{f'{prefix}visibility': 'friends'})
+    if len(friend_ids) <= MAX_INLINE_FRIENDS:
+        return condition | (friends_only & Q(**{f'{prefix}user_id__in': sorted(friend_ids)}))
+
+    accepted = FriendRequest.objects.filter(status='accepted')
+    return condition | (friends_only & (
+        Q(**{f'{prefix}user_id__in': accepted.filter(from_user_id=viewer.id).values('to_user_id')}) |
+        Q(**{f'{prefix}user_id__in': accepted.filter(to_user_id=viewer.id).values('from_user_id')})
+    ))
+
+
+def visible_cards(viewer, queryset=None):
+    """Restrict a Card queryset (default: all cards) to what the viewer may see"""
+    if queryset is None:
+        queryset = Card.objects.all()
+    return queryset.filter(visible_q(viewer))
+
+
+def _count(model):
+    rows = model.objects.filter(card=OuterRef('pk')).order_by().values('card').annotate(n=Count('pk'))
+    return Coalesce(Subquery(rows.values('n')[:1], output_field=IntegerField()), Value(0))
+
+
+def listing(viewer, queryset=None):
+    """
+    Visible cards ready for a list template: author joined in, save_count and
+    argument_count annotated, so rendering adds no per-card queries
+    """
+    return visible_cards(viewer, queryset).select_related('user').annotate(
+        save_count=_count(SavedCard),
+        argument_count=_count(Argument),
+    )
+
+
+def _allowed(card, viewer_id, friend_ids):
+    if card.visibility == 'public' or card.user_id == viewer_id:
+        return True
+    return card.visibility == 'friends' and card.user_id in friend_ids
+
+
+def can_view(viewer, card):
+    """Whether the viewer may see a single card"""
+    if card.visibility == 'public':
+        return True
+    if not _is_authenticated(viewer):
+        return False
+    if card.user_id == viewer.id:
+        return True
+    return card.visibility == 'friends' and friend_graph.are_friends(viewer.id, card.user_id)
+
+
+def filter_visible(viewer, cards):
+    """Already-loaded cards the viewer may see, in their original order"""
+    if not _is_authenticated(viewer):
+        return [card for card in cards if card.visibility == 'public']
+    friend_ids = friend_graph.friend_ids(viewer.id)
+    return [card for card in cards if _allowed(card, viewer.id, friend_ids)]
@@ -4,19 +4,39 @@ from youtube_transcript_api import YouTubeTranscriptApi
 from youtube_transcript_api._errors import TranscriptsDisabled, NoTranscriptFound
 
 
+YOUTUBE_ID_PATTERN = re.compile(
+    r'(?:youtube(?:-nocookie)?\.com\/(?:watch\?(?:[^#\s]*&)?v=|embed\/|shorts\/|live\/|v\/)'
+    r'|youtu\.be\/)([a-zA-Z0-9_-]{11})(?![a-zA-Z0-9_-])'
+)
+
+
 def extract_video_id(url):
     """Extract YouTube video ID from various URL formats"""
-    patterns = [
-        r'(?:youtube\.com\/watch\?v=)([a-zA-Z0-9_-]+)',
-        r'(?:youtu\.be\/)([a-zA-Z0-9_-]+)',
-        r'(?:youtube\.com\/embed\/)([a-zA-Z0-9_-]+)',
-    ]
-    
-    for pattern in patterns:
-        match = re.search(pattern, url)
-        if match:
-            return match.group(1)
-    return None
+    if not url:
+        return None
+    match = YOUTUBE_ID_PATTERN.search(url)
+    return match.group(1) if match else None
+
+
+def canonical_video_url(video_id):
+    """Single watch URL used for every link to the same video"""
+    return f'https://www.youtube.com/watch?v={video_id}'
+
+
+def normalize_link(content, entry_type):
+    """
+    (entry_type, video_id, canonical_url) for a notebook entry's content.
+    Links to a YouTube video become 'youtube' entries; notes and quotes keep their type.
+    """
+    url = (content or '').strip()
+    video_id = extract_video_id(url)
+    if video_id:
+        if entry_type not in ('note', 'quote'):
+            entry_type = 'youtube'
+        return entry_type, video_id, canonical_video_url(video_id)
+    if url.startswith(('http://', 'https://')) and len(url) <= 500 and not any(c.isspace() for c in url):
+        return entry_type, '', url.split('#', 1)[0]
+    return entry_type, '', ''
 
 
 def get_youtube_transcript(video_id):
@@ -0,0 +1,90 @@
+"""
+Read replica routing with read-your-writes
+
+Reads go to the 'replica' database only inside views marked @replica_reads
+(read-only pages that aren't cached), and only while the current client has
+no recent writes: any write through the ORM pins the rest of the request to the
+primary, and ReplicaStickinessMiddleware keeps the client pinned for
+REPLICA_STICKY_SECONDS afterwards so replication lag never hides a user's own
+change. Everything else, including all writes, uses 'default'.
+
+Pages kept in the page cache or answered by ETag (cards/view_cache.py) are
+rendered under @primary_reads: their version stamps are bumped as soon as a
+write commits, so a lagging replica would store the old content under the
+new stamp and keep serving it until the next write.
+"""
+import contextvars
+from functools import wraps
+
+from django.conf import settings
+
+REPLICA = 'replica'
+
+# Sessions are always read from the primary: a login must be visible at once
+PRIMARY_ONLY_APPS = {'sessions'}
+
+_replica_allowed = contextvars.ContextVar('replica_allowed', default=False)
+_wrote = contextvars.ContextVar('wrote_to_primary', default=None)
+
+
+def replica_configured():
+    return REPLICA in settings.DATABASES
+
+
+def start_request(pinned):
+    """Begin tracking writes for one request; pinned clients never read the replica"""
+    state = {'wrote': False, 'pinned': pinned}
+    return _wrote.set(state)
+
+
+def end_request(token):
+    """Stop tracking; returns whether the request wrote to the primary"""
+    state = _wrote.get()
+    _wrote.reset(token)
+    return bool(state and state['wrote'])
+
+
+def _reads(view, allowed):
+    @wraps(view)
+    def wrapped(request, *args, **kwargs):
+        token = _replica_allowed.set(allowed)
+        try:
+            return view(request, *args, **kwargs)
+        finally:
+            _replica_allowed.reset(token)
+    return wrapped
+
+
+def replica_reads(view):
+    """Let a read-only view's queries use the replica"""
+    return _reads(view, True)
+
+
+def primary_reads(view):
+    """Keep a view's queries on the primary, even inside @replica_reads"""
+    return _reads(view, False)
+
+
+class ReplicaRouter:
+    """Primary for writes, replica for reads inside @replica_reads views"""
+
+    def db_for_read(self, model, **hints):
+        if not _replica_allowed.get() or model._meta.app_label in PRIMARY_ONLY_APPS:
+            return 'default'
+        state = _wrote.get()
+        if state is not None and (state['wrote'] or state['pinned']):
+            return 'default'
+        return REPLICA
+
+    def db_for_write(self, model, **hints):
+        state = _wrote.get()
+        if state is not None and model._meta.label not in settings.REPLICA_STICKY_IGNORE:
+            state['wrote'] = True
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # The replica gets its schema from replication, not from migrate
+        return db != REPLICA
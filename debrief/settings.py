@@ -12,6 +12,9 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 
 from pathlib import Path
 import os
+import sys
+
+from .database import parse_database_url, sqlite_options
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -49,11 +52,14 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'cards.middleware.PerformanceMiddleware',
+    'cards.middleware.ReplicaStickinessMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'cards.middleware.SamplingProfilerMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     'cards.middleware.OnlineStatusMiddleware',
@@ -83,13 +89,54 @@ WSGI_APPLICATION = 'debrief.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
+# DATABASE_URL selects the primary (SQLite in BASE_DIR by default, Postgres in
+# production). Connections are kept for DB_CONN_MAX_AGE seconds and checked
+# before reuse. Setting DATABASE_REPLICA_URL adds a read replica used by
+# read-only views outside the page cache (see debrief/routers.py); a client
+# that writes stays on the primary for REPLICA_STICKY_SECONDS so it always
+# sees its own changes.
+DB_CONN_MAX_AGE = int(os.environ.get('DB_CONN_MAX_AGE', '60'))
+
+# SQLite tuning for small deployments, run on every new connection: WAL lets
+# readers and one writer work at once, writers wait up to SQLITE_BUSY_TIMEOUT
+# seconds for the lock instead of failing, and mmap/cache keep hot pages in
+# memory. Check with: python manage.py stress_sqlite
+SQLITE_PRAGMAS = {
+    'journal_mode': os.environ.get('SQLITE_JOURNAL_MODE', 'WAL'),
+    'synchronous': os.environ.get('SQLITE_SYNCHRONOUS', 'NORMAL'),
+    'mmap_size': int(os.environ.get('SQLITE_MMAP_SIZE', str(128 * 1024 * 1024))),
+    # Negative means KiB rather than pages
+    'cache_size': -int(os.environ.get('SQLITE_CACHE_SIZE_KB', str(64 * 1024))),
+    'temp_store': 'MEMORY',
+}
+SQLITE_BUSY_TIMEOUT = float(os.environ.get('SQLITE_BUSY_TIMEOUT', '20'))
+
 DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
-    }
+    'default': parse_database_url(
+        os.environ.get('DATABASE_URL', 'sqlite:///db.sqlite3'),
+        base_dir=BASE_DIR,
+        conn_max_age=DB_CONN_MAX_AGE,
+        conn_health_checks=True,
+        sqlite=sqlite_options(SQLITE_PRAGMAS, SQLITE_BUSY_TIMEOUT),
+    ),
 }
 
+if os.environ.get('DATABASE_REPLICA_URL'):
+    DATABASES['replica'] = parse_database_url(
+        os.environ['DATABASE_REPLICA_URL'],
+        base_dir=BASE_DIR,
+        conn_max_age=DB_CONN_MAX_AGE,
+        conn_health_checks=True,
+        sqlite=sqlite_options(SQLITE_PRAGMAS, SQLITE_BUSY_TIMEOUT),
+    )
+    DATABASES['replica']['TEST'] = {'MIRROR': 'default'}
+    DATABASE_ROUTERS = ['debrief.routers.ReplicaRouter']
+
+REPLICA_STICKY_SECONDS = int(os.environ.get('REPLICA_STICKY_SECONDS', '15'))
+REPLICA_STICKY_COOKIE = 'db_primary'
+# Writes that don't pin a client to the primary (bookkeeping on every request)
+REPLICA_STICKY_IGNORE = {'cards.UserProfile', 'cards.RequestProfile'}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -152,8 +199,118 @@ LOGIN_REDIRECT_URL = '/'
 LOGOUT_REDIRECT_URL = '/'
 
 
+# Per-request performance instrumentation (Server-Timing, JSON log line, /metrics/)
+PERFORMANCE_INSTRUMENTATION = os.environ.get('PERFORMANCE_INSTRUMENTATION', 'True') == 'True'
+# Optional bearer token so Prometheus can scrape /metrics/ without a staff session
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+
+# Sampling profiler: staff can force a profile with the header below; otherwise
+# PROFILER_SAMPLE_RATE of requests are sampled and kept only if slower than
+# PROFILER_SLOW_MS. Profiles are browsable in the admin (Request profiles).
+PROFILER_HEADER = 'X-Debrief-Profile'
+PROFILER_SAMPLE_RATE = float(os.environ.get('PROFILER_SAMPLE_RATE', '0.01'))
+PROFILER_SLOW_MS = int(os.environ.get('PROFILER_SLOW_MS', '1000'))
+PROFILER_INTERVAL_MS = 5
+PROFILER_MAX_PROFILES = 200
+PROFILER_MAX_STACKS = 2000
+
+# The JSON line per request is logged at INFO: set PERFORMANCE_LOG_LEVEL=INFO
+# where it is collected (production). The WARNING default keeps it out of
+# management command output, and the test runner never prints it.
+PERFORMANCE_LOG_LEVEL = os.environ.get('PERFORMANCE_LOG_LEVEL', 'WARNING')
+if sys.argv[1:2] == ['test']:
+    PERFORMANCE_LOG_LEVEL = 'WARNING'
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'cards.instrumentation': {
+            'handlers': ['console'],
+            'level': PERFORMANCE_LOG_LEVEL,
+            'propagate': False,
+        },
+    },
+}
+
+# Cache shared by all worker processes. CACHE_BACKEND picks the store:
+#   file   - files under CACHE_DIR (default; works for a single host)
+#   redis  - Redis or a compatible server at REDIS_URL (needs the redis package)
+#   locmem - per-process memory, for tests and one-off scripts
+CACHE_BACKEND = os.environ.get('CACHE_BACKEND', 'file')
+if CACHE_BACKEND == 'redis':
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ.get('REDIS_URL', 'redis://127.0.0.1:6379/1'),
+        }
+    }
+elif CACHE_BACKEND == 'locmem':
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'OPTIONS': {'MAX_ENTRIES': 100000},
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': os.environ.get('CACHE_DIR', str(BASE_DIR / '.cache')),
+            'OPTIONS': {'MAX_ENTRIES': 100000},
+        }
+    }
+CACHES['default']['KEY_PREFIX'] = 'debrief'
+
+# Whole-page cache for anonymous and per-user views (see cards/view_cache.py);
+# card writes bump version stamps, so this only bounds staleness elsewhere
+VIEW_CACHE_TIMEOUT = int(os.environ.get('VIEW_CACHE_TIMEOUT', '60'))
+
+# Home timeline (friends feed): card IDs are pushed to followers' cached
+# timelines on write, except for authors with more than TIMELINE_FANOUT_LIMIT
+# followers (or listed in TIMELINE_PULL_USERNAMES), whose cards are merged in
+# on read. Timelines expire TIMELINE_TTL seconds after they are built and are
+# rebuilt lazily.
+TIMELINE_LENGTH = 500
+TIMELINE_FANOUT_LIMIT = int(os.environ.get('TIMELINE_FANOUT_LIMIT', '1000'))
+TIMELINE_PULL_USERNAMES = ['DebriefCommons']
+TIMELINE_TTL = 60 * 60 * 24 * 7
+
+# "Related cards" index for card_detail (see cards/related.py), written by
+# python manage.py refresh_related (schedule it, e.g. every 15 minutes)
+RELATED_INDEX_DIR = os.environ.get('RELATED_INDEX_DIR', str(BASE_DIR / '.index'))
+
+# Fact vectors for survey context and fact search (see cards/fact_index.py),
+# written by python manage.py build_fact_index (run it after update_facts)
+FACT_INDEX_PATH = os.environ.get('FACT_INDEX_PATH', str(BASE_DIR / '.index' / 'facts.f32'))
+
+# python manage.py update_facts (see cards/fact_pipeline.py): feeds fetched at
+# once, and the minimum gap between two requests to the same host
+FACT_FETCH_WORKERS = int(os.environ.get('FACT_FETCH_WORKERS', '4'))
+FACT_FETCH_HOST_INTERVAL = float(os.environ.get('FACT_FETCH_HOST_INTERVAL', '1.0'))
+
+# LLM gateway (see cards/llm.py); LLM_BACKEND=stub answers locally, without an API key
+LLM_BACKEND = os.environ.get('LLM_BACKEND', 'anthropic')
+LLM_MODEL = os.environ.get('LLM_MODEL', 'claude-sonnet-4-20250514')
+LLM_TIMEOUT = float(os.environ.get('LLM_TIMEOUT', '30'))
+LLM_MAX_RETRIES = int(os.environ.get('LLM_MAX_RETRIES', '2'))
+LLM_CACHE_TIMEOUT = int(os.environ.get('LLM_CACHE_TIMEOUT', str(60 * 60 * 24 * 30)))
+# Input + output tokens per UTC day; 0 means no limit
+LLM_USER_DAILY_TOKENS = int(os.environ.get('LLM_USER_DAILY_TOKENS', '50000'))
+LLM_GLOBAL_DAILY_TOKENS = int(os.environ.get('LLM_GLOBAL_DAILY_TOKENS', '2000000'))
+
+
 # NewsAPI for trending topics
 NEWSAPI_KEY = os.environ.get('NEWSAPI_KEY', '')
+# Headlines older than TRENDING_REFRESH_AFTER are refreshed in the background by
+# whichever worker takes the lease; the rest keep serving the stale copy, which
+# is kept for up to TRENDING_STALE_TTL
+TRENDING_REFRESH_AFTER = 60 * 60
+TRENDING_STALE_TTL = 60 * 60 * 24
+TRENDING_LEASE_SECONDS = 60
 
 # Email settings (for now, just print to console)
 EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'  # For testing